@@ -0,0 +1,376 @@
+"""Estimation analytics across rooms and sessions.
+
+Every finished round (the moderator starts the next one) is added to one
+cell of a table per day, room, deck and flavor. The table is columnar:
+each dimension and measure is an `array` with one entry per cell, room,
+deck and flavor are stored as integer codes, and every card value played
+has its own vote count column. A cell absorbs all rounds of its room on
+that day, so the table grows with rooms and days, not with votes, and a
+query sums a few thousand entries per column. Only the cards of the deck
+get their own column; other vote values are counted under OTHER. Days
+older than ANALYTICS_RETENTION_DAYS are dropped, together with the rooms
+left without cells, whenever the first round of a new day is added.
+
+Queries take several groupings at once; for each, every column is summed
+into the groups in a single pass over the selected cells. The admin API
+queries a copy of the table in a thread, so the event loop neither waits
+for a query nor changes the table under it. The table is part of the journal
+snapshot, so it survives restarts and outlives the rooms themselves;
+events after the snapshot add their rounds again on replay.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+from array import array
+from collections.abc import Callable, Iterable, Sequence
+from datetime import date, datetime, timezone
+from typing import Any
+
+from .decks import get_deck
+from .models import Room, Round
+from .stats import METRICS, Sample, scale_of
+
+# Days of rounds kept; 0 keeps all
+ANALYTICS_RETENTION_DAYS = int(os.environ.get("ANALYTICS_RETENTION_DAYS", "365"))
+
+DIMENSIONS = ("day", "room", "deck", "flavor")
+
+# Summed per cell; see `_derive` for the rates reported
+MEASURES = (
+    # Stories finished
+    "rounds",
+    # ... of which revealed
+    "revealed",
+    # ... with all estimates on one card
+    "consensus",
+    # ... without a re-vote before
+    "first_round_consensus",
+    # Re-votes (reset_round) over all stories
+    "revotes",
+    # Votes in revealed rounds
+    "votes",
+)
+
+# Card column of votes that are on neither the deck nor the special cards
+OTHER = "other"
+
+_EPOCH = date(1970, 1, 1)
+
+
+class Codes:
+    """Dictionary encoding of a string column."""
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        self.values: list[str] = []
+        self._codes: dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value: str) -> int | None:
+        return self._codes.get(value)
+
+    def copy(self) -> Codes:
+        copy = Codes()
+        copy.values = list(self.values)
+        copy._codes = dict(self._codes)
+        return copy
+
+
+def day_number(day: date) -> int:
+    return (day - _EPOCH).days
+
+
+@functools.lru_cache(maxsize=1024)
+def _day_string(day: int) -> str:
+    return date.fromordinal(_EPOCH.toordinal() + day).isoformat()
+
+
+def day_of(timestamp: float) -> int:
+    return day_number(datetime.fromtimestamp(timestamp, timezone.utc).date())
+
+
+class Table:
+    def __init__(self) -> None:
+        self.codes = {dim: Codes() for dim in DIMENSIONS if dim != "day"}
+        # Dimension columns; room, deck and flavor hold codes
+        self.dims: dict[str, array] = {
+            "day": array("i"),
+            "room": array("I"),
+            "deck": array("H"),
+            "flavor": array("H"),
+        }
+        self.measures = {name: array("I") for name in MEASURES}
+        # Card value -> votes per cell
+        self.cards: dict[str, array] = {}
+        # (day, room, deck, flavor) -> cell
+        self._cells: dict[tuple[int, int, int, int], int] = {}
+        # Latest day added; a later one triggers pruning
+        self._last_day = -1
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def copy(self) -> Table:
+        """An independent copy, e.g. to query outside the event loop."""
+        table = Table()
+        table.codes = {dim: codes.copy() for dim, codes in self.codes.items()}
+        table.dims = {dim: array(c.typecode, c) for dim, c in self.dims.items()}
+        table.measures = {name: array("I", c) for name, c in self.measures.items()}
+        table.cards = {value: array("I", c) for value, c in self.cards.items()}
+        table._cells = dict(self._cells)
+        table._last_day = self._last_day
+        return table
+
+    def _cell(self, day: int, room: str, deck: str, flavor: str) -> int:
+        key = (
+            day,
+            self.codes["room"].code(room),
+            self.codes["deck"].code(deck),
+            self.codes["flavor"].code(flavor),
+        )
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = len(self._cells)
+            for column, value in zip(self.dims.values(), key):
+                column.append(value)
+            for column in self.measures.values():
+                column.append(0)
+            for column in self.cards.values():
+                column.append(0)
+        return cell
+
+    def add(
+        self,
+        *,
+        day: int,
+        room: str,
+        deck: str,
+        flavor: str,
+        revealed: bool,
+        consensus: bool,
+        revotes: int,
+        histogram: dict[str, int],
+    ) -> None:
+        """Count one finished round."""
+        if day > self._last_day:
+            self._last_day = day
+            if ANALYTICS_RETENTION_DAYS:
+                self.prune(day - ANALYTICS_RETENTION_DAYS + 1)
+        cell = self._cell(day, room, deck, flavor)
+        measures = self.measures
+        measures["rounds"][cell] += 1
+        measures["revotes"][cell] += revotes
+        if not revealed:
+            return
+        measures["revealed"][cell] += 1
+        if consensus:
+            measures["consensus"][cell] += 1
+            if not revotes:
+                measures["first_round_consensus"][cell] += 1
+        for value, count in histogram.items():
+            column = self.cards.get(value)
+            if column is None:
+                column = self.cards[value] = array("I", bytes(4 * len(self)))
+            column[cell] += count
+            measures["votes"][cell] += count
+
+    def add_round(self, room: Room, round_: Round, at: float) -> None:
+        deck = get_deck(room.deck_type, room.description_flavor)
+        sample = Sample.of(round_.vote_stats, scale_of(deck))
+        histogram = {v: c for v, c in zip(sample.scale.values, sample.counts) if c}
+        histogram.update(sample.special)
+        if sample.other:
+            histogram[OTHER] = sum(sample.other.values())
+        self.add(
+            day=day_of(at),
+            room=room.id,
+            deck=room.deck_type,
+            flavor=room.description_flavor,
+            revealed=round_.revealed,
+            consensus=METRICS["consensus"](sample) is True,
+            revotes=round_.revotes,
+            histogram=histogram,
+        )
+
+    def prune(self, first_day: int) -> None:
+        """Drop the cells of days before `first_day` and rooms left without cells."""
+        days = self.dims["day"]
+        keep = [c for c in range(len(self)) if days[c] >= first_day]
+        if len(keep) == len(self):
+            return
+        # Room codes are reassigned, so rooms without cells disappear
+        room_values = self.codes["room"].values
+        rooms = self.codes["room"] = Codes()
+        old_rooms = self.dims["room"]
+        self.dims = {
+            dim: (
+                array("I", (rooms.code(room_values[old_rooms[c]]) for c in keep))
+                if dim == "room"
+                else array(column.typecode, map(column.__getitem__, keep))
+            )
+            for dim, column in self.dims.items()
+        }
+        self.measures = {
+            name: array("I", map(column.__getitem__, keep))
+            for name, column in self.measures.items()
+        }
+        self.cards = {
+            value: kept
+            for value, column in self.cards.items()
+            if any(kept := array("I", map(column.__getitem__, keep)))
+        }
+        self._cells = {key: cell for cell, key in enumerate(zip(*self.dims.values()))}
+
+    def select(
+        self,
+        *,
+        since: date | None = None,
+        until: date | None = None,
+        **where: str | None,
+    ) -> list[int] | None:
+        """Cells within the days [since, until] matching the given dimension values.
+
+        None (all cells) without any condition.
+        """
+        if since is None and until is None and all(v is None for v in where.values()):
+            return None
+        cells: Iterable[int] = range(len(self))
+        days = self.dims["day"]
+        if since is not None:
+            first = day_number(since)
+            cells = [c for c in cells if days[c] >= first]
+        if until is not None:
+            last = day_number(until)
+            cells = [c for c in cells if days[c] <= last]
+        for dim, value in where.items():
+            if value is None:
+                continue
+            code = self.codes[dim].get(value)
+            column = self.dims[dim]
+            cells = [c for c in cells if column[c] == code]
+        return list(cells)
+
+    def query(
+        self, groupings: Sequence[Sequence[str]], cells: list[int] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        """Aggregate `cells` for each grouping of DIMENSIONS.
+
+        An empty grouping gives the totals. Each column is summed into all
+        groups in one pass over the cells (all of them if `cells` is None).
+        """
+        results = []
+        for dims in groupings:
+            # Group number of each selected cell, in order of appearance
+            index: dict[tuple[int, ...], int] = {}
+            keys = zip(*(_values(self.dims[dim], cells) for dim in dims))
+            groups = [index.setdefault(key, len(index)) for key in keys] if dims else None
+            size = len(index) if dims else 1
+            totals = {
+                name: _sums(column, cells, groups, size)
+                for name, column in self.measures.items()
+            }
+            counts = {
+                value: sums
+                for value, column in self.cards.items()
+                if any(sums := _sums(column, cells, groups, size))
+            }
+            if not dims and (len(self) if cells is None else cells):
+                index[()] = 0
+            decoders = [self._decoder(dim) for dim in dims]
+            rows = []
+            for key, group in sorted(index.items()):
+                measures = {name: sums[group] for name, sums in totals.items()}
+                rows.append({
+                    "key": {
+                        dim: decode(value)
+                        for dim, decode, value in zip(dims, decoders, key)
+                    },
+                    **measures,
+                    **_derive(measures),
+                    "distribution": {
+                        value: sums[group] for value, sums in counts.items() if sums[group]
+                    },
+                })
+            results.append(rows)
+        return results
+
+    def _decoder(self, dim: str) -> Callable[[int], str]:
+        if dim == "day":
+            return _day_string
+        return self.codes[dim].values.__getitem__
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "codes": {dim: list(codes.values) for dim, codes in self.codes.items()},
+            "dims": {dim: column.tolist() for dim, column in self.dims.items()},
+            "measures": {name: column.tolist() for name, column in self.measures.items()},
+            "cards": {value: column.tolist() for value, column in self.cards.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Table:
+        table = cls()
+        for dim, values in data["codes"].items():
+            table.codes[dim] = Codes(values)
+        for dim, values in data["dims"].items():
+            table.dims[dim].extend(values)
+        for name, values in data["measures"].items():
+            table.measures[name].extend(values)
+        for value, counts in data["cards"].items():
+            table.cards[value] = array("I", counts)
+        table._cells = {key: cell for cell, key in enumerate(zip(*table.dims.values()))}
+        table._last_day = max(table.dims["day"], default=-1)
+        return table
+
+
+def _values(column: array, cells: list[int] | None) -> Iterable[int]:
+    return column if cells is None else map(column.__getitem__, cells)
+
+
+def _sums(
+    column: array, cells: list[int] | None, groups: list[int] | None, size: int
+) -> list[int]:
+    """Sum `column` over `cells` (None: all) per group.
+
+    `groups[i]` is the group of the i-th cell; None puts all in one group.
+    """
+    values = _values(column, cells)
+    if groups is None or size == 1:
+        return [sum(values)]
+    sums = [0] * size
+    for group, value in zip(groups, values):
+        if value:
+            sums[group] += value
+    return sums
+
+
+def _derive(totals: dict[str, int]) -> dict[str, float | None]:
+    revealed = totals["revealed"]
+    rounds = totals["rounds"]
+    return {
+        "consensus_rate": round(totals["consensus"] / revealed, 3) if revealed else None,
+        "first_round_consensus_rate": (
+            round(totals["first_round_consensus"] / revealed, 3) if revealed else None
+        ),
+        "revotes_per_story": round(totals["revotes"] / rounds, 2) if rounds else None,
+    }
+
+
+table = Table()
+
+
+def load(data: dict[str, Any] | None) -> None:
+    """Replace the table with one from a snapshot (empty if None)."""
+    global table
+    table = Table.from_dict(data) if data else Table()
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import shortuuid
+
+from . import codec
+from .encoder import ROOM_PATCH, ROOM_STATE, StateFrames
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process on a shared bus
+WORKER_ID = os.environ.get("WORKER_ID") or shortuuid.uuid()[:8]
+
+# Envelope kind that removes a participant's socket on whichever worker holds it
+DROP = "_drop"
+# Envelope kind that sends `data` to every socket of a room and closes them
+CLOSE = "_close"
+
+
+@dataclass(slots=True)
+class Envelope:
+    """One published message, delivered by every worker to its local sockets."""
+
+    room_id: str
+    kind: str
+    # Encoded frame of a plain message
+    data: str | None = None
+    # Single recipient, None for the whole room
+    to: str | None = None
+    # Room state version (broadcast_state)
+    frames: StateFrames | None = None
+    changed: bool = True
+    snapshot_to: str | None = None
+    # Worker that published the message
+    origin: str = ""
+
+
+class LocalBus:
+    """Default bus: a single process, published messages are delivered directly."""
+
+    def __init__(self, worker_id: str = WORKER_ID) -> None:
+        self.worker_id = worker_id
+        self._deliver: Callable[[Envelope], None] | None = None
+        self._count: Callable[[], int] = lambda: 0
+
+    def bind(self, deliver: Callable[[Envelope], None], count: Callable[[], int]) -> None:
+        self._deliver = deliver
+        self._count = count
+
+    async def publish(self, envelope: Envelope) -> None:
+        envelope.origin = self.worker_id
+        if self._deliver is not None:
+            self._deliver(envelope)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def connection_counts(self) -> dict[str, int]:
+        """Open connections per worker."""
+        return {self.worker_id: self._count()}
+
+
+class RedisBus(LocalBus):
+    """Redis pub/sub bus for multi-worker and multi-pod setups.
+
+    Messages are delivered to the publishing worker directly and to all
+    other workers through one channel. Each worker also refreshes its
+    connection count in Redis.
+    """
+
+    HEARTBEAT_SECONDS = 10
+
+    def __init__(
+        self, client, prefix: str = "bdapoker", worker_id: str = WORKER_ID
+    ) -> None:
+        super().__init__(worker_id)
+        self.client = client
+        self.channel = f"{prefix}:bus"
+        self.prefix = prefix
+        self._tasks: list[asyncio.Task] = []
+
+    @classmethod
+    def from_url(cls, url: str) -> RedisBus:
+        try:
+            import redis.asyncio
+        except ImportError:  # pragma: no cover - optional dependency
+            raise RuntimeError(
+                "BROADCAST_BUS_URL requires the 'redis' package"
+            ) from None
+        return cls(redis.asyncio.Redis.from_url(url, decode_responses=True))
+
+    async def publish(self, envelope: Envelope) -> None:
+        await super().publish(envelope)
+        await self.client.publish(self.channel, _dumps(envelope))
+
+    async def start(self) -> None:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._tasks = [
+            asyncio.create_task(self._listen(pubsub)),
+            asyncio.create_task(self._heartbeat()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self.client.delete(self._worker_key(self.worker_id))
+
+    async def _listen(self, pubsub) -> None:
+        while True:
+            try:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except Exception:
+                logger.exception("Bus connection failed, retrying")
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            try:
+                envelope = _loads(message["data"])
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Dropping malformed bus message")
+                continue
+            if envelope.origin != self.worker_id and self._deliver is not None:
+                self._deliver(envelope)
+
+    def _worker_key(self, worker_id: str) -> str:
+        return f"{self.prefix}:worker:{worker_id}"
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await self.client.set(
+                self._worker_key(self.worker_id),
+                self._count(),
+                ex=self.HEARTBEAT_SECONDS * 3,
+            )
+            await asyncio.sleep(self.HEARTBEAT_SECONDS)
+
+    async def connection_counts(self) -> dict[str, int]:
+        counts = {}
+        async for key in self.client.scan_iter(self._worker_key("*")):
+            value = await self.client.get(key)
+            if value is not None:
+                counts[key.rsplit(":", 1)[1]] = int(value)
+        counts[self.worker_id] = self._count()
+        return counts
+
+
+def _dumps(envelope: Envelope) -> str:
+    data = {
+        "room_id": envelope.room_id,
+        "kind": envelope.kind,
+        "data": envelope.data,
+        "to": envelope.to,
+        "changed": envelope.changed,
+        "snapshot_to": envelope.snapshot_to,
+        "origin": envelope.origin,
+    }
+    frames = envelope.frames
+    if frames is not None:
+        data["version"] = frames.version
+        data["state"] = frames.frame(ROOM_STATE)
+        if frames.has_patch:
+            data["patch"] = frames.frame(ROOM_PATCH)
+    return codec.dumps_text(data)
+
+
+def _loads(raw: str) -> Envelope:
+    data = codec.loads(raw)
+    frames = None
+    if "state" in data:
+        encoded = {ROOM_STATE: data["state"]}
+        if "patch" in data:
+            encoded[ROOM_PATCH] = data["patch"]
+        frames = StateFrames.from_encoded(data["version"], encoded)
+    return Envelope(
+        room_id=data["room_id"],
+        kind=data["kind"],
+        data=data["data"],
+        to=data["to"],
+        frames=frames,
+        changed=data["changed"],
+        snapshot_to=data["snapshot_to"],
+        origin=data["origin"],
+    )
+
+
+def create_bus(url: str) -> LocalBus:
+    if not url:
+        return LocalBus()
+    return RedisBus.from_url(url)
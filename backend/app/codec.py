@@ -0,0 +1,106 @@
+"""Codecs for WebSocket and bus frames.
+
+JSON uses orjson or msgspec when installed, the stdlib otherwise. All
+implementations produce compact UTF-8 JSON. Clients that negotiate the
+`bdapoker.msgpack` subprotocol get the same messages as binary
+MessagePack frames (needs the `msgpack` package).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Callable
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:  # optional, see the `msgpack` extra
+    msgpack = None
+
+# auto: the fastest installed; or force one of orjson, msgspec, json
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto")
+
+Dumps = Callable[[Any], bytes]
+Loads = Callable[[str | bytes], Any]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def load(name: str) -> tuple[str, Dumps, Loads, tuple[type[Exception], ...]]:
+    """Return (name, dumps, loads, decode errors) of a codec.
+
+    Raises ImportError if the library is not installed.
+    """
+    if name == "auto":
+        for candidate in ("orjson", "msgspec"):
+            try:
+                return load(candidate)
+            except ImportError:
+                continue
+        return load("json")
+    if name == "orjson":
+        import orjson
+
+        return name, orjson.dumps, orjson.loads, (orjson.JSONDecodeError,)
+    if name == "msgspec":
+        import msgspec
+
+        return (
+            name,
+            msgspec.json.Encoder().encode,
+            msgspec.json.Decoder().decode,
+            (msgspec.DecodeError,),
+        )
+    if name == "json":
+        return name, _stdlib_dumps, json.loads, (ValueError,)
+    raise ValueError(f"Unknown JSON codec: {name}")
+
+
+NAME, dumps, loads, _decode_errors = load(JSON_CODEC)
+# Raised by `loads` and `decode` for malformed input
+DecodeError = (ValueError, *_decode_errors)
+
+# WebSocket protocols: JSON text frames without a subprotocol, or msgpack
+JSON = "json"
+MSGPACK = "bdapoker.msgpack"
+SUBPROTOCOLS = (MSGPACK,) if msgpack is not None else ()
+
+
+def dumps_text(obj: Any) -> str:
+    """Encode for a WebSocket text frame (ASGI takes those as str)."""
+    return dumps(obj).decode()
+
+
+def negotiate(requested: list[str]) -> str:
+    """Pick the protocol for a socket from the client's offered subprotocols."""
+    for subprotocol in requested:
+        if subprotocol in SUBPROTOCOLS:
+            return subprotocol
+    return JSON
+
+
+def encode(obj: Any, protocol: str = JSON) -> str | bytes:
+    """Encode a message as a text (JSON) or binary (msgpack) frame."""
+    if protocol == MSGPACK:
+        return msgpack.packb(obj)
+    return dumps_text(obj)
+
+
+def transcode(frame: str, protocol: str) -> str | bytes:
+    """Re-encode a JSON frame for `protocol`."""
+    if protocol == JSON:
+        return frame
+    return encode(loads(frame), protocol)
+
+
+def decode(data: str | bytes, protocol: str = JSON) -> Any:
+    """Decode an inbound frame; raises one of DecodeError."""
+    if protocol == MSGPACK and isinstance(data, bytes):
+        try:
+            return msgpack.unpackb(data)
+        except Exception as exc:  # msgpack raises several unrelated types
+            raise ValueError("Invalid MessagePack") from exc
+    return loads(data)
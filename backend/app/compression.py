@@ -0,0 +1,95 @@
+"""permessage-deflate tuning for the uvicorn WebSocket server.
+
+Room states repeat the same deck descriptions and participant names in
+every frame, so with context takeover (the compressor keeps its window
+between messages of a connection) a repeated state costs little more than
+its changes. The window and memory level bound the zlib state kept per
+connection: about 2**(window_bits + 2) + 2**(mem_level + 9) bytes.
+
+Start uvicorn with `--ws app.compression:WebSocketProtocol`.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any
+
+from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import CONT, CTRL_OPCODES, Frame
+
+from . import metrics
+
+# Offer permessage-deflate to clients that support it
+DEFLATE = os.environ.get("WS_DEFLATE", "1") == "1"
+# zlib window of the server's compressor, 9-15 (clients are asked for the same)
+DEFLATE_WINDOW_BITS = int(os.environ.get("WS_DEFLATE_WINDOW_BITS", "13"))
+# zlib memory level, 1-9
+DEFLATE_MEM_LEVEL = int(os.environ.get("WS_DEFLATE_MEM_LEVEL", "5"))
+# Messages smaller than this many bytes are sent uncompressed
+DEFLATE_MIN_SIZE = int(os.environ.get("WS_DEFLATE_MIN_SIZE", "256"))
+
+UVICORN_WS = "app.compression:WebSocketProtocol"
+
+
+class ThresholdDeflate(PerMessageDeflate):
+    """permessage-deflate that leaves small messages uncompressed.
+
+    RFC 7692 allows any message to go out without RSV1; skipping it does
+    not touch the compressor, so the shared context stays intact.
+    """
+
+    def __init__(self, *args: Any, min_size: int = 0, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        size = len(frame.data)
+        # Fragmented messages are compressed as a whole
+        if frame.fin and frame.opcode is not CONT and size < self.min_size:
+            encoded = frame
+        else:
+            encoded = super().encode(frame)
+        metrics.WS_PAYLOAD_BYTES.inc(size)
+        metrics.WS_WIRE_BYTES.inc(len(encoded.data))
+        return encoded
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, *, min_size: int = 0, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):  # type: ignore[no-untyped-def]
+        response, extension = super().process_request_params(params, accepted_extensions)
+        return response, ThresholdDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size,
+        )
+
+
+def deflate_factory() -> ThresholdDeflateFactory:
+    return ThresholdDeflateFactory(
+        server_max_window_bits=DEFLATE_WINDOW_BITS,
+        client_max_window_bits=DEFLATE_WINDOW_BITS,
+        compress_settings={"memLevel": DEFLATE_MEM_LEVEL},
+        min_size=DEFLATE_MIN_SIZE,
+    )
+
+
+class WebSocketProtocol(WebSocketsSansIOProtocol):
+    """uvicorn's websockets protocol with the deflate settings above."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        enabled = DEFLATE and self.config.ws_per_message_deflate
+        self.conn.available_extensions = [deflate_factory()] if enabled else []
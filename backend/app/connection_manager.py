@@ -1,32 +1,224 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import os
+from collections import deque
+from collections.abc import Coroutine
 from typing import Any
 
 from fastapi import WebSocket
 
+from . import codec, metrics
+from .bus import CLOSE, DROP, Envelope, LocalBus, create_bus
+from .encoder import ROOM_PATCH, ROOM_STATE, StateFrames
+
+# Empty: deliver within this process only. redis://...: fan out over Redis
+# pub/sub to the sockets of all workers (defaults to the room store URL).
+BUS_URL = os.environ.get("BROADCAST_BUS_URL", os.environ.get("ROOM_STORE_URL", ""))
+
+# Frames buffered per socket before the overflow policy kicks in
+OUTBOX_SIZE = int(os.environ.get("WS_OUTBOX_SIZE", "64"))
+# "latest": drop queued room state frames, keep the newest (disconnects
+#           only if nothing can be dropped)
+# "disconnect": close sockets that fall behind
+OUTBOX_OVERFLOW = os.environ.get("WS_OUTBOX_OVERFLOW", "latest")
+OVERFLOW_POLICIES = ("latest", "disconnect")
+
+# Close code of sockets whose room was dissolved
+ROOM_CLOSED_CODE = 4011
+# Wait at most this long for a closing room's sockets to flush their queues
+CLOSE_DRAIN_SECONDS = 2.0
+
+# Frames superseded by any later room state; safe to drop when a socket lags.
+# Patch clients notice the version gap and send `sync`.
+_STATE_FRAMES = frozenset({ROOM_STATE, ROOM_PATCH})
+
+
+class Outbox:
+    """Bounded outbound frame queue of one socket, drained by its own writer task.
+
+    Enqueueing never waits for the network, so a slow client only delays
+    itself. The writer task is started lazily on the first frame.
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        maxsize: int,
+        overflow: str,
+        protocol: str = codec.JSON,
+        closing: set[asyncio.Task] | None = None,
+    ) -> None:
+        self.ws = ws
+        self.protocol = protocol
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self.closed = False
+        self.overflowed = False
+        # (message type, encoded frame)
+        self._frames: deque[tuple[str, str | bytes]] = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: asyncio.Task | None = None
+        # Holds the task closing the socket on overflow until it is done
+        self._closing = closing if closing is not None else set()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, kind: str, data: str | bytes) -> None:
+        """Queue a frame, applying the overflow policy when the queue is full."""
+        if self.closed:
+            return
+        if len(self._frames) >= self.maxsize:
+            if self.overflow == "latest":
+                # A new state supersedes every queued one; otherwise the newest
+                # queued state stays, so the client still catches up
+                states = [i for i, f in enumerate(self._frames) if f[0] in _STATE_FRAMES]
+                newest = states[-1] if states and kind not in _STATE_FRAMES else -1
+                kept = deque(
+                    f
+                    for i, f in enumerate(self._frames)
+                    if f[0] not in _STATE_FRAMES or i == newest
+                )
+                self.dropped += len(self._frames) - len(kept)
+                self._frames = kept
+            if len(self._frames) >= self.maxsize:
+                self.dropped += len(self._frames) + 1
+                self.overflowed = True
+                self.close()
+                _track(self._closing, _close_socket(self.ws, 4008, "Too slow"))
+                return
+        self._frames.append((kind, data))
+        self._idle.clear()
+        self._ready.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self._ready.wait()
+            while self._frames:
+                _, data = self._frames.popleft()
+                try:
+                    if isinstance(data, str):
+                        await self.ws.send_text(data)
+                    else:
+                        await self.ws.send_bytes(data)
+                except Exception:
+                    metrics.SEND_ERRORS.inc()
+                    self.close()  # connection already closed
+                    return
+            self._ready.clear()
+            self._idle.set()
+
+    async def drain(self) -> None:
+        """Wait until every queued frame has been handed to the socket."""
+        await self._idle.wait()
+
+    def close(self) -> None:
+        """Discard pending frames and stop the writer task."""
+        self.closed = True
+        self._frames.clear()
+        self._idle.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+
+def _track(tasks: set[asyncio.Task], coro: Coroutine[Any, Any, None]) -> asyncio.Task:
+    """Run `coro` as a task referenced from `tasks` until it is done."""
+    task = asyncio.create_task(coro)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+
+async def _close_socket(ws: WebSocket, code: int, reason: str) -> None:
+    try:
+        await ws.close(code=code, reason=reason)
+    except Exception:
+        pass
+
+
+async def _drain_and_close(outbox: Outbox, code: int, reason: str) -> None:
+    try:
+        await asyncio.wait_for(outbox.drain(), CLOSE_DRAIN_SECONDS)
+    except TimeoutError:
+        pass
+    outbox.close()
+    await _close_socket(outbox.ws, code, reason)
+
+
+async def _close_all(outboxes: list[Outbox], code: int, reason: str) -> None:
+    await asyncio.gather(*(_drain_and_close(o, code, reason) for o in outboxes))
+
 
 class ConnectionManager:
-    """Tracks WebSocket connections per room."""
+    """Tracks the WebSocket connections of this worker per room.
+
+    Messages are published once on the bus; every worker delivers them to
+    the sockets it holds.
+    """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        outbox_size: int = OUTBOX_SIZE,
+        overflow: str = OUTBOX_OVERFLOW,
+        bus: LocalBus | None = None,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
         # room_id -> {participant_id -> websocket}
         self._connections: dict[str, dict[str, WebSocket]] = {}
+        # room_id -> participant_ids that receive room_patch instead of room_state
+        self._patch_clients: dict[str, set[str]] = {}
+        # (room_id, participant_id) -> outbound queue of the current socket
+        self._outboxes: dict[tuple[str, str], Outbox] = {}
+        self.outbox_size = outbox_size
+        self.overflow = overflow
+        # Running socket closes: dissolved rooms, overflows, replaced sessions
+        self._closing: set[asyncio.Task] = set()
+        # Metrics
+        self.dropped_frames = 0
+        self.overflow_disconnects = 0
+        self.bus = bus if bus is not None else LocalBus()
+        self.bus.bind(self.deliver, lambda: len(self._outboxes))
 
-    def connect(self, room_id: str, participant_id: str, ws: WebSocket) -> None:
+    async def start(self) -> None:
+        await self.bus.start()
+
+    async def stop(self) -> None:
+        await self.bus.stop()
+
+    def connect(
+        self,
+        room_id: str,
+        participant_id: str,
+        ws: WebSocket,
+        *,
+        patches: bool = False,
+        protocol: str = codec.JSON,
+    ) -> None:
         if room_id not in self._connections:
             self._connections[room_id] = {}
         existing = self._connections[room_id].get(participant_id)
         if existing is not None and existing is not ws:
-            asyncio.create_task(self._close_stale(existing))
+            self._close_outbox(room_id, participant_id)
+            _track(self._closing, self._close_stale(existing))
         self._connections[room_id][participant_id] = ws
+        if (room_id, participant_id) not in self._outboxes:
+            self._outboxes[room_id, participant_id] = Outbox(
+                ws, self.outbox_size, self.overflow, protocol, self._closing
+            )
+        if patches:
+            self._patch_clients.setdefault(room_id, set()).add(participant_id)
+        else:
+            self._discard_patch_client(room_id, participant_id)
 
     async def _close_stale(self, ws: WebSocket) -> None:
-        try:
-            await ws.close(code=4001, reason="Reconnected from another session")
-        except Exception:
-            pass
+        await _close_socket(ws, 4001, "Reconnected from another session")
 
     def disconnect(self, room_id: str, participant_id: str) -> None:
         conns = self._connections.get(room_id)
@@ -34,26 +226,223 @@ class ConnectionManager:
             conns.pop(participant_id, None)
             if not conns:
                 del self._connections[room_id]
+        self._discard_patch_client(room_id, participant_id)
+        self._close_outbox(room_id, participant_id)
+
+    def _close_outbox(self, room_id: str, participant_id: str) -> None:
+        outbox = self._outboxes.pop((room_id, participant_id), None)
+        if outbox is not None:
+            self.dropped_frames += outbox.dropped
+            outbox.close()
+
+    def _discard_patch_client(self, room_id: str, participant_id: str) -> None:
+        clients = self._patch_clients.get(room_id)
+        if clients:
+            clients.discard(participant_id)
+            if not clients:
+                del self._patch_clients[room_id]
+
+    def _enqueue(
+        self, room_id: str, participant_id: str, kind: str, data: str | bytes
+    ) -> None:
+        outbox = self._outboxes.get((room_id, participant_id))
+        if outbox is None:
+            return
+        outbox.put(kind, data)
+        if outbox.closed:
+            if outbox.overflowed:
+                self.overflow_disconnects += 1
+            self.disconnect(room_id, participant_id)
 
     async def send_to(
-        self, room_id: str, participant_id: str, message: dict[str, Any]
+        self, room_id: str, participant_id: str, message: dict[str, Any] | str
+    ) -> None:
+        """Queue a message (dict, or an already encoded JSON frame) for one participant."""
+        outbox = self._outboxes.get((room_id, participant_id))
+        if outbox is not None:
+            kind, data = _encode(message, outbox.protocol)
+            self._enqueue(room_id, participant_id, kind, data)
+        else:
+            kind, data = _encode(message)
+            await self.bus.publish(Envelope(room_id, kind, data, to=participant_id))
+
+    async def broadcast(self, room_id: str, message: dict[str, Any] | str) -> None:
+        """Queue a message for everyone in the room without waiting for delivery."""
+        kind, data = _encode(message)
+        await self.bus.publish(Envelope(room_id, kind, data))
+
+    async def broadcast_state(
+        self,
+        room_id: str,
+        frames: StateFrames,
+        *,
+        changed: bool = True,
+        snapshot_to: str | None = None,
+    ) -> None:
+        """Queue a room state version for everyone in the room.
+
+        Patch-aware clients get the room_patch (nothing if the state has not
+        `changed`), all others and `snapshot_to` get the full room_state.
+        Without a patch everyone gets the full state.
+        """
+        await self.bus.publish(
+            Envelope(
+                room_id,
+                ROOM_STATE,
+                frames=frames,
+                changed=changed,
+                snapshot_to=snapshot_to,
+            )
+        )
+
+    async def send_state(
+        self, room_id: str, participant_id: str, frames: StateFrames
     ) -> None:
-        conns = self._connections.get(room_id, {})
-        ws = conns.get(participant_id)
-        if ws:
-            await ws.send_text(json.dumps(message))
-
-    async def broadcast(self, room_id: str, message: dict[str, Any]) -> None:
-        conns = self._connections.get(room_id, {})
-        data = json.dumps(message)
-        for ws in list(conns.values()):
-            try:
-                await ws.send_text(data)
-            except Exception:
-                pass  # connection already closed
+        """Queue the full room_state of a version for one participant."""
+        await self.bus.publish(
+            Envelope(room_id, ROOM_STATE, frames=frames, to=participant_id)
+        )
+
+    async def drop(self, room_id: str, participant_id: str) -> None:
+        """Disconnect a participant on whichever worker holds its socket."""
+        await self.bus.publish(Envelope(room_id, DROP, to=participant_id))
+
+    async def close_room(self, room_id: str, message: dict[str, Any]) -> None:
+        """Send a last message to every socket of a room, on all workers, and close them."""
+        _, data = _encode(message)
+        await self.bus.publish(Envelope(room_id, CLOSE, data))
+
+    def close_local(
+        self, room_id: str, data: str, reason: str = "Room closed"
+    ) -> asyncio.Task | None:
+        """Release this worker's sockets of a room and close them concurrently.
+
+        All entries of the room are removed at once, so nothing is queued
+        for it afterwards. Each socket gets the JSON frame `data` first.
+        Returns the task closing them, None if there were none.
+        """
+        conns = self._connections.pop(room_id, {})
+        self._patch_clients.pop(room_id, None)
+        outboxes = []
+        for pid in conns:
+            outbox = self._outboxes.pop((room_id, pid), None)
+            if outbox is None or outbox.closed:
+                continue
+            outbox.put("", codec.transcode(data, outbox.protocol))
+            self.dropped_frames += outbox.dropped
+            outboxes.append(outbox)
+        if not outboxes:
+            return None
+        metrics.ROOM_CLOSE_SOCKETS.inc(len(outboxes))
+        return _track(self._closing, _close_all(outboxes, ROOM_CLOSED_CODE, reason))
+
+    def deliver(self, envelope: Envelope) -> None:
+        """Hand a published message to the local sockets it addresses."""
+        room_id = envelope.room_id
+        if envelope.kind == DROP:
+            self.disconnect(room_id, envelope.to)
+        elif envelope.kind == CLOSE:
+            self.close_local(room_id, envelope.data)
+        elif envelope.frames is not None:
+            if envelope.to is not None:
+                outbox = self._outboxes.get((room_id, envelope.to))
+                if outbox is not None:
+                    data = envelope.frames.frame(ROOM_STATE, outbox.protocol)
+                    self._enqueue(room_id, envelope.to, ROOM_STATE, data)
+            else:
+                self._deliver_state(room_id, envelope)
+        elif envelope.to is not None:
+            outbox = self._outboxes.get((room_id, envelope.to))
+            if outbox is not None:
+                data = codec.transcode(envelope.data, outbox.protocol)
+                self._enqueue(room_id, envelope.to, envelope.kind, data)
+        else:
+            # Encoded at most once per protocol in use
+            encoded: dict[str, str | bytes] = {codec.JSON: envelope.data}
+            sent = 0
+            size = 0
+            for pid in list(self._connections.get(room_id, {})):
+                outbox = self._outboxes.get((room_id, pid))
+                if outbox is None:
+                    continue
+                data = encoded.get(outbox.protocol)
+                if data is None:
+                    data = encoded[outbox.protocol] = codec.transcode(
+                        envelope.data, outbox.protocol
+                    )
+                self._enqueue(room_id, pid, envelope.kind, data)
+                sent += 1
+                size += len(data)
+            if sent:
+                metrics.BROADCAST_FANOUT.observe(sent)
+                metrics.BROADCAST_BYTES.inc(size)
+
+    def _deliver_state(self, room_id: str, envelope: Envelope) -> None:
+        frames = envelope.frames
+        patch_clients = self._patch_clients.get(room_id, set())
+        sent = 0
+        size = 0
+        for pid in list(self._connections.get(room_id, {})):
+            outbox = self._outboxes.get((room_id, pid))
+            if outbox is None:
+                continue
+            if frames.has_patch and pid in patch_clients and pid != envelope.snapshot_to:
+                if not envelope.changed:
+                    continue
+                kind = ROOM_PATCH
+            else:
+                kind = ROOM_STATE
+            data = frames.frame(kind, outbox.protocol)
+            self._enqueue(room_id, pid, kind, data)
+            sent += 1
+            size += len(data)
+        if sent:
+            metrics.BROADCAST_FANOUT.observe(sent)
+            metrics.BROADCAST_BYTES.inc(size)
+
+    async def drain(self, room_id: str | None = None) -> None:
+        """Wait until all queued frames (of one room, or everywhere) are sent."""
+        outboxes = [
+            outbox
+            for (rid, _), outbox in self._outboxes.items()
+            if room_id is None or rid == room_id
+        ]
+        for outbox in outboxes:
+            await outbox.drain()
+
+    def stats(self) -> dict[str, Any]:
+        """Queue and delivery metrics for this worker."""
+        depths = [len(outbox) for outbox in self._outboxes.values()]
+        return {
+            "worker": self.bus.worker_id,
+            "connections": len(self._outboxes),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped_frames": self.dropped_frames
+            + sum(outbox.dropped for outbox in self._outboxes.values()),
+            "overflow_disconnects": self.overflow_disconnects,
+        }
 
     def get_connections(self, room_id: str) -> dict[str, WebSocket]:
         return self._connections.get(room_id, {})
 
+    def room_ids(self) -> list[str]:
+        """Rooms with sockets on this worker."""
+        return list(self._connections)
+
+    async def wait_closed(self) -> None:
+        """Wait until all sockets being closed by this manager are closed."""
+        if self._closing:
+            await asyncio.gather(*self._closing)
+
+
+def _encode(
+    message: dict[str, Any] | str, protocol: str = codec.JSON
+) -> tuple[str, str | bytes]:
+    """Return (message type, encoded frame); pre-encoded frames have no type."""
+    if isinstance(message, str):
+        return "", codec.transcode(message, protocol)
+    return message.get("type", ""), codec.encode(message, protocol)
+
 
-manager = ConnectionManager()
+manager = ConnectionManager(bus=create_bus(BUS_URL))
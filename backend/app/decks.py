@@ -1,5 +1,11 @@
 from __future__ import annotations
 
+import hashlib
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
 SPECIAL_CARDS: list[dict] = [
     {"value": "?", "label": "?", "description": {
         "en": "Not enough information to estimate — story needs refinement",
@@ -191,28 +197,122 @@ DECK_TYPES = list(DECK_VALUES.keys())
 FLAVORS = ["technical", "idioms", "animals", "software"]
 
 
-def get_deck_cards(deck_type: str, flavor: str) -> list[dict]:
-    """Return card list with descriptions for a deck_type + flavor combo."""
-    values = DECK_VALUES.get(deck_type)
-    if values is None:
-        raise ValueError(f"Unknown deck type: {deck_type}")
-    descriptions = _ALL_DESCRIPTIONS.get(deck_type, {}).get(flavor)
-    if descriptions is None:
+@dataclass(frozen=True)
+class Deck:
+    """A deck_type + flavor combination, precomputed once.
+
+    `cards` and the card dicts are shared by every room and response;
+    treat them as read-only.
+    """
+
+    deck_type: str
+    flavor: str
+    cards: tuple[dict, ...]
+    json: bytes
+    etag: str
+
+    @property
+    def url(self) -> str:
+        """Versioned URL of the cards; cacheable forever (see main.api_get_deck)."""
+        version = self.etag.strip('"')
+        return f"/api/decks/{self.deck_type}/{self.flavor}?v={version}"
+
+    def ref(self) -> dict[str, str]:
+        """What room states carry instead of the cards."""
+        return {"deck_etag": self.etag, "deck_url": self.url}
+
+
+def _encode(data: Any) -> tuple[bytes, str]:
+    """Return compact JSON bytes (as FastAPI renders them) and a strong ETag."""
+    encoded = json.dumps(
+        data, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    return encoded, f'"{hashlib.sha256(encoded).hexdigest()[:32]}"'
+
+
+def _build_deck(deck_type: str, flavor: str, cards: Iterable[dict]) -> Deck:
+    frozen = tuple(cards)
+    encoded, etag = _encode(frozen)
+    return Deck(deck_type, flavor, frozen, encoded, etag)
+
+
+def _builtin_decks() -> dict[tuple[str, str], Deck]:
+    decks = {}
+    for deck_type, values in DECK_VALUES.items():
+        for flavor, descriptions in _ALL_DESCRIPTIONS[deck_type].items():
+            cards = [
+                {**card, "description": desc}
+                for card, desc in zip(values, descriptions)
+            ]
+            cards.extend(SPECIAL_CARDS)
+            decks[deck_type, flavor] = _build_deck(deck_type, flavor, cards)
+    return decks
+
+
+_BUILTIN_DECKS = _builtin_decks()
+
+# (deck_type, flavor) -> Deck; built-in entries plus decks registered at runtime
+_registry: dict[tuple[str, str], Deck] = dict(_BUILTIN_DECKS)
+
+# Encoded /api/decks response, rebuilt lazily after a registration
+_catalog: tuple[bytes, str] | None = None
+
+
+def register_deck(deck_type: str, flavor: str, cards: Iterable[dict]) -> Deck:
+    """Register a custom deck at runtime. Built-in decks cannot be replaced."""
+    global _catalog
+    if (deck_type, flavor) in _BUILTIN_DECKS:
+        raise ValueError(f"Cannot replace built-in deck '{deck_type}/{flavor}'")
+    cards = list(cards)
+    if not cards:
+        raise ValueError("A deck needs at least one card")
+    for card in cards:
+        if not {"value", "label", "description"} <= card.keys():
+            raise ValueError("Cards need a value, label and description")
+    deck = _build_deck(deck_type, flavor, cards)
+    _registry[deck_type, flavor] = deck
+    _catalog = None
+    return deck
+
+
+def get_deck(deck_type: str, flavor: str) -> Deck:
+    """Return the precomputed deck for a deck_type + flavor combo."""
+    deck = _registry.get((deck_type, flavor))
+    if deck is None:
+        if deck_type not in deck_types():
+            raise ValueError(f"Unknown deck type: {deck_type}")
         raise ValueError(f"Unknown flavor '{flavor}' for deck '{deck_type}'")
+    return deck
+
+
+def get_deck_cards(deck_type: str, flavor: str) -> tuple[dict, ...]:
+    """Return card list with descriptions for a deck_type + flavor combo."""
+    return get_deck(deck_type, flavor).cards
+
+
+def deck_types() -> list[str]:
+    """All registered deck types, built-in ones first."""
+    return list(dict.fromkeys(deck_type for deck_type, _ in _registry))
 
-    cards = []
-    for card, desc in zip(values, descriptions):
-        cards.append({**card, "description": desc})
-    # Append special cards
-    cards.extend(SPECIAL_CARDS)
-    return cards
+
+def flavors() -> list[str]:
+    """All registered flavors, built-in ones first."""
+    return list(dict.fromkeys(flavor for _, flavor in _registry))
 
 
 def get_all_decks() -> dict:
     """Return all deck definitions for the /api/decks endpoint."""
-    result = {}
-    for deck_type in DECK_TYPES:
-        result[deck_type] = {}
-        for flavor in FLAVORS:
-            result[deck_type][flavor] = get_deck_cards(deck_type, flavor)
+    result: dict[str, dict] = {}
+    for (deck_type, flavor), deck in _registry.items():
+        result.setdefault(deck_type, {})[flavor] = deck.cards
     return result
+
+
+def get_catalog() -> tuple[bytes, str]:
+    """Return the encoded /api/decks response and its ETag."""
+    global _catalog
+    if _catalog is None:
+        _catalog = _encode(
+            {"deck_types": deck_types(), "flavors": flavors(), "decks": get_all_decks()}
+        )
+    return _catalog
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Any
+
+from . import codec
+
+ROOM_STATE = "room_state"
+ROOM_PATCH = "room_patch"
+
+
+class StateFrames:
+    """One published room state version and its encoded WebSocket frames.
+
+    Each frame is encoded at most once per audience and protocol and reused
+    for every socket, sync request and snapshot until the room publishes a
+    new version. All roles currently share the same view, so the audiences
+    are the snapshot (`room_state`) and the delta (`room_patch`) clients.
+    """
+
+    __slots__ = ("version", "state", "patch", "_frames")
+
+    def __init__(
+        self, version: int, state: dict[str, Any], patch: dict[str, Any] | None
+    ) -> None:
+        self.version = version
+        self.state = state
+        # None when there is no previous version to diff against
+        self.patch = patch
+        # (audience, protocol) -> frame
+        self._frames: dict[tuple[str, str], str | bytes] = {}
+
+    @classmethod
+    def from_encoded(cls, version: int, frames: dict[str, str]) -> StateFrames:
+        """Rebuild a version from frames encoded elsewhere (e.g. another worker)."""
+        result = cls(version, {}, None)
+        for audience, data in frames.items():
+            result._frames[audience, codec.JSON] = data
+        return result
+
+    @property
+    def has_patch(self) -> bool:
+        return self.patch is not None or (ROOM_PATCH, codec.JSON) in self._frames
+
+    def frame(self, audience: str, protocol: str = codec.JSON) -> str | bytes:
+        data = self._frames.get((audience, protocol))
+        if data is None:
+            if not self.state and (audience, codec.JSON) in self._frames:
+                # Rebuilt from another worker's frames: no payload to encode
+                data = codec.transcode(self._frames[audience, codec.JSON], protocol)
+            else:
+                payload = self.patch if audience == ROOM_PATCH else self.state
+                data = codec.encode({"type": audience, "payload": payload}, protocol)
+            self._frames[audience, protocol] = data
+        return data
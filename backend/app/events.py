@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from typing import Any
+
+from . import analytics, history
+from .models import Participant, QueuedStory, Role, Room, Round
+
+
+def apply_event(room: Room, event: dict[str, Any]) -> None:
+    """Apply one validated room mutation.
+
+    Message handlers validate and then apply their change as an event, and
+    the journal replays the same events on startup, so both paths share
+    this code. Events are plain JSON-serializable dicts with a `type`.
+    """
+    kind = event["type"]
+    if kind == "join":
+        pid = event["participant_id"]
+        room.participants[pid] = Participant(
+            id=pid, name=event["name"], role=Role(event["role"])
+        )
+    elif kind == "vote":
+        room.current_round.set_vote(event["participant_id"], event["value"])
+    elif kind == "reveal":
+        room.current_round.revealed = True
+        _clear_timer(room.current_round)
+    elif kind == "new_round":
+        round_number = 1
+        if room.current_round:
+            analytics.table.add_round(room, room.current_round, _event_time(event))
+            room.history.append(room.current_round)
+            history.trim(room)
+            round_number = room.current_round.round_number + 1
+        if event.get("queued"):
+            room.queue.popleft()
+        room.current_round = Round(
+            story=event["story"],
+            story_link=event["story_link"],
+            round_number=round_number,
+        )
+    elif kind == "reset_round":
+        room.current_round.clear_votes()
+        room.current_round.revealed = False
+        room.current_round.round_number += 1
+        room.current_round.revotes += 1
+        _clear_timer(room.current_round)
+    elif kind == "kick":
+        pid = event["participant_id"]
+        room.participants.pop(pid, None)
+        if room.current_round:
+            room.current_round.remove_vote(pid)
+    elif kind == "start_timer":
+        room.current_round.timer_deadline = event["deadline"]
+        room.current_round.auto_reveal = event["auto_reveal"]
+    elif kind == "stop_timer":
+        _clear_timer(room.current_round)
+    elif kind == "queue_stories":
+        room.queue.extend(QueuedStory.from_dict(s) for s in event["stories"])
+        room.queued += len(event["stories"])
+    elif kind == "clear_queue":
+        room.queue.clear()
+    elif kind == "change_deck":
+        room.deck_type = event["deck_type"]
+        room.description_flavor = event["description_flavor"]
+    else:
+        raise ValueError(f"Unknown event type: {kind}")
+
+
+def _event_time(event: dict[str, Any]) -> float:
+    # Replayed events carry the time they were journaled
+    at = event.get("at")
+    return datetime.fromisoformat(at).timestamp() if at else time.time()
+
+
+def _clear_timer(round_: Round) -> None:
+    round_.timer_deadline = None
+    round_.auto_reveal = False
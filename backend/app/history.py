@@ -0,0 +1,289 @@
+"""Finished rounds of each room.
+
+A room keeps its last HISTORY_WINDOW rounds in `Room.history`; older ones
+are moved to a store, so a long session neither grows the room in memory
+nor every snapshot of it: a SQLite database, or Redis next to the rooms
+when they are shared there (ROOM_STORE_URL), so every worker sees the
+rounds archived by the others. Rounds are keyed by (room, round number),
+which only increases within a room, so replaying the journal stores the
+same rounds again without duplicates.
+
+Archiving happens while an event is applied on the event loop, so stores
+only queue their writes there; one writer thread carries them out, and
+reads, which run in threads, first wait for what is queued.
+
+Reads merge both parts in round order and page with the round number as
+cursor. Exports stream page by page.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import os
+import sqlite3
+import threading
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from . import codec
+from .models import Room, Round
+
+# Finished rounds kept in memory per room; older ones go to HISTORY_DB
+HISTORY_WINDOW = int(os.environ.get("HISTORY_WINDOW", "20"))
+# SQLite file for older rounds. Empty: history.sqlite3 in PERSIST_DIR, or an
+# in-memory database without one
+HISTORY_DB = os.environ.get("HISTORY_DB", "")
+# Rounds per page of the history API (default and maximum)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+CSV_FIELDS = (
+    "round_number",
+    "story",
+    "story_link",
+    "revealed",
+    "participant_id",
+    "name",
+    "value",
+)
+
+
+class HistoryStore:
+    """Finished rounds moved out of memory, written behind by one thread.
+
+    Subclasses store the queued changes in `_write` and read in `_page` and
+    `_count`.
+    """
+
+    def __init__(self) -> None:
+        # Serializes writes and reads of the backing store
+        self._lock = threading.Lock()
+        # ("archive", room_id, rows) and ("delete", room_id, None) not yet written
+        self._pending: list[tuple[str, str, Any]] = []
+        self._pending_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="history")
+
+    def _queue(self, op: tuple[str, str, Any]) -> None:
+        with self._pending_lock:
+            self._pending.append(op)
+            if len(self._pending) == 1:
+                self._writer.submit(self.flush)
+
+    def flush(self) -> None:
+        """Write the queued changes now."""
+        with self._lock:
+            with self._pending_lock:
+                ops, self._pending = self._pending, []
+            if ops:
+                self._write(ops)
+
+    def archive(self, room_id: str, rounds: list[Round]) -> None:
+        self._queue(("archive", room_id, [(r.round_number, r.to_dict()) for r in rounds]))
+
+    def delete_room(self, room_id: str) -> None:
+        self._queue(("delete", room_id, None))
+
+    def page(self, room_id: str, after: int | None, limit: int) -> list[Round]:
+        """Rounds with a round number above `after`, oldest first."""
+        self.flush()
+        with self._lock:
+            return self._page(room_id, -1 if after is None else after, limit)
+
+    def count(self, room_id: str) -> int:
+        self.flush()
+        with self._lock:
+            return self._count(room_id)
+
+    def clear(self) -> None:
+        with self._pending_lock:
+            self._pending.clear()
+        with self._lock:
+            self._clear()
+
+    def _write(self, ops: list[tuple[str, str, Any]]) -> None:
+        raise NotImplementedError
+
+    def _page(self, room_id: str, after: int, limit: int) -> list[Round]:
+        raise NotImplementedError
+
+    def _count(self, room_id: str) -> int:
+        raise NotImplementedError
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """Rounds in a SQLite database of this worker, one row per round."""
+
+    def __init__(self, path: str | Path = ":memory:") -> None:
+        super().__init__()
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Used by the writer thread and the request threads, one at a time
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rounds ("
+                " room_id TEXT NOT NULL,"
+                " round_number INTEGER NOT NULL,"
+                " data BLOB NOT NULL,"
+                " PRIMARY KEY (room_id, round_number)"
+                ") WITHOUT ROWID"
+            )
+
+    def _write(self, ops: list[tuple[str, str, Any]]) -> None:
+        with self._db:
+            for kind, room_id, rows in ops:
+                if kind == "archive":
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO rounds VALUES (?, ?, ?)",
+                        [(room_id, n, codec.dumps(data)) for n, data in rows],
+                    )
+                else:
+                    self._db.execute("DELETE FROM rounds WHERE room_id = ?", (room_id,))
+
+    def _page(self, room_id: str, after: int, limit: int) -> list[Round]:
+        rows = self._db.execute(
+            "SELECT data FROM rounds WHERE room_id = ? AND round_number > ?"
+            " ORDER BY round_number LIMIT ?",
+            (room_id, after, limit),
+        ).fetchall()
+        return [Round.from_dict(codec.loads(data)) for (data,) in rows]
+
+    def _count(self, room_id: str) -> int:
+        (count,) = self._db.execute(
+            "SELECT COUNT(*) FROM rounds WHERE room_id = ?", (room_id,)
+        ).fetchone()
+        return count
+
+    def _clear(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM rounds")
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+
+def _default_path() -> str:
+    if HISTORY_DB:
+        return HISTORY_DB
+    persist_dir = os.environ.get("PERSIST_DIR", "")
+    return str(Path(persist_dir) / "history.sqlite3") if persist_dir else ":memory:"
+
+
+def _create_store() -> HistoryStore:
+    # Shared like the rooms themselves (see rooms.ROOM_STORE_URL)
+    url = os.environ.get("ROOM_STORE_URL", "")
+    if not url:
+        return SQLiteHistoryStore(_default_path())
+    from .redis_store import RedisHistoryStore
+
+    return RedisHistoryStore.from_url(url)
+
+
+store = _create_store()
+
+
+def trim(room: Room) -> None:
+    """Move the rounds beyond the in-memory window to the store."""
+    excess = len(room.history) - HISTORY_WINDOW
+    if excess > 0:
+        store.archive(room.id, room.history[:excess])
+        del room.history[:excess]
+
+
+def page(room: Room, after: int | None = None, limit: int = PAGE_SIZE) -> list[Round]:
+    """Up to `limit` finished rounds after round number `after`, oldest first."""
+    return _merge(room, store.page(room.id, after, limit), after, limit)
+
+
+def _merge(room: Room, rounds: list[Round], after: int | None, limit: int) -> list[Round]:
+    """Continue the stored `rounds` with those still in the room."""
+    if len(rounds) < limit:
+        if rounds:
+            after = rounds[-1].round_number
+        recent = [r for r in room.history if after is None or r.round_number > after]
+        rounds.extend(recent[: limit - len(rounds)])
+    return rounds
+
+
+def iter_rounds(room: Room, page_size: int = MAX_PAGE_SIZE) -> Iterator[Round]:
+    after = None
+    while True:
+        rounds = page(room, after, page_size)
+        yield from rounds
+        if len(rounds) < page_size:
+            return
+        after = rounds[-1].round_number
+
+
+async def _iter_rounds_off_loop(
+    room: Room, page_size: int = MAX_PAGE_SIZE
+) -> AsyncIterator[Round]:
+    """Like `iter_rounds`, for the event loop: the store is read in a thread."""
+    after = None
+    while True:
+        stored = await asyncio.to_thread(store.page, room.id, after, page_size)
+        rounds = _merge(room, stored, after, page_size)
+        for round_ in rounds:
+            yield round_
+        if len(rounds) < page_size:
+            return
+        after = rounds[-1].round_number
+
+
+def count(room: Room) -> int:
+    return store.count(room.id) + len(room.history)
+
+
+def round_record(room: Room, round_: Round) -> dict[str, Any]:
+    """A finished round as exposed by the API; votes only if revealed.
+
+    Names are those of participants still in the room.
+    """
+    votes = []
+    for pid, vote in round_.votes.items():
+        participant = room.participants.get(pid)
+        votes.append(
+            {
+                "participant_id": pid,
+                "name": participant.name if participant else None,
+                "value": vote.value if round_.revealed else None,
+            }
+        )
+    return {
+        "round_number": round_.round_number,
+        "story": round_.story,
+        "story_link": round_.story_link,
+        "revealed": round_.revealed,
+        "votes": votes,
+    }
+
+
+async def export_ndjson(room: Room) -> AsyncIterator[bytes]:
+    """One JSON round record per line, produced page by page."""
+    async for round_ in _iter_rounds_off_loop(room):
+        yield codec.dumps(round_record(room, round_)) + b"\n"
+
+
+async def export_csv(room: Room) -> AsyncIterator[str]:
+    """One row per vote (one per round without votes), produced page by page."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    async for round_ in _iter_rounds_off_loop(room):
+        record = round_record(room, round_)
+        for vote in record["votes"] or [{}]:
+            writer.writerow({**record, **vote})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TextIO
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Append-only event log on local disk with periodic compacted snapshots.
+
+    `snapshot.json` holds the full state up to a sequence number and
+    `events.log` the events after it, one JSON object per line. Appending
+    only writes to the file buffer; with a positive `fsync_interval` a
+    background task flushes and fsyncs the log in batches, so an event is
+    durable after at most that long. With 0 every append is synced.
+
+    Background compaction only builds the snapshot on the event loop and
+    moves the log aside to `events.log.old`; serializing, writing and
+    syncing the snapshot happen in a thread while new events go to a fresh
+    log. Until the snapshot is in place, `load` reads both logs.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        fsync_interval: float = 0.05,
+        snapshot_events: int = 10_000,
+    ) -> None:
+        self.directory = Path(directory)
+        self.fsync_interval = fsync_interval
+        # Compact once this many events were logged since the last snapshot
+        self.snapshot_events = snapshot_events
+        self.seq = 0
+        self.pending = 0
+        self._file: TextIO | None = None
+        self._dirty = False
+        # Serializes snapshot writes; a write older than the last one is skipped
+        self._write_lock = threading.Lock()
+        self._written_seq = -1
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory / "snapshot.json"
+
+    @property
+    def log_path(self) -> Path:
+        return self.directory / "events.log"
+
+    @property
+    def old_log_path(self) -> Path:
+        """Log moved aside by a background compaction that has not finished."""
+        return self.directory / "events.log.old"
+
+    def load(self) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+        """Read the last snapshot and the events logged after it."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        snapshot = None
+        if self.snapshot_path.exists():
+            snapshot = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            self.seq = snapshot["seq"]
+        events = []
+        for path in (self.old_log_path, self.log_path):
+            if not path.exists():
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn write of the last entry before a crash
+                        logger.warning("Ignoring incomplete journal entry")
+                        break
+                    # Events up to the snapshot survive a crash during compaction
+                    if event["seq"] > self.seq:
+                        events.append(event)
+                        self.seq = event["seq"]
+        self.pending = len(events)
+        return snapshot, events
+
+    def append(self, event: dict[str, Any]) -> None:
+        if self._file is None:
+            raise RuntimeError("Journal is not open")
+        self.seq += 1
+        self._file.write(json.dumps({"seq": self.seq, **event}) + "\n")
+        self.pending += 1
+        if self.fsync_interval <= 0:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        else:
+            self._dirty = True
+
+    def _write_snapshot(self, seq: int, snapshot: dict[str, Any]) -> None:
+        """Atomically replace the snapshot with the state up to event `seq`."""
+        with self._write_lock:
+            if seq <= self._written_seq:
+                return
+            tmp = self.snapshot_path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"seq": seq, **snapshot}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            self._written_seq = seq
+            self.old_log_path.unlink(missing_ok=True)
+
+    def _new_log(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.log_path, "w", encoding="utf-8")
+        self.pending = 0
+        self._dirty = False
+
+    def compact(self, snapshot: dict[str, Any]) -> None:
+        """Write `snapshot` (the state after the last event) and start a new log."""
+        self._write_snapshot(self.seq, snapshot)
+        self._new_log()
+
+    async def compact_in_background(self, snapshot: dict[str, Any]) -> None:
+        """Like `compact`, with the snapshot written in a thread.
+
+        `snapshot` must not share mutable objects with the live state.
+        """
+        if self._file is not None:
+            self._file.flush()
+            if self.old_log_path.exists():
+                # The previous snapshot write failed; its log is still needed
+                with open(self.old_log_path, "a", encoding="utf-8") as old:
+                    old.write(self.log_path.read_text(encoding="utf-8"))
+                self.log_path.unlink()
+            else:
+                os.replace(self.log_path, self.old_log_path)
+        seq = self.seq
+        self._new_log()
+        await asyncio.to_thread(self._write_snapshot, seq, snapshot)
+
+    async def run(self, snapshot: Callable[[], dict[str, Any]]) -> None:
+        """Background task: batched fsync and compaction.
+
+        Failures are logged and retried on the next tick; the log keeps
+        taking events meanwhile.
+        """
+        while True:
+            await asyncio.sleep(self.fsync_interval if self.fsync_interval > 0 else 1.0)
+            try:
+                if self._dirty and self._file is not None:
+                    self._file.flush()
+                    self._dirty = False
+                    await asyncio.to_thread(os.fsync, self._file.fileno())
+                if self.pending >= self.snapshot_events:
+                    await self.compact_in_background(snapshot())
+            except Exception:
+                logger.exception("Journal sync or compaction failed")
+
+    def close(self, snapshot: dict[str, Any]) -> None:
+        self.compact(snapshot)
+        self._file.close()
+        self._file = None
@@ -0,0 +1,62 @@
+"""Dissolution of idle rooms.
+
+A room without activity for ROOM_EXPIRY_SECONDS is deleted together with
+its tokens, its round timer and any pending broadcast. Every socket still
+in the room, on any worker, gets a `room_closed` message and is then closed
+with ROOM_CLOSED_CODE; the sockets of a room are closed concurrently.
+
+Rooms in Redis expire on their own, so each worker also closes its sockets
+of rooms that no longer exist in the store.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any
+
+from . import codec, history, rooms
+from .connection_manager import manager
+from .ws import release_room
+
+# `reason` of the room_closed message
+EXPIRED = "expired"
+
+
+def _closed_message(reason: str) -> dict[str, Any]:
+    return {"type": "room_closed", "payload": {"reason": reason}}
+
+
+async def dissolve_expired_rooms() -> int:
+    """Dissolve rooms past their expiry. Returns the number dissolved."""
+    expired = rooms.expire_rooms()
+    for room_id in expired:
+        release_room(room_id)
+        await manager.close_room(room_id, _closed_message(EXPIRED))
+    orphaned = [
+        rid
+        for rid in manager.room_ids()
+        if await rooms.off_loop(rooms.get_room, rid) is None
+    ]
+    if orphaned:
+        frame = codec.dumps_text(_closed_message(EXPIRED))
+        for room_id in orphaned:
+            release_room(room_id)
+            history.store.delete_room(room_id)
+            manager.close_local(room_id, frame)
+    return len(expired)
+
+
+async def periodic_cleanup(interval: int = 300) -> None:
+    """Background task that dissolves expired rooms.
+
+    Wakes up at the next expiry deadline, at least every `interval` seconds.
+    """
+    while True:
+        delay = interval
+        next_expiry = rooms.store.next_expiry()
+        if next_expiry is not None:
+            until = (next_expiry - datetime.now(timezone.utc)).total_seconds()
+            delay = min(interval, max(until, 0.1))
+        await asyncio.sleep(delay)
+        await dissolve_expired_rooms()
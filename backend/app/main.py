@@ -1,27 +1,63 @@
 import asyncio
 import os
+import secrets
 from contextlib import asynccontextmanager
+from datetime import date
 from pathlib import Path
 from typing import AsyncGenerator
 
-from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 
-from .decks import DECK_TYPES, FLAVORS, get_all_decks, get_deck_cards
+from . import analytics, history, metrics, rooms, sharding, stories
+from .connection_manager import manager
+from .decks import deck_types, flavors, get_catalog, get_deck, get_deck_cards
+from .lifecycle import periodic_cleanup
 from .models import CreateRoomRequest, CreateRoomResponse
-from .rooms import create_room, get_room, periodic_cleanup
-from .ws import websocket_endpoint
+from .rooms import (
+    RoomBusy,
+    close_journal,
+    create_room,
+    get_moderator_token,
+    get_room,
+    off_loop,
+    periodic_persist,
+    restore_rooms,
+)
+from .ws import restore_timers, timers, update_room, websocket_endpoint
 
 STATIC_DIR = Path(os.environ.get("STATIC_DIR", "static"))
 
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Bearer token for /api/admin/*; empty disables the admin API
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    task = asyncio.create_task(periodic_cleanup())
+    restore_rooms()
+    restore_timers()
+    await manager.start()
+    timers.start()
+    tasks = [
+        asyncio.create_task(periodic_cleanup()),
+        asyncio.create_task(periodic_persist()),
+    ]
     yield
-    task.cancel()
+    for task in tasks:
+        task.cancel()
+    await timers.stop()
+    close_journal()
+    await manager.stop()
 
 
 app = FastAPI(title="BDA Poker", lifespan=lifespan)
@@ -34,42 +70,317 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(RoomBusy)
+async def room_busy(request: Request, exc: RoomBusy) -> JSONResponse:
+    return JSONResponse({"detail": "Room is busy, try again"}, status_code=503)
+
+
 @app.post("/api/rooms", response_model=CreateRoomResponse)
-def api_create_room(req: CreateRoomRequest) -> CreateRoomResponse:
-    if req.deck_type not in DECK_TYPES:
-        raise HTTPException(400, f"Invalid deck_type. Choose from: {DECK_TYPES}")
-    if req.description_flavor not in FLAVORS:
-        raise HTTPException(400, f"Invalid flavor. Choose from: {FLAVORS}")
-    room, token = create_room(req.deck_type, req.description_flavor)
+async def api_create_room(req: CreateRoomRequest, request: Request) -> CreateRoomResponse:
+    if req.deck_type not in deck_types():
+        raise HTTPException(400, f"Invalid deck_type. Choose from: {deck_types()}")
+    try:
+        get_deck_cards(req.deck_type, req.description_flavor)
+    except ValueError:
+        raise HTTPException(400, f"Invalid flavor. Choose from: {flavors()}")
+    shards = sharding.shards
+    if not shards.is_forwarded(request.headers):
+        owner = shards.pick()
+        if owner != shards.self_url:
+            try:
+                created = await asyncio.to_thread(
+                    shards.forward_create, owner, req.model_dump()
+                )
+                return CreateRoomResponse(**created)
+            except OSError:
+                raise HTTPException(503, "Shard unavailable")
+    room, token = await off_loop(create_room, req.deck_type, req.description_flavor)
     return CreateRoomResponse(room_id=room.id, moderator_token=token)
 
 
 @app.get("/api/rooms/{room_id}")
 def api_get_room(room_id: str) -> dict:
+    if not sharding.shards.owns(room_id):
+        return RedirectResponse(sharding.shards.url(room_id, f"/api/rooms/{room_id}"), 307)
     room = get_room(room_id)
     if room is None:
         raise HTTPException(404, "Room not found")
-    deck_cards = get_deck_cards(room.deck_type, room.description_flavor)
+    deck = get_deck(room.deck_type, room.description_flavor)
     return {
         "id": room.id,
         "deck_type": room.deck_type,
         "description_flavor": room.description_flavor,
-        "deck_cards": deck_cards,
+        **deck.ref(),
         "participant_count": len(room.participants),
     }
 
 
+def _shard_redirect(room_id: str, request: Request) -> RedirectResponse | None:
+    """Redirect to the worker owning the room, None if that is this one."""
+    if sharding.shards.owns(room_id):
+        return None
+    path = request.url.path
+    if request.url.query:
+        path = f"{path}?{request.url.query}"
+    return RedirectResponse(sharding.shards.url(room_id, path), 307)
+
+
+@app.get("/api/rooms/{room_id}/history")
+def api_get_history(
+    room_id: str,
+    request: Request,
+    cursor: int | None = None,
+    limit: int = Query(history.PAGE_SIZE, ge=1, le=history.MAX_PAGE_SIZE),
+) -> dict:
+    """Finished rounds, oldest first; pass `next_cursor` to get the next page."""
+    redirect = _shard_redirect(room_id, request)
+    if redirect is not None:
+        return redirect
+    room = get_room(room_id)
+    if room is None:
+        raise HTTPException(404, "Room not found")
+    rounds = history.page(room, cursor, limit)
+    return {
+        "rounds": [history.round_record(room, r) for r in rounds],
+        "next_cursor": rounds[-1].round_number if len(rounds) == limit else None,
+    }
+
+
+@app.get("/api/rooms/{room_id}/history/export")
+def api_export_history(
+    room_id: str,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+) -> Response:
+    """All finished rounds as NDJSON (one round per line) or CSV (one vote per row)."""
+    redirect = _shard_redirect(room_id, request)
+    if redirect is not None:
+        return redirect
+    room = get_room(room_id)
+    if room is None:
+        raise HTTPException(404, "Room not found")
+    if format == "csv":
+        body, media_type = history.export_csv(room), "text/csv; charset=utf-8"
+    else:
+        body, media_type = history.export_ndjson(room), "application/x-ndjson"
+    filename = f"bdapoker-{room.id}-history.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+async def _require_moderator(room_id: str, request: Request) -> None:
+    token = await off_loop(get_moderator_token, room_id) or ""
+    auth = request.headers.get("authorization", "")
+    if not token or not secrets.compare_digest(auth.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(401, "Invalid moderator token")
+
+
+@app.get("/api/rooms/{room_id}/stories")
+def api_get_stories(
+    room_id: str,
+    request: Request,
+    cursor: int | None = None,
+    limit: int = Query(stories.PAGE_SIZE, ge=1, le=stories.MAX_PAGE_SIZE),
+) -> dict:
+    """Queued stories, next one first; pass `next_cursor` to get the next page."""
+    redirect = _shard_redirect(room_id, request)
+    if redirect is not None:
+        return redirect
+    room = get_room(room_id)
+    if room is None:
+        raise HTTPException(404, "Room not found")
+    queued = stories.page(room, cursor, limit)
+    return {
+        "stories": queued,
+        "count": len(room.queue),
+        "next_cursor": queued[-1]["position"] if len(queued) == limit else None,
+    }
+
+
+@app.post("/api/rooms/{room_id}/stories")
+async def api_queue_stories(
+    room_id: str,
+    request: Request,
+    format: str | None = Query(None, pattern="^(csv|json|ndjson)$"),
+) -> dict:
+    """Append stories to the queue from a CSV, JSON array or NDJSON upload.
+
+    The format is given by `format` or the Content-Type. Moderator only
+    (`Authorization: Bearer <moderator_token>`).
+    """
+    redirect = _shard_redirect(room_id, request)
+    if redirect is not None:
+        return redirect
+    room = await off_loop(get_room, room_id)
+    if room is None:
+        raise HTTPException(404, "Room not found")
+    await _require_moderator(room_id, request)
+    format = format or stories.format_of(request.headers.get("content-type", ""))
+    if format is None:
+        raise HTTPException(415, f"Upload one of: {list(stories.FORMATS)}")
+    try:
+        queued = await stories.parse(
+            format, request.stream(), stories.STORY_QUEUE_MAX - len(room.queue)
+        )
+    except stories.QueueFull as e:
+        raise HTTPException(413, str(e))
+    except stories.StoryImportError as e:
+        raise HTTPException(400, str(e))
+    if queued:
+        event = {"type": "queue_stories", "stories": [s.to_dict() for s in queued]}
+        room = await update_room(room_id, event)
+        if room is None:
+            raise HTTPException(404, "Room not found")
+    return {"queued": len(queued), "count": len(room.queue)}
+
+
+@app.delete("/api/rooms/{room_id}/stories", status_code=204)
+async def api_clear_stories(room_id: str, request: Request) -> Response:
+    """Empty the story queue. Moderator only."""
+    redirect = _shard_redirect(room_id, request)
+    if redirect is not None:
+        return redirect
+    if await off_loop(get_room, room_id) is None:
+        raise HTTPException(404, "Room not found")
+    await _require_moderator(room_id, request)
+    if await update_room(room_id, {"type": "clear_queue"}) is None:
+        raise HTTPException(404, "Room not found")
+    return Response(status_code=204)
+
+
 @app.get("/api/decks")
-def api_get_decks() -> dict:
+def api_get_decks(request: Request) -> Response:
+    body, etag = get_catalog()
+    headers = {"ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/decks/{deck_type}/{flavor}")
+def api_get_deck(
+    deck_type: str, flavor: str, request: Request, v: str | None = None
+) -> Response:
+    """Cards of one deck; immutable under its versioned `deck_url` (?v=ETag)."""
+    try:
+        deck = get_deck(deck_type, flavor)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    versioned = v is not None and f'"{v}"' == deck.etag
+    headers = {
+        "ETag": deck.etag,
+        "Cache-Control": IMMUTABLE if versioned else "no-cache",
+    }
+    if request.headers.get("if-none-match") == deck.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(deck.json, media_type="application/json", headers=headers)
+
+
+def _require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Not Found")
+    auth = request.headers.get("authorization", "")
+    if not secrets.compare_digest(auth.encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+        raise HTTPException(401, "Invalid admin token")
+
+
+@app.get("/api/admin/analytics")
+async def api_analytics(
+    request: Request,
+    group_by: list[str] = Query([""]),
+    since: date | None = None,
+    until: date | None = None,
+    room: str | None = None,
+    deck: str | None = None,
+    flavor: str | None = None,
+) -> dict:
+    """Estimation analytics of this worker's rooms.
+
+    Each `group_by` (comma separated dimensions, repeatable) is one grouping
+    of the same selection; without dimensions it gives the totals.
+    """
+    _require_admin(request)
+    groupings = []
+    for spec in group_by:
+        dims = [dim for dim in spec.split(",") if dim]
+        unknown = set(dims) - set(analytics.DIMENSIONS)
+        if unknown:
+            raise HTTPException(
+                400, f"Unknown dimension. Choose from: {list(analytics.DIMENSIONS)}"
+            )
+        groupings.append(dims)
+    # Copied on the loop, which keeps adding rounds; queried in a thread
+    table = analytics.table.copy()
+
+    def query() -> list[list[dict]]:
+        cells = table.select(since=since, until=until, room=room, deck=deck, flavor=flavor)
+        return table.query(groupings, cells)
+
+    results = await asyncio.to_thread(query)
     return {
-        "deck_types": DECK_TYPES,
-        "flavors": FLAVORS,
-        "decks": get_all_decks(),
+        "groupings": [
+            {"group_by": dims, "groups": groups}
+            for dims, groups in zip(groupings, results)
+        ]
     }
 
 
+def _stat(name: str) -> float:
+    return manager.stats()[name]
+
+
+for _metric in (
+    metrics.Gauge("bdapoker_rooms", "Rooms in the store", lambda: rooms.store.count()),
+    metrics.Gauge(
+        "bdapoker_websocket_connections",
+        "Open WebSocket connections on this worker",
+        lambda: _stat("connections"),
+    ),
+    metrics.Gauge(
+        "bdapoker_queued_frames", "Frames waiting in socket outboxes",
+        lambda: _stat("queued_frames"),
+    ),
+    metrics.Gauge(
+        "bdapoker_max_queue_depth", "Longest socket outbox",
+        lambda: _stat("max_queue_depth"),
+    ),
+    metrics.CallbackCounter(
+        "bdapoker_dropped_frames", "Room state frames dropped for lagging sockets",
+        lambda: _stat("dropped_frames"),
+    ),
+    metrics.CallbackCounter(
+        "bdapoker_overflow_disconnects", "Sockets closed because their outbox overflowed",
+        lambda: _stat("overflow_disconnects"),
+    ),
+):
+    metrics.REGISTRY.register(_metric)
+
+
+@app.get("/metrics")
+def api_metrics(request: Request) -> Response:
+    openmetrics = "application/openmetrics-text" in request.headers.get("accept", "")
+    return Response(
+        metrics.REGISTRY.render(openmetrics=openmetrics),
+        media_type=(
+            metrics.OPENMETRICS_CONTENT_TYPE if openmetrics
+            else metrics.PROMETHEUS_CONTENT_TYPE
+        ),
+    )
+
+
 @app.websocket("/api/rooms/{room_id}/ws")
 async def ws_endpoint(websocket: WebSocket, room_id: str) -> None:
+    if not sharding.shards.owns(room_id):
+        # Browsers don't follow WebSocket redirects; the client reconnects
+        # to the owner given in the close reason.
+        await websocket.accept()
+        await websocket.close(
+            code=sharding.WRONG_SHARD_CLOSE_CODE, reason=sharding.shards.ws_url(room_id)
+        )
+        return
     await websocket_endpoint(websocket, room_id)
 
 
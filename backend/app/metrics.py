@@ -0,0 +1,209 @@
+"""Counters, gauges and histograms rendered as Prometheus or OpenMetrics text.
+
+Recording happens on the event loop thread, so metrics are plain numbers
+in dicts: no locks, one dict update (plus a bisect for histograms) per
+observation.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+from collections.abc import Callable, Iterator
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Seconds; handler, cleanup
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0
+)
+# Sockets per broadcast
+FANOUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+Labels = tuple[str, ...]
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, labels: Labels = ()) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self, openmetrics: bool) -> Iterator[str]:
+        for labels, value in self._values.items():
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_total{label_text} {_format_value(value)}"
+
+
+class Gauge:
+    """A value read from `collect` at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, collect: Callable[[], float]) -> None:
+        self.name = name
+        self.help = help
+        self.collect = collect
+
+    def samples(self, openmetrics: bool) -> Iterator[str]:
+        yield f"{self.name} {_format_value(self.collect())}"
+
+
+class CallbackCounter(Gauge):
+    """A monotonic total kept elsewhere (e.g. in ConnectionManager)."""
+
+    type = "counter"
+
+    def samples(self, openmetrics: bool) -> Iterator[str]:
+        yield f"{self.name}_total {_format_value(self.collect())}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: tuple[float, ...],
+        labelnames: Labels = (),
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket (last: +Inf), sum]
+        self._values: dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def count(self, labels: Labels = ()) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self, openmetrics: bool) -> Iterator[str]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield (
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)}"
+                    f" {cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total)}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+Metric = Counter | Gauge | Histogram
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, openmetrics: bool = False) -> str:
+        lines = []
+        for metric in self.metrics:
+            # Prometheus text names the counter family after its samples
+            name = metric.name
+            if metric.type == "counter" and not openmetrics:
+                name += "_total"
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.samples(openmetrics))
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+MESSAGES = REGISTRY.register(
+    Counter("bdapoker_messages", "WebSocket messages handled", ("type",))
+)
+MESSAGE_DURATION = REGISTRY.register(
+    Histogram(
+        "bdapoker_message_duration_seconds",
+        "Time to handle a WebSocket message",
+        LATENCY_BUCKETS,
+        ("type",),
+    )
+)
+BROADCAST_FANOUT = REGISTRY.register(
+    Histogram(
+        "bdapoker_broadcast_fanout",
+        "Local sockets a broadcast was delivered to",
+        FANOUT_BUCKETS,
+    )
+)
+BROADCAST_BYTES = REGISTRY.register(
+    Counter("bdapoker_broadcast_bytes", "Bytes queued for local sockets by broadcasts")
+)
+SEND_ERRORS = REGISTRY.register(
+    Counter("bdapoker_send_errors", "Frames that could not be written to a socket")
+)
+CLEANUP_DURATION = REGISTRY.register(
+    Histogram(
+        "bdapoker_cleanup_duration_seconds",
+        "Duration of expired room cleanups",
+        LATENCY_BUCKETS,
+    )
+)
+CLEANUP_REMOVED = REGISTRY.register(
+    Counter("bdapoker_cleanup_rooms_removed", "Rooms removed by expiry cleanup")
+)
+ROOM_CLOSE_SOCKETS = REGISTRY.register(
+    Counter("bdapoker_room_close_sockets", "Sockets closed because their room was dissolved")
+)
+WS_PAYLOAD_BYTES = REGISTRY.register(
+    Counter(
+        "bdapoker_ws_payload_bytes",
+        "Bytes of outgoing messages on permessage-deflate connections, uncompressed",
+    )
+)
+WS_WIRE_BYTES = REGISTRY.register(
+    Counter(
+        "bdapoker_ws_wire_bytes",
+        "Bytes of outgoing messages on permessage-deflate connections, as sent",
+    )
+)
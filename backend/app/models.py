@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from enum import StrEnum
+from typing import Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from .decks import get_deck
+from .stats import VoteStats
 
 
 class Role(StrEnum):
@@ -12,50 +18,167 @@ class Role(StrEnum):
     SPECTATOR = "spectator"
 
 
-class Participant(BaseModel):
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# Live room state uses slotted dataclasses: no per-field validation or
+# __dict__ per object. Input is validated by the message handlers; pydantic
+# models are only used at the REST boundary.
+
+
+@dataclass(slots=True)
+class Participant:
     id: str
     name: str
     role: Role
     connected: bool = True
 
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "role": self.role,
+            "connected": self.connected,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Participant:
+        return cls(data["id"], data["name"], Role(data["role"]), data["connected"])
+
 
-class Vote(BaseModel):
+@dataclass(slots=True)
+class Vote:
     participant_id: str
     value: str
 
+    def to_dict(self) -> dict[str, Any]:
+        return {"participant_id": self.participant_id, "value": self.value}
 
-class Round(BaseModel):
+
+@dataclass(slots=True)
+class Round:
     story: str = ""
     story_link: str | None = None
-    votes: dict[str, Vote] = {}
+    votes: dict[str, Vote] = field(default_factory=dict)
     revealed: bool = False
     round_number: int = 1
+    # Unix timestamp at which the running timer ends, None without a timer
+    timer_deadline: float | None = None
+    # Reveal the votes when the timer ends
+    auto_reveal: bool = False
+    # Times the votes were reset for another try
+    revotes: int = 0
+    # Aggregates of `votes`, built on first use and then kept up to date
+    _stats: VoteStats | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def vote_stats(self) -> VoteStats:
+        if self._stats is None:
+            self._stats = VoteStats(v.value for v in self.votes.values())
+        return self._stats
+
+    def set_vote(self, participant_id: str, value: str) -> None:
+        stats = self.vote_stats
+        old = self.votes.get(participant_id)
+        if old is not None:
+            stats.remove(old.value)
+        self.votes[participant_id] = Vote(participant_id=participant_id, value=value)
+        stats.add(value)
 
+    def remove_vote(self, participant_id: str) -> None:
+        stats = self.vote_stats
+        vote = self.votes.pop(participant_id, None)
+        if vote is not None:
+            stats.remove(vote.value)
 
-class Room(BaseModel):
+    def clear_votes(self) -> None:
+        self.votes = {}
+        self._stats = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "story": self.story,
+            "story_link": self.story_link,
+            "votes": {pid: v.to_dict() for pid, v in self.votes.items()},
+            "revealed": self.revealed,
+            "round_number": self.round_number,
+            "timer_deadline": self.timer_deadline,
+            "auto_reveal": self.auto_reveal,
+            "revotes": self.revotes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Round:
+        return cls(
+            story=data["story"],
+            story_link=data["story_link"],
+            votes={
+                pid: Vote(v["participant_id"], v["value"])
+                for pid, v in data["votes"].items()
+            },
+            revealed=data["revealed"],
+            round_number=data["round_number"],
+            timer_deadline=data.get("timer_deadline"),
+            auto_reveal=data.get("auto_reveal", False),
+            revotes=data.get("revotes", 0),
+        )
+
+
+@dataclass(slots=True)
+class QueuedStory:
+    story: str
+    story_link: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"story": self.story, "story_link": self.story_link}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> QueuedStory:
+        return cls(data["story"], data.get("story_link"))
+
+
+@dataclass(slots=True)
+class Room:
     id: str
     deck_type: str = "fibonacci"
     description_flavor: str = "technical"
-    participants: dict[str, Participant] = {}
+    participants: dict[str, Participant] = field(default_factory=dict)
     current_round: Round | None = None
-    history: list[Round] = []
-    created_at: datetime = datetime.now(timezone.utc)
-    last_activity: datetime = datetime.now(timezone.utc)
+    history: list[Round] = field(default_factory=list)
+    # Upcoming stories, taken from the front by new_round
+    queue: deque[QueuedStory] = field(default_factory=deque)
+    # Stories ever queued; the front of the queue has position queued - len(queue)
+    queued: int = 0
+    created_at: datetime = field(default_factory=_now)
+    last_activity: datetime = field(default_factory=_now)
+    # Incremented every time a new room_state is published to clients
+    version: int = 0
 
     def touch(self) -> None:
-        self.last_activity = datetime.now(timezone.utc)
+        self.last_activity = _now()
+
+    @property
+    def queue_start(self) -> int:
+        """Position of the next queued story."""
+        return self.queued - len(self.queue)
 
-    def public_state(self, deck_cards: list[dict]) -> dict:
-        """Serialize room state for broadcast, hiding votes if not revealed."""
+    def public_state(self) -> dict:
+        """Serialize room state for broadcast, hiding votes if not revealed.
+
+        The deck is only referenced; clients load the cards from `deck_url`.
+        Of the story queue only its length and next story are included; the
+        rest is paged through the REST API.
+        """
         participants = {
-            pid: p.model_dump() for pid, p in self.participants.items()
+            pid: p.to_dict() for pid, p in self.participants.items()
         }
         current_round = None
         if self.current_round:
             cr = self.current_round
             if cr.revealed:
                 votes = {
-                    pid: v.model_dump() for pid, v in cr.votes.items()
+                    pid: v.to_dict() for pid, v in cr.votes.items()
                 }
             else:
                 votes = {
@@ -68,6 +191,15 @@ class Room(BaseModel):
                 "votes": votes,
                 "revealed": cr.revealed,
                 "round_number": cr.round_number,
+                "timer_deadline": cr.timer_deadline,
+                "auto_reveal": cr.auto_reveal,
+                # "X of Y voted"
+                "vote_count": cr.vote_stats.votes,
+                "voter_count": len([
+                    pid
+                    for pid, p in self.participants.items()
+                    if p.role is not Role.SPECTATOR and (p.connected or pid in cr.votes)
+                ]),
             }
         return {
             "id": self.id,
@@ -75,9 +207,53 @@ class Room(BaseModel):
             "description_flavor": self.description_flavor,
             "participants": participants,
             "current_round": current_round,
-            "deck_cards": deck_cards,
+            "story_queue": {
+                "count": len(self.queue),
+                "next": (
+                    {"position": self.queue_start, **self.queue[0].to_dict()}
+                    if self.queue
+                    else None
+                ),
+            },
+            **get_deck(self.deck_type, self.description_flavor).ref(),
+            "version": self.version,
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        """Complete JSON-serializable state, for stores and snapshots."""
+        return {
+            "id": self.id,
+            "deck_type": self.deck_type,
+            "description_flavor": self.description_flavor,
+            "participants": {pid: p.to_dict() for pid, p in self.participants.items()},
+            "current_round": self.current_round.to_dict() if self.current_round else None,
+            "history": [r.to_dict() for r in self.history],
+            "queue": [s.to_dict() for s in self.queue],
+            "queued": self.queued,
+            "created_at": self.created_at.isoformat(),
+            "last_activity": self.last_activity.isoformat(),
+            "version": self.version,
         }
 
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Room:
+        current_round = data["current_round"]
+        return cls(
+            id=data["id"],
+            deck_type=data["deck_type"],
+            description_flavor=data["description_flavor"],
+            participants={
+                pid: Participant.from_dict(p) for pid, p in data["participants"].items()
+            },
+            current_round=Round.from_dict(current_round) if current_round else None,
+            history=[Round.from_dict(r) for r in data["history"]],
+            queue=deque(QueuedStory.from_dict(s) for s in data.get("queue", ())),
+            queued=data.get("queued", 0),
+            created_at=datetime.fromisoformat(data["created_at"]),
+            last_activity=datetime.fromisoformat(data["last_activity"]),
+            version=data["version"],
+        )
+
 
 class CreateRoomRequest(BaseModel):
     deck_type: str = "fibonacci"
@@ -87,3 +263,34 @@ class CreateRoomRequest(BaseModel):
 class CreateRoomResponse(BaseModel):
     room_id: str
     moderator_token: str
+
+
+# --- WebSocket message payloads, validated before dispatch ---
+
+
+class JoinPayload(BaseModel):
+    name: str = ""
+    role: str = "voter"
+
+
+class VotePayload(BaseModel):
+    value: str = ""
+
+
+class NewRoundPayload(BaseModel):
+    story: str = ""
+    story_link: str | None = None
+
+
+class KickPayload(BaseModel):
+    participant_id: str = ""
+
+
+class ChangeDeckPayload(BaseModel):
+    deck_type: str | None = None
+    description_flavor: str | None = None
+
+
+class StartTimerPayload(BaseModel):
+    seconds: int = Field(60, ge=1, le=24 * 60 * 60)
+    auto_reveal: bool = False
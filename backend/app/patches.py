@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+def diff_state(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any]:
+    """Return a JSON merge patch (RFC 7386) that turns `old` into `new`.
+
+    Nested dicts are diffed recursively, any other changed value is replaced
+    as a whole, and keys missing from `new` are set to None (= delete).
+    """
+    patch: dict[str, Any] = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+            continue
+        previous = old[key]
+        if previous == value:
+            continue
+        if isinstance(previous, dict) and isinstance(value, dict):
+            patch[key] = diff_state(previous, value)
+        else:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def apply_patch(state: dict[str, Any], patch: dict[str, Any]) -> dict[str, Any]:
+    """Apply a JSON merge patch to `state` and return the result (a new dict).
+
+    Mirrors what patch-aware clients do; keys deleted by the patch read as null.
+    """
+    result = dict(state)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict):
+            target = result.get(key)
+            result[key] = apply_patch(target if isinstance(target, dict) else {}, value)
+        else:
+            result[key] = value
+    return result
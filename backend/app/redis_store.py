@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+from .history import HistoryStore
+from .models import Room, Round
+
+logger = logging.getLogger(__name__)
+
+
+class RedisRoomStore:
+    """Room store on a Redis-protocol server, shared by all workers and pods.
+
+    Every room lives in three keys (room JSON, moderator token, reconnect
+    token hash) that expire together `expiry` seconds after the last save,
+    so Redis itself takes care of cleaning up idle rooms; the archived
+    rounds of a room (see `RedisHistoryStore`) expire with them. A sorted set of
+    room ids scored by their expiry time keeps count of the live rooms.
+
+    The store is `blocking`: the event loop calls its operations in a
+    thread (see `rooms.off_loop`). Room locks use a second, asyncio client,
+    so waiting for one never blocks the loop either.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        expiry: int,
+        prefix: str = "bdapoker",
+        *,
+        async_client: redis.asyncio.Redis,
+        lock_timeout: float = 5,
+    ) -> None:
+        self.client = client
+        self.async_client = async_client
+        self.expiry = expiry
+        self.prefix = prefix
+        # Seconds to wait for a room's lock before giving up with RoomBusy
+        self.lock_timeout = lock_timeout
+
+    @classmethod
+    def from_url(cls, url: str, expiry: int) -> RedisRoomStore:
+        if redis is None:
+            raise RuntimeError("ROOM_STORE_URL requires the 'redis' package")
+        return cls(
+            redis.Redis.from_url(url, decode_responses=True),
+            expiry,
+            async_client=redis.asyncio.Redis.from_url(url, decode_responses=True),
+        )
+
+    def _key(self, kind: str, room_id: str) -> str:
+        return f"{self.prefix}:{kind}:{room_id}"
+
+    @property
+    def _index(self) -> str:
+        return f"{self.prefix}:rooms"
+
+    def add_room(self, room: Room, moderator_token: str) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self._key("room", room.id), json.dumps(room.to_dict()), ex=self.expiry)
+        pipe.set(self._key("modtoken", room.id), moderator_token, ex=self.expiry)
+        pipe.zadd(self._index, {room.id: time.time() + self.expiry})
+        pipe.execute()
+
+    def get_room(self, room_id: str) -> Room | None:
+        data = self.client.get(self._key("room", room_id))
+        if data is None:
+            return None
+        return Room.from_dict(json.loads(data))
+
+    def save_room(self, room: Room) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(
+            self._key("room", room.id),
+            json.dumps(room.to_dict()),
+            ex=self.expiry,
+            xx=True,  # never resurrect a deleted or expired room
+        )
+        pipe.expire(self._key("modtoken", room.id), self.expiry)
+        pipe.expire(self._key("reconnect", room.id), self.expiry)
+        pipe.expire(self._key("history", room.id), self.expiry)
+        pipe.zadd(self._index, {room.id: time.time() + self.expiry}, xx=True)
+        pipe.execute()
+
+    def delete_room(self, room_id: str) -> None:
+        pipe = self.client.pipeline()
+        pipe.delete(
+            self._key("room", room_id),
+            self._key("modtoken", room_id),
+            self._key("reconnect", room_id),
+            self._key("history", room_id),
+        )
+        pipe.zrem(self._index, room_id)
+        pipe.execute()
+
+    def get_moderator_token(self, room_id: str) -> str | None:
+        return self.client.get(self._key("modtoken", room_id))
+
+    def set_reconnect_token(self, room_id: str, participant_id: str, token: str) -> None:
+        key = self._key("reconnect", room_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, participant_id, token)
+        pipe.expire(key, self.expiry)
+        pipe.execute()
+
+    def get_reconnect_token(self, room_id: str, participant_id: str) -> str | None:
+        return self.client.hget(self._key("reconnect", room_id), participant_id)
+
+    def remove_reconnect_token(self, room_id: str, participant_id: str) -> None:
+        self.client.hdel(self._key("reconnect", room_id), participant_id)
+
+    def expired_rooms(self, now: datetime) -> list[str]:
+        return []  # keys expire on their own
+
+    def next_expiry(self) -> datetime | None:
+        return None
+
+    def count(self) -> int:
+        # Rooms past their expiry time are gone from Redis; drop them here too
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self._index, "-inf", time.time())
+        pipe.zcard(self._index)
+        return pipe.execute()[1]
+
+    @asynccontextmanager
+    async def lock(self, room_id: str) -> AsyncIterator[None]:
+        from .rooms import RoomBusy
+
+        lock = self.async_client.lock(
+            self._key("lock", room_id), timeout=10, blocking_timeout=self.lock_timeout
+        )
+        if not await lock.acquire():
+            raise RoomBusy(room_id)
+        try:
+            yield
+        finally:
+            try:
+                await lock.release()
+            except redis.exceptions.LockError:
+                # Held past its timeout, so another worker may have had the room
+                logger.warning("Lock of room %s expired while held", room_id)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class RedisHistoryStore(HistoryStore):
+    """Archived rounds of every room in a sorted set scored by round number.
+
+    The key takes the expiry of its room whenever the room store saves the
+    room, and goes when the room is deleted; `rooms.save_room` writes the
+    queued rounds first.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str = "bdapoker") -> None:
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> RedisHistoryStore:
+        if redis is None:
+            raise RuntimeError("ROOM_STORE_URL requires the 'redis' package")
+        return cls(redis.Redis.from_url(url, decode_responses=True))
+
+    def _key(self, room_id: str) -> str:
+        return f"{self.prefix}:history:{room_id}"
+
+    def _write(self, ops: list[tuple[str, str, Any]]) -> None:
+        pipe = self.client.pipeline()
+        for kind, room_id, rows in ops:
+            key = self._key(room_id)
+            if kind == "delete":
+                pipe.delete(key)
+                continue
+            for number, data in rows:
+                # Replaces an earlier copy of the round
+                pipe.zremrangebyscore(key, number, number)
+                pipe.zadd(key, {json.dumps(data): number})
+        pipe.execute()
+
+    def _page(self, room_id: str, after: int, limit: int) -> list[Round]:
+        members = self.client.zrangebyscore(
+            self._key(room_id), f"({after}", "+inf", start=0, num=limit
+        )
+        return [Round.from_dict(json.loads(data)) for data in members]
+
+    def _count(self, room_id: str) -> int:
+        return self.client.zcard(self._key(room_id))
+
+    def _clear(self) -> None:
+        keys = list(self.client.scan_iter(self._key("*")))
+        if keys:
+            self.client.delete(*keys)
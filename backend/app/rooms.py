@@ -1,27 +1,225 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
+import os
+import time
+import weakref
+from collections.abc import AsyncIterator, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager, nullcontext
 from datetime import datetime, timezone
+from typing import Any, Protocol, TypeVar
 
 import shortuuid
 
+from . import analytics, history, metrics, sharding
+from .events import apply_event
+from .journal import Journal
 from .models import Room
 
-ROOM_EXPIRY_SECONDS = 4 * 60 * 60  # 4 hours
+# Rooms without activity for this long are dissolved (default 4 hours)
+ROOM_EXPIRY_SECONDS = int(os.environ.get("ROOM_EXPIRY_SECONDS", str(4 * 60 * 60)))
 
-# In-memory store: room_id -> Room
-_rooms: dict[str, Room] = {}
+# Empty: keep rooms in process memory; redis://host:port/db: share them via Redis
+ROOM_STORE_URL = os.environ.get("ROOM_STORE_URL", "")
 
-# Moderator tokens: room_id -> token (used to authenticate the creator)
-_moderator_tokens: dict[str, str] = {}
+# Directory for the event journal and snapshots of the in-memory store
+# (empty: rooms are lost on restart)
+PERSIST_DIR = os.environ.get("PERSIST_DIR", "")
+# Batch journal fsyncs within this window (0: fsync every event)
+PERSIST_FSYNC_MS = float(os.environ.get("PERSIST_FSYNC_MS", "50"))
+# Compact the journal into a snapshot after this many events
+PERSIST_SNAPSHOT_EVENTS = int(os.environ.get("PERSIST_SNAPSHOT_EVENTS", "10000"))
 
-# Reconnect tokens: (room_id, participant_id) -> token
-_reconnect_tokens: dict[tuple[str, str], str] = {}
+
+T = TypeVar("T")
+
+
+class RoomBusy(RuntimeError):
+    """The room's lock could not be taken in time (another worker holds it)."""
+
+
+class RoomStore(Protocol):
+    """Where rooms and their tokens live.
+
+    Rooms returned by `get_room` may be copies; callers persist their
+    mutations with `save_room`, holding `lock` for the room meanwhile.
+    Operations of a `blocking` store wait for the network; the event loop
+    calls them through `off_loop`.
+    """
+
+    blocking: bool
+
+    def add_room(self, room: Room, moderator_token: str) -> None: ...
+
+    def get_room(self, room_id: str) -> Room | None: ...
+
+    def save_room(self, room: Room) -> None: ...
+
+    def delete_room(self, room_id: str) -> None: ...
+
+    def get_moderator_token(self, room_id: str) -> str | None: ...
+
+    def set_reconnect_token(
+        self, room_id: str, participant_id: str, token: str
+    ) -> None: ...
+
+    def get_reconnect_token(self, room_id: str, participant_id: str) -> str | None: ...
+
+    def remove_reconnect_token(self, room_id: str, participant_id: str) -> None: ...
+
+    def expired_rooms(self, now: datetime) -> list[str]: ...
+
+    def next_expiry(self) -> datetime | None: ...
+
+    def count(self) -> int: ...
+
+    def lock(self, room_id: str) -> AbstractAsyncContextManager: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryRoomStore:
+    """Default store: plain dicts in this process. Rooms are live objects.
+
+    Expiry uses a heap of (deadline, room_id). Activity only moves deadlines
+    later, so entries are not updated on every touch: a popped entry whose
+    room has been active since is pushed again with the actual deadline.
+    """
+
+    # Only ever used from the event loop, which snapshots it as well
+    blocking = False
+
+    def __init__(self) -> None:
+        # room_id -> Room
+        self.rooms: dict[str, Room] = {}
+        # room_id -> token (used to authenticate the creator)
+        self.moderator_tokens: dict[str, str] = {}
+        # room_id -> {participant_id -> token}
+        self.reconnect_tokens: dict[str, dict[str, str]] = {}
+        # (deadline timestamp, room_id); entries not matching _deadlines are stale
+        self._expiry: list[tuple[float, str]] = []
+        # room_id -> deadline of its live heap entry
+        self._deadlines: dict[str, float] = {}
+
+    def _schedule(self, room_id: str, deadline: float) -> None:
+        self._deadlines[room_id] = deadline
+        heapq.heappush(self._expiry, (deadline, room_id))
+
+    def add_room(self, room: Room, moderator_token: str) -> None:
+        self.rooms[room.id] = room
+        self.moderator_tokens[room.id] = moderator_token
+        self._schedule(room.id, _deadline(room))
+
+    def get_room(self, room_id: str) -> Room | None:
+        return self.rooms.get(room_id)
+
+    def save_room(self, room: Room) -> None:
+        # Rooms are mutated in place; only a deadline moved earlier
+        # (last_activity set back) needs a new heap entry
+        if room.id not in self.rooms:
+            return  # deleted meanwhile
+        deadline = _deadline(room)
+        if deadline < self._deadlines.get(room.id, deadline + 1):
+            self._schedule(room.id, deadline)
+
+    def delete_room(self, room_id: str) -> None:
+        self.rooms.pop(room_id, None)
+        self.moderator_tokens.pop(room_id, None)
+        self.reconnect_tokens.pop(room_id, None)
+        self._deadlines.pop(room_id, None)
+
+    def get_moderator_token(self, room_id: str) -> str | None:
+        return self.moderator_tokens.get(room_id)
+
+    def set_reconnect_token(self, room_id: str, participant_id: str, token: str) -> None:
+        self.reconnect_tokens.setdefault(room_id, {})[participant_id] = token
+
+    def get_reconnect_token(self, room_id: str, participant_id: str) -> str | None:
+        return self.reconnect_tokens.get(room_id, {}).get(participant_id)
+
+    def remove_reconnect_token(self, room_id: str, participant_id: str) -> None:
+        tokens = self.reconnect_tokens.get(room_id)
+        if tokens:
+            tokens.pop(participant_id, None)
+            if not tokens:
+                del self.reconnect_tokens[room_id]
+
+    def expired_rooms(self, now: datetime) -> list[str]:
+        now_ts = now.timestamp()
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now_ts:
+            deadline, rid = heapq.heappop(self._expiry)
+            room = self.rooms.get(rid)
+            if room is None or self._deadlines.get(rid) != deadline:
+                continue  # deleted, or superseded by an earlier deadline
+            actual = _deadline(room)
+            if actual > now_ts:
+                self._schedule(rid, actual)  # active since it was scheduled
+            else:
+                del self._deadlines[rid]
+                expired.append(rid)
+        return expired
+
+    def count(self) -> int:
+        return len(self.rooms)
+
+    def next_expiry(self) -> datetime | None:
+        # May be early (a room active since), never late
+        if not self._expiry:
+            return None
+        return datetime.fromtimestamp(self._expiry[0][0], timezone.utc)
+
+    def lock(self, room_id: str) -> AbstractAsyncContextManager:
+        # One process: the local lock taken by `room_lock` is enough
+        return nullcontext()
+
+    def clear(self) -> None:
+        self.rooms.clear()
+        self.moderator_tokens.clear()
+        self.reconnect_tokens.clear()
+        self._expiry.clear()
+        self._deadlines.clear()
+
+
+def _deadline(room: Room) -> float:
+    return room.last_activity.timestamp() + ROOM_EXPIRY_SECONDS
+
+
+def _create_store(url: str) -> RoomStore:
+    if not url:
+        return MemoryRoomStore()
+    from .redis_store import RedisRoomStore
+
+    return RedisRoomStore.from_url(url, expiry=ROOM_EXPIRY_SECONDS)
+
+
+store: RoomStore = _create_store(ROOM_STORE_URL)
+
+# Redis persists rooms itself; the journal backs the in-memory store only
+journal: Journal | None = None
+if PERSIST_DIR and not ROOM_STORE_URL:
+    journal = Journal(PERSIST_DIR, PERSIST_FSYNC_MS / 1000, PERSIST_SNAPSHOT_EVENTS)
+
+
+def _log(room_id: str, event: dict[str, Any]) -> None:
+    if journal is not None:
+        journal.append(
+            {"room": room_id, "at": datetime.now(timezone.utc).isoformat(), **event}
+        )
+
+
+def record_event(room: Room, event: dict[str, Any]) -> None:
+    """Apply a validated mutation (see `apply_event`) and journal it."""
+    apply_event(room, event)
+    _log(room.id, event)
 
 
 def create_room(deck_type: str, description_flavor: str) -> tuple[Room, str]:
     """Create a new room and return (room, moderator_token)."""
     room_id = shortuuid.uuid()[:8]
+    while not sharding.shards.owns(room_id):
+        room_id = shortuuid.uuid()[:8]
     token = shortuuid.uuid()
     now = datetime.now(timezone.utc)
     room = Room(
@@ -31,23 +229,72 @@ def create_room(deck_type: str, description_flavor: str) -> tuple[Room, str]:
         created_at=now,
         last_activity=now,
     )
-    _rooms[room_id] = room
-    _moderator_tokens[room_id] = token
+    store.add_room(room, token)
+    _log(
+        room_id,
+        {
+            "type": "create",
+            "deck_type": deck_type,
+            "description_flavor": description_flavor,
+            "moderator_token": token,
+        },
+    )
     return room, token
 
 
+async def off_loop(fn: Callable[..., T], *args: Any) -> T:
+    """Call a function of this module that uses the store, from the event loop.
+
+    A blocking store is called in a thread, so a network round trip does not
+    hold up the other sockets; the in-memory store is called right away.
+    """
+    if store.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
 def get_room(room_id: str) -> Room | None:
-    return _rooms.get(room_id)
+    return store.get_room(room_id)
+
+
+def save_room(room: Room) -> None:
+    """Persist mutations of a room fetched with `get_room`."""
+    if store.blocking:
+        # Other workers read the rounds it no longer holds from the archive
+        history.store.flush()
+    store.save_room(room)
+
+
+# room_id -> lock of this worker's tasks, gone once no task holds or awaits it
+_local_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+@asynccontextmanager
+async def room_lock(room_id: str) -> AsyncIterator[None]:
+    """Serialize read-modify-write cycles on a room across tasks and workers.
+
+    Tasks of this worker queue on a local lock first, so at most one of them
+    at a time waits for the store's lock.
+    """
+    local = _local_locks.get(room_id)
+    if local is None:
+        local = _local_locks[room_id] = asyncio.Lock()
+    async with local, store.lock(room_id):
+        yield
 
 
 def get_moderator_token(room_id: str) -> str | None:
-    return _moderator_tokens.get(room_id)
+    return store.get_moderator_token(room_id)
 
 
 def create_reconnect_token(room_id: str, participant_id: str) -> str:
     """Generate and store a reconnect token for a participant."""
     token = shortuuid.uuid()
-    _reconnect_tokens[(room_id, participant_id)] = token
+    store.set_reconnect_token(room_id, participant_id, token)
+    _log(
+        room_id,
+        {"type": "reconnect_token", "participant_id": participant_id, "token": token},
+    )
     return token
 
 
@@ -55,41 +302,111 @@ def validate_reconnect_token(
     room_id: str, participant_id: str, token: str
 ) -> bool:
     """Check if a reconnect token is valid."""
-    stored = _reconnect_tokens.get((room_id, participant_id))
+    stored = store.get_reconnect_token(room_id, participant_id)
     return stored is not None and stored == token
 
 
 def get_reconnect_token(room_id: str, participant_id: str) -> str | None:
-    return _reconnect_tokens.get((room_id, participant_id))
+    return store.get_reconnect_token(room_id, participant_id)
 
 
 def remove_reconnect_token(room_id: str, participant_id: str) -> None:
-    _reconnect_tokens.pop((room_id, participant_id), None)
+    store.remove_reconnect_token(room_id, participant_id)
+    _log(room_id, {"type": "remove_reconnect_token", "participant_id": participant_id})
 
 
 def delete_room(room_id: str) -> None:
-    _rooms.pop(room_id, None)
-    _moderator_tokens.pop(room_id, None)
-    keys_to_remove = [k for k in _reconnect_tokens if k[0] == room_id]
-    for k in keys_to_remove:
-        del _reconnect_tokens[k]
+    store.delete_room(room_id)
+    history.store.delete_room(room_id)
+    _log(room_id, {"type": "delete"})
 
 
-def cleanup_expired_rooms() -> int:
-    """Remove rooms inactive for longer than ROOM_EXPIRY_SECONDS. Returns count removed."""
-    now = datetime.now(timezone.utc)
-    expired = [
-        rid
-        for rid, room in _rooms.items()
-        if (now - room.last_activity).total_seconds() > ROOM_EXPIRY_SECONDS
-    ]
+def expire_rooms() -> list[str]:
+    """Delete rooms inactive for longer than ROOM_EXPIRY_SECONDS; returns their ids."""
+    start = time.perf_counter()
+    expired = store.expired_rooms(datetime.now(timezone.utc))
     for rid in expired:
         delete_room(rid)
-    return len(expired)
+    metrics.CLEANUP_DURATION.observe(time.perf_counter() - start)
+    metrics.CLEANUP_REMOVED.inc(len(expired))
+    return expired
+
+
+def cleanup_expired_rooms() -> int:
+    """Remove rooms inactive for longer than ROOM_EXPIRY_SECONDS. Returns count removed."""
+    return len(expire_rooms())
+
+
+def _snapshot() -> dict[str, Any]:
+    """The whole state as new objects, so it can be written from a thread."""
+    return {
+        "rooms": [room.to_dict() for room in store.rooms.values()],
+        "moderator_tokens": dict(store.moderator_tokens),
+        "reconnect_tokens": [
+            [room_id, pid, token]
+            for room_id, tokens in store.reconnect_tokens.items()
+            for pid, token in tokens.items()
+        ],
+        "analytics": analytics.table.to_dict(),
+    }
+
+
+def _replay(event: dict[str, Any]) -> None:
+    kind = event["type"]
+    room_id = event["room"]
+    at = datetime.fromisoformat(event["at"])
+    if kind == "create":
+        room = Room(
+            id=room_id,
+            deck_type=event["deck_type"],
+            description_flavor=event["description_flavor"],
+            created_at=at,
+            last_activity=at,
+        )
+        store.add_room(room, event["moderator_token"])
+    elif kind == "delete":
+        store.delete_room(room_id)
+        history.store.delete_room(room_id)
+    elif kind == "reconnect_token":
+        store.set_reconnect_token(room_id, event["participant_id"], event["token"])
+    elif kind == "remove_reconnect_token":
+        store.remove_reconnect_token(room_id, event["participant_id"])
+    else:
+        room = store.get_room(room_id)
+        if room is not None:
+            apply_event(room, event)
+            room.last_activity = at
+
+
+def restore_rooms() -> int:
+    """Rebuild the in-memory store from the journal. Returns the number of rooms."""
+    if journal is None:
+        return 0
+    snapshot, events = journal.load()
+    analytics.load(snapshot.get("analytics") if snapshot is not None else None)
+    if snapshot is not None:
+        for data in snapshot["rooms"]:
+            room = Room.from_dict(data)
+            store.add_room(room, snapshot["moderator_tokens"][room.id])
+        for room_id, pid, token in snapshot["reconnect_tokens"]:
+            store.set_reconnect_token(room_id, pid, token)
+    for event in events:
+        _replay(event)
+    # Nobody is connected after a restart; clients reconnect with their tokens
+    for room in store.rooms.values():
+        for participant in room.participants.values():
+            participant.connected = False
+    # Start from a clean snapshot, which also drops a torn last entry
+    journal.compact(_snapshot())
+    return len(store.rooms)
+
+
+async def periodic_persist() -> None:
+    """Background task that syncs and compacts the journal."""
+    if journal is not None:
+        await journal.run(_snapshot)
 
 
-async def periodic_cleanup(interval: int = 300) -> None:
-    """Background task that cleans up expired rooms every `interval` seconds."""
-    while True:
-        await asyncio.sleep(interval)
-        cleanup_expired_rooms()
+def close_journal() -> None:
+    if journal is not None:
+        journal.close(_snapshot())
@@ -0,0 +1,199 @@
+"""Sharded mode: every room is owned by exactly one worker process.
+
+Each worker keeps its rooms and their sockets in memory, so the vote hot
+path never touches a shared store or bus. Rooms are assigned to workers
+with a consistent hash of the room id; requests that reach another worker
+are redirected to the owner (HTTP 307, WebSocket close code 4010 with the
+owner's URL as reason).
+
+Run `python -m app.sharding --workers 4` to start a supervisor with four
+workers on consecutive ports.
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import random
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+# Base URLs of all shard workers (comma separated), reachable by clients and
+# by the workers themselves. Empty: sharding disabled.
+SHARD_URLS = [
+    url.strip().rstrip("/")
+    for url in os.environ.get("SHARD_URLS", "").split(",")
+    if url.strip()
+]
+# Position of this worker in SHARD_URLS
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", "0"))
+# Shared by all workers to forward room creation to the owner
+SHARD_SECRET = os.environ.get("SHARD_SECRET", "")
+
+# WebSocket close code: reconnect to the URL given as close reason
+WRONG_SHARD_CLOSE_CODE = 4010
+SECRET_HEADER = "x-shard-secret"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Adding or removing a node only moves the keys of that node.
+    """
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = 64) -> None:
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[i]
+
+
+class Shards:
+    """The shard layout as seen by this worker."""
+
+    def __init__(self, urls: Sequence[str], index: int = 0, secret: str = "") -> None:
+        self.urls = list(urls)
+        self.self_url = self.urls[index] if self.urls else ""
+        self.secret = secret
+        self._ring = HashRing(self.urls) if self.urls else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._ring is not None
+
+    def owner(self, room_id: str) -> str:
+        if self._ring is None:
+            return self.self_url
+        return self._ring.owner(room_id)
+
+    def owns(self, room_id: str) -> bool:
+        return self._ring is None or self._ring.owner(room_id) == self.self_url
+
+    def pick(self) -> str:
+        """Worker that should own the next new room.
+
+        Without a secret rooms can't be forwarded, so they stay here.
+        """
+        if not self.secret:
+            return self.self_url
+        return random.choice(self.urls)
+
+    def url(self, room_id: str, path: str) -> str:
+        return self.owner(room_id) + path
+
+    def ws_url(self, room_id: str) -> str:
+        url = self.url(room_id, f"/api/rooms/{room_id}/ws")
+        return "ws" + url.removeprefix("http")
+
+    def is_forwarded(self, headers: Mapping[str, str]) -> bool:
+        return bool(self.secret) and headers.get(SECRET_HEADER) == self.secret
+
+    def forward_create(self, owner: str, body: dict[str, Any]) -> dict[str, Any]:
+        """Create a room on another worker. Raises OSError if it is unreachable."""
+        request = urllib.request.Request(
+            owner + "/api/rooms",
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json", SECRET_HEADER: self.secret},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=5) as resp:
+            return json.load(resp)
+
+
+shards = Shards(SHARD_URLS, SHARD_INDEX, SHARD_SECRET)
+
+
+# --- Supervisor ---
+
+
+def _worker_env(urls: list[str], index: int, secret: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env["SHARD_URLS"] = ",".join(urls)
+    env["SHARD_INDEX"] = str(index)
+    env["SHARD_SECRET"] = secret
+    # Rooms never leave their worker; a shared store or bus is not needed
+    env.pop("ROOM_STORE_URL", None)
+    env.pop("BROADCAST_BUS_URL", None)
+    if env.get("PERSIST_DIR"):
+        env["PERSIST_DIR"] = os.path.join(env["PERSIST_DIR"], f"shard-{index}")
+    return env
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.sharding",
+        description="Run BDA Poker as N shard workers on consecutive ports.",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--public-url",
+        default="",
+        help="URL template under which clients reach worker N, e.g. "
+        "'https://poker-{n}.example.com' (default: http://HOST:PORT+N)",
+    )
+    args = parser.parse_args(argv)
+
+    host = "127.0.0.1" if args.host in ("0.0.0.0", "::") else args.host
+    urls = [
+        args.public_url.format(n=n) if args.public_url else f"http://{host}:{args.port + n}"
+        for n in range(args.workers)
+    ]
+    secret = secrets.token_urlsafe(24)
+    procs = [
+        subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", args.host, "--port", str(args.port + n),
+                "--ws", "app.compression:WebSocketProtocol",
+            ],
+            env=_worker_env(urls, n, secret),
+        )
+        for n in range(args.workers)
+    ]
+
+    stopping = False
+
+    def stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # A worker that dies takes its rooms with it; stop everything so the
+    # process manager restarts the whole set with a consistent layout.
+    exit_code = 0
+    while not stopping:
+        for proc in procs:
+            if proc.poll() is not None:
+                exit_code = proc.returncode or 1
+                stopping = True
+        time.sleep(0.5)
+    for proc in procs:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in procs:
+        proc.wait()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
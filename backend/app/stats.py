@@ -0,0 +1,292 @@
+"""Vote statistics of a round.
+
+Every vote, changed vote and kick updates the running aggregates
+(`VoteStats`): a histogram of the cards played, the count and sum of the
+numeric votes, and the numeric votes in sorted order for the median.
+
+At reveal, `compute_stats` maps the histogram onto the deck's scale: its
+non-special cards in deck order, T-shirt sizes included. The result is a
+vote count per card position, and every registered metric (`@metric`)
+makes one pass over it. None of this depends on the number of votes.
+"""
+
+from __future__ import annotations
+
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Any
+
+from .decks import SPECIAL_CARDS, Deck
+
+# Cards that are no estimate: ?, coffee, infinity
+SPECIAL_VALUES = frozenset(card["value"] for card in SPECIAL_CARDS)
+
+
+def numeric(value: str) -> float | None:
+    """The number on a card, None for ?, coffee, infinity and the like."""
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class VoteStats:
+    __slots__ = ("histogram", "votes", "count", "sum", "_sorted")
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        # card value -> number of votes
+        self.histogram: dict[str, int] = {}
+        # All votes, and the numeric ones with their sum
+        self.votes = 0
+        self.count = 0
+        self.sum = 0.0
+        self._sorted: list[float] = []
+        for value in values:
+            self.add(value)
+
+    def add(self, value: str) -> None:
+        self.histogram[value] = self.histogram.get(value, 0) + 1
+        self.votes += 1
+        number = numeric(value)
+        if number is not None:
+            insort(self._sorted, number)
+            self.count += 1
+            self.sum += number
+
+    def remove(self, value: str) -> None:
+        remaining = self.histogram[value] - 1
+        if remaining:
+            self.histogram[value] = remaining
+        else:
+            del self.histogram[value]
+        self.votes -= 1
+        number = numeric(value)
+        if number is not None:
+            del self._sorted[bisect_left(self._sorted, number)]
+            self.count -= 1
+            self.sum -= number
+
+    def median(self) -> float:
+        values = self._sorted
+        mid = len(values) // 2
+        if len(values) % 2:
+            return values[mid]
+        return (values[mid - 1] + values[mid]) / 2
+
+    def summary(self) -> dict[str, Any]:
+        """Average, median, min and max of the numeric votes."""
+        if not self.count:
+            return {}
+        return {
+            "average": round(self.sum / self.count, 1),
+            "median": round(self.median(), 1),
+            "min": self._sorted[0],
+            "max": self._sorted[-1],
+        }
+
+
+class Scale:
+    """The ordered cards of a deck: positions 0..n-1, specials apart."""
+
+    __slots__ = ("values", "numbers", "specials", "position", "by_number")
+
+    def __init__(self, values: Iterable[str]) -> None:
+        values = list(values)
+        self.values = tuple(v for v in values if v not in SPECIAL_VALUES)
+        # Number on each card, all None unless the whole scale is numeric
+        numbers = tuple(numeric(v) for v in self.values)
+        self.numbers = numbers if None not in numbers else (None,) * len(numbers)
+        self.specials = tuple(v for v in values if v in SPECIAL_VALUES)
+        self.position = {v: i for i, v in enumerate(self.values)}
+        # Position of each number on a numeric scale, for votes such as "5.0"
+        self.by_number = {n: i for i, n in enumerate(self.numbers) if n is not None}
+
+    @property
+    def is_numeric(self) -> bool:
+        return bool(self.numbers) and self.numbers[0] is not None
+
+
+# Deck ETag -> scale; the ETag changes with the cards
+_scales: dict[str, Scale] = {}
+
+
+def scale_of(deck: Deck) -> Scale:
+    scale = _scales.get(deck.etag)
+    if scale is None:
+        scale = _scales[deck.etag] = Scale(card["value"] for card in deck.cards)
+    return scale
+
+
+@dataclass(slots=True)
+class Sample:
+    """The votes of a round on a deck's scale."""
+
+    scale: Scale
+    stats: VoteStats
+    # Votes per card position
+    counts: list[int]
+    # Votes on the scale (sum of counts)
+    n: int
+    # Lowest and highest position voted, -1 without votes on the scale
+    low: int
+    high: int
+    # Special card value -> votes
+    special: dict[str, int]
+    # Votes neither on the scale nor special (e.g. "7" on Fibonacci) -> votes
+    other: dict[str, int]
+
+    @classmethod
+    def of(cls, stats: VoteStats, scale: Scale) -> Sample:
+        counts = [0] * len(scale.values)
+        special: dict[str, int] = {}
+        n = 0
+        low = len(counts)
+        high = -1
+        other: dict[str, int] = {}
+        for value, count in stats.histogram.items():
+            position = scale.position.get(value)
+            if position is None and value not in SPECIAL_VALUES:
+                position = scale.by_number.get(numeric(value))
+            if position is not None:
+                counts[position] += count
+                n += count
+                low = min(low, position)
+                high = max(high, position)
+            elif value in SPECIAL_VALUES:
+                special[value] = count
+            else:
+                other[value] = count
+        return cls(scale, stats, counts, n, low if n else -1, high, special, other)
+
+    def quantiles(self, *qs: float) -> list[float]:
+        """Positions at quantiles `qs` of the sorted votes, interpolated."""
+        cumulative = list(accumulate(self.counts))
+        positions = []
+        for q in qs:
+            rank = (self.n - 1) * q
+            below = int(rank)
+            position = bisect_right(cumulative, below)
+            if rank > below:
+                above = bisect_right(cumulative, below + 1)
+                position += (rank - below) * (above - position)
+            positions.append(position)
+        return positions
+
+
+Metric = Callable[[Sample], Any]
+
+# name -> metric, filled by @metric; None results are left out
+METRICS: dict[str, Metric] = {}
+
+
+def metric(name: str) -> Callable[[Metric], Metric]:
+    """Register a statistic computed at reveal under `name`."""
+
+    def register(fn: Metric) -> Metric:
+        METRICS[name] = fn
+        return fn
+
+    return register
+
+
+def compute_stats(stats: VoteStats, deck: Deck) -> dict[str, Any]:
+    """The reveal statistics of a round's votes on `deck`."""
+    result = stats.summary()
+    sample = Sample.of(stats, scale_of(deck))
+    for name, fn in METRICS.items():
+        value = fn(sample)
+        if value is not None:
+            result[name] = value
+    return result
+
+
+@metric("distribution")
+def _distribution(sample: Sample) -> list[dict[str, Any]] | None:
+    """Votes per card in deck order, specials last; only cards with votes."""
+    cards = [
+        {"value": value, "count": count}
+        for value, count in zip(sample.scale.values, sample.counts)
+        if count
+    ]
+    cards.extend(
+        {"value": value, "count": sample.special[value]}
+        for value in sample.scale.specials
+        if value in sample.special
+    )
+    return cards or None
+
+
+@metric("mode")
+def _mode(sample: Sample) -> list[str] | None:
+    """The most voted cards (several on a tie)."""
+    if not sample.n:
+        return None
+    top = max(sample.counts)
+    return [v for v, c in zip(sample.scale.values, sample.counts) if c == top]
+
+
+@metric("consensus")
+def _consensus(sample: Sample) -> bool | None:
+    """All of at least two estimates on the same card.
+
+    Estimates off the deck count as the same card if they are the same number.
+    """
+    if not sample.other:
+        if sample.n < 2:
+            return None
+        return max(sample.counts) == sample.n
+    stats = sample.stats
+    estimates = sample.n + sum(sample.other.values())
+    if estimates < 2:
+        return None
+    if stats.count == estimates:
+        return stats._sorted[0] == stats._sorted[-1]
+    return not sample.n and len(sample.other) == 1
+
+
+@metric("near_consensus")
+def _near_consensus(sample: Sample) -> bool | None:
+    """All of at least two estimates on the same or adjacent cards."""
+    if sample.n < 2:
+        return None
+    return sample.high - sample.low <= 1
+
+
+@metric("spread")
+def _spread(sample: Sample) -> float | None:
+    """Interquartile range in card steps."""
+    if not sample.n:
+        return None
+    q1, q3 = sample.quantiles(0.25, 0.75)
+    return round(q3 - q1, 2)
+
+
+@metric("suggestion")
+def _suggestion(sample: Sample) -> str | None:
+    """The card nearest to the average estimate (the higher one on a tie)."""
+    scale = sample.scale
+    if not sample.n:
+        return None
+    if scale.is_numeric and sample.stats.count:
+        average = sample.stats.sum / sample.stats.count
+        nearest = 0
+        best = math.inf
+        for i, number in enumerate(scale.numbers):
+            distance = abs(number - average)
+            if distance <= best:
+                nearest, best = i, distance
+    else:
+        mean = sum(i * c for i, c in enumerate(sample.counts)) / sample.n
+        nearest = math.floor(mean + 0.5)
+    return scale.values[nearest]
+
+
+@metric("special")
+def _special(sample: Sample) -> int | None:
+    """Votes on special cards (?, coffee, infinity)."""
+    total = sum(sample.special.values())
+    return total if total or sample.n else None
@@ -0,0 +1,211 @@
+"""Story queue of a room.
+
+A moderator uploads a backlog of stories in one request: CSV with a
+`story` and an optional `story_link` column, a JSON array of such objects
+(or of plain strings), or NDJSON. The body is parsed as it arrives, record
+by record, and a record may not exceed MAX_RECORD_BYTES, so an upload
+never has to be held in memory as a whole. The stories are then queued
+with a single event and broadcast.
+
+`new_round` without a story takes the next one from the queue. Room states
+only carry the queue's length and its next story; clients page through the
+rest with the story position as cursor.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+import os
+from collections.abc import AsyncIterable, AsyncIterator
+from itertools import islice
+from typing import Any
+
+from . import codec
+from .models import QueuedStory, Room
+
+# Stories queued per room at most
+STORY_QUEUE_MAX = int(os.environ.get("STORY_QUEUE_MAX", "1000"))
+# Stories per page of the queue API (default and maximum)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Longest CSV record, JSON array item or NDJSON line
+MAX_RECORD_BYTES = 64 * 1024
+
+FORMATS = ("csv", "json", "ndjson")
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class StoryImportError(ValueError):
+    """The upload is malformed; the message says where."""
+
+
+class QueueFull(StoryImportError):
+    pass
+
+
+def format_of(content_type: str) -> str | None:
+    return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+
+
+def _story(record: Any, n: int) -> QueuedStory:
+    if isinstance(record, str):
+        record = {"story": record}
+    if not isinstance(record, dict):
+        raise StoryImportError(f"Story {n}: expected an object")
+    story = record.get("story")
+    link = record.get("story_link") or None
+    if not isinstance(story, str) or not story.strip():
+        raise StoryImportError(f"Story {n}: story is required")
+    if link is not None and not isinstance(link, str):
+        raise StoryImportError(f"Story {n}: story_link must be a string")
+    return QueuedStory(story.strip(), link.strip() if link else None)
+
+
+async def _text(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        async for chunk in chunks:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise StoryImportError("Upload is not UTF-8") from None
+    if text:
+        yield text
+
+
+async def _lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Lines of the body with their line ending."""
+    pending = ""
+    async for text in _text(chunks):
+        *lines, pending = (pending + text).split("\n")
+        for line in lines:
+            yield line + "\n"
+        if len(pending) > MAX_RECORD_BYTES:
+            raise StoryImportError("Line too long")
+    if pending:
+        yield pending
+
+
+async def _csv(chunks: AsyncIterable[bytes]) -> AsyncIterator[QueuedStory]:
+    header = None
+    record = ""
+    quotes = 0
+    n = 0
+    async for line in _lines(chunks):
+        record += line
+        quotes += line.count('"')
+        if quotes % 2:  # a quoted field goes on in the next line
+            if len(record) > MAX_RECORD_BYTES:
+                raise StoryImportError("Record too long")
+            continue
+        try:
+            row = next(csv.reader([record]), [])
+        except csv.Error as exc:
+            raise StoryImportError(f"Invalid CSV: {exc}") from None
+        record = ""
+        quotes = 0
+        if not any(row):
+            continue
+        if header is None:
+            header = [name.strip().lower() for name in row]
+            if "story" not in header:
+                raise StoryImportError("CSV needs a header with a story column")
+            continue
+        n += 1
+        yield _story(dict(zip(header, row)), n)
+    if record.strip():
+        raise StoryImportError("Invalid CSV: unterminated quote")
+
+
+async def _ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[QueuedStory]:
+    n = 0
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        n += 1
+        try:
+            record = codec.loads(line)
+        except codec.DecodeError:
+            raise StoryImportError(f"Story {n}: invalid JSON") from None
+        yield _story(record, n)
+
+
+async def _json(chunks: AsyncIterable[bytes]) -> AsyncIterator[QueuedStory]:
+    """Items of a JSON array, decoded one by one as the text arrives."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    # Expected next: "[" first, then an item, then "," or "]"
+    expect = "["
+    n = 0
+    async for text in _text(chunks):
+        buffer = buffer[pos:] + text
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if expect == "[":
+                if char != "[":
+                    raise StoryImportError("Expected a JSON array")
+                pos += 1
+                expect = "item"
+            elif expect == "," and char in ",]":
+                pos += 1
+                expect = "end" if char == "]" else "next"
+            elif expect == "item" and char == "]":
+                pos += 1
+                expect = "end"
+            elif expect in ("item", "next"):
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if len(buffer) - pos > MAX_RECORD_BYTES:
+                        raise StoryImportError(f"Story {n + 1}: invalid JSON") from None
+                    break  # incomplete, wait for more
+                pos = end
+                n += 1
+                yield _story(record, n)
+                expect = ","
+            else:
+                raise StoryImportError(f"Invalid JSON after story {n}")
+    if expect != "end":
+        raise StoryImportError("Unexpected end of JSON array")
+
+
+_PARSERS = {"csv": _csv, "json": _json, "ndjson": _ndjson}
+
+
+async def parse(
+    format: str, chunks: AsyncIterable[bytes], limit: int
+) -> list[QueuedStory]:
+    """Stories of an upload; raises QueueFull past `limit` stories."""
+    stories = []
+    async for story in _PARSERS[format](chunks):
+        if len(stories) == limit:
+            raise QueueFull(f"The queue holds at most {STORY_QUEUE_MAX} stories")
+        stories.append(story)
+    return stories
+
+
+def page(
+    room: Room, after: int | None = None, limit: int = PAGE_SIZE
+) -> list[dict[str, Any]]:
+    """Up to `limit` queued stories after position `after`, next one first."""
+    start = room.queue_start
+    skip = 0 if after is None else max(after + 1 - start, 0)
+    return [
+        {"position": start + i, **story.to_dict()}
+        for i, story in enumerate(islice(room.queue, skip, skip + limit), skip)
+    ]
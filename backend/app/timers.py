@@ -0,0 +1,96 @@
+"""Round timers of all rooms on one scheduler task.
+
+Deadlines live in a heap, so starting, replacing or stopping a timer is
+O(log n) and a single task sleeps until the earliest one, however many
+rooms have a timer running. Replaced and stopped timers are dropped
+lazily when they reach the top of the heap.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Called with (room_id, deadline) when a timer expires
+Expire = Callable[[str, float], Awaitable[None]]
+
+
+class TimerScheduler:
+    def __init__(self, expire: Expire) -> None:
+        self.expire = expire
+        # (deadline timestamp, room_id); entries not matching _deadlines are stale
+        self._heap: list[tuple[float, str]] = []
+        self._deadlines: dict[str, float] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, room_id: str, deadline: float) -> None:
+        """Start or replace the timer of a room (deadline: Unix timestamp)."""
+        self._deadlines[room_id] = deadline
+        heapq.heappush(self._heap, (deadline, room_id))
+        if self._wakeup is not None and self._heap[0][0] == deadline:
+            self._wakeup.set()
+
+    def cancel(self, room_id: str) -> None:
+        self._deadlines.pop(room_id, None)
+
+    def deadline(self, room_id: str) -> float | None:
+        return self._deadlines.get(room_id)
+
+    def pop_due(self, now: float) -> list[tuple[str, float]]:
+        """Remove and return the (room_id, deadline) of all timers due at `now`."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, room_id = heapq.heappop(self._heap)
+            if self._deadlines.get(room_id) == deadline:
+                del self._deadlines[room_id]
+                due.append((room_id, deadline))
+        return due
+
+    def next_deadline(self) -> float | None:
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            next_deadline = self.next_deadline()
+            if next_deadline is None:
+                await self._wakeup.wait()
+                continue
+            delay = next_deadline - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except TimeoutError:
+                    pass
+                continue
+            for room_id, deadline in self.pop_due(time.time()):
+                try:
+                    await self.expire(room_id, deadline)
+                except Exception:
+                    logger.exception("Timer of room %s failed", room_id)
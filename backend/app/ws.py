@@ -1,33 +1,131 @@
 from __future__ import annotations
 
-import json
-import math
-import statistics
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
 from typing import Any
 
 import shortuuid
 from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
 
+from . import codec, metrics, rooms
 from .connection_manager import manager
-from .decks import get_deck_cards
-from .models import Participant, Role, Round, Vote
+from .decks import get_deck
+from .encoder import StateFrames
+from .models import (
+    ChangeDeckPayload,
+    JoinPayload,
+    KickPayload,
+    NewRoundPayload,
+    Role,
+    Room,
+    StartTimerPayload,
+    VotePayload,
+)
+from .patches import diff_state
 from .rooms import (
+    RoomBusy,
     create_reconnect_token,
     get_moderator_token,
     get_reconnect_token,
     get_room,
+    off_loop,
+    record_event,
     remove_reconnect_token,
+    room_lock,
+    save_room,
     validate_reconnect_token,
 )
+from .stats import compute_stats
+from .timers import TimerScheduler
 
+# Opt-in: coalesce room_state broadcasts of a room within this window (0 = off)
+COALESCE_SECONDS = float(os.environ.get("BROADCAST_COALESCE_MS", "0")) / 1000
 
-async def _broadcast_state(room_id: str) -> None:
-    room = get_room(room_id)
-    if room is None:
+# room_id -> pending coalesced flush
+_pending_flushes: dict[str, asyncio.Task] = {}
+
+# Disconnects being saved; they outlive their socket's task
+_leaving: set[asyncio.Task] = set()
+
+# room_id -> last state this worker published and its encoded frames, the
+# base for the next room_patch. Kept per worker: rooms loaded from Redis are
+# new objects on every read, and another worker may have published since.
+_published: dict[str, StateFrames] = {}
+
+
+def _last_published(room: Room) -> StateFrames | None:
+    """This worker's frames of the room's current version, if it has them."""
+    frames = _published.get(room.id)
+    return frames if frames is not None and frames.version == room.version else None
+
+
+async def _broadcast_state(
+    room: Room,
+    *,
+    stats: dict[str, Any] | None = None,
+    snapshot_to: str | None = None,
+    immediate: bool = False,
+) -> None:
+    """Broadcast the room state after a mutation.
+
+    With coalescing enabled the room is only marked dirty and one state is
+    published when the window closes. Reveals (`stats`), snapshots and
+    `immediate` updates go out right away and absorb any pending flush.
+    """
+    if COALESCE_SECONDS and stats is None and snapshot_to is None and not immediate:
+        if room.id not in _pending_flushes:
+            _pending_flushes[room.id] = asyncio.create_task(_flush_later(room.id))
         return
-    deck_cards = get_deck_cards(room.deck_type, room.description_flavor)
-    state = room.public_state(deck_cards)
-    await manager.broadcast(room_id, {"type": "room_state", "payload": state})
+    pending = _pending_flushes.pop(room.id, None)
+    if pending is not None:
+        pending.cancel()
+    await _publish_state(room, stats=stats, snapshot_to=snapshot_to)
+
+
+async def _flush_later(room_id: str) -> None:
+    await asyncio.sleep(COALESCE_SECONDS)
+    del _pending_flushes[room_id]
+    async with room_lock(room_id):
+        room = await off_loop(get_room, room_id)
+        if room is None:
+            return
+        await _publish_state(room)
+        await off_loop(save_room, room)
+
+
+async def _publish_state(
+    room: Room,
+    *,
+    stats: dict[str, Any] | None = None,
+    snapshot_to: str | None = None,
+) -> None:
+    """Publish the room state to all clients.
+
+    A changed state becomes a new version; patch-aware clients receive only
+    the changes since the previous version, `snapshot_to` (a participant that
+    just joined or reconnected) gets the full state. Frames are encoded once
+    per version and reused until the room changes again. The caller saves
+    the room (its version changes).
+    """
+    state = room.public_state()
+    if stats is not None:
+        state["stats"] = stats
+    frames = _last_published(room)
+    changed = frames is None or frames.state != state
+    if changed:
+        room.version += 1
+        state["version"] = room.version
+        patch = None
+        if frames is not None:
+            patch = diff_state(frames.state, state)
+        frames = _published[room.id] = StateFrames(room.version, state, patch)
+    await manager.broadcast_state(
+        room.id, frames, changed=changed, snapshot_to=snapshot_to
+    )
 
 
 async def _send_error(room_id: str, participant_id: str, message: str) -> None:
@@ -36,86 +134,116 @@ async def _send_error(room_id: str, participant_id: str, message: str) -> None:
     )
 
 
-def _is_moderator(room_id: str, participant_id: str) -> bool:
-    room = get_room(room_id)
-    if room is None:
-        return False
+def _reveal_stats(room: Room) -> dict[str, Any]:
+    """Statistics of the current round's votes, attached when it is revealed."""
+    deck = get_deck(room.deck_type, room.description_flavor)
+    return compute_stats(room.current_round.vote_stats, deck)
+
+
+def _is_moderator(room: Room, participant_id: str) -> bool:
     p = room.participants.get(participant_id)
     return p is not None and p.role == Role.MODERATOR
 
 
-def _compute_stats(votes: dict[str, Vote]) -> dict[str, Any]:
-    """Compute average, median, and outlier info from numeric votes."""
-    numeric_values: list[float] = []
-    for v in votes.values():
-        try:
-            fval = float(v.value)
-        except (ValueError, TypeError):
-            continue  # skip ?, coffee, etc.
-        if not math.isfinite(fval):
-            continue  # skip infinity, -infinity, NaN
-        numeric_values.append(fval)
-
-    if not numeric_values:
-        return {}
-
-    avg = statistics.mean(numeric_values)
-    med = statistics.median(numeric_values)
-    result: dict[str, Any] = {
-        "average": round(avg, 1),
-        "median": round(med, 1),
-        "min": min(numeric_values),
-        "max": max(numeric_values),
-    }
-    if len(numeric_values) >= 2:
-        result["consensus"] = len(set(numeric_values)) == 1
-    return result
+@dataclass(frozen=True, slots=True)
+class Route:
+    handler: Callable[..., Awaitable[None]]
+    # Validates the payload; None for messages without one
+    payload: type[BaseModel] | None
+
+
+# msg_type -> route, filled by @message_handler
+ROUTES: dict[str, Route] = {}
+
+
+def message_handler(msg_type: str, payload: type[BaseModel] | None = None):
+    """Register the handler of a message type.
+
+    The handler is called as `handler(room, participant_id, payload,
+    is_moderator=...)` with the payload validated by the `payload` model
+    (None if the message has no payload).
+    """
+
+    def register(handler: Callable[..., Awaitable[None]]) -> Callable[..., Awaitable[None]]:
+        ROUTES[msg_type] = Route(handler, payload)
+        return handler
+
+    return register
 
 
 async def handle_message(
-    room_id: str, participant_id: str, raw: str, *, is_moderator: bool = False
+    room_id: str,
+    participant_id: str,
+    raw: str | bytes,
+    *,
+    is_moderator: bool = False,
+    protocol: str = codec.JSON,
 ) -> None:
+    start = time.perf_counter()
+    msg_type = await _handle_message(
+        room_id, participant_id, raw, is_moderator=is_moderator, protocol=protocol
+    )
+    # Only known types become label values, clients can send anything
+    label = (msg_type if msg_type in ROUTES else "unknown",)
+    metrics.MESSAGES.inc(labels=label)
+    metrics.MESSAGE_DURATION.observe(time.perf_counter() - start, label)
+
+
+async def _handle_message(
+    room_id: str,
+    participant_id: str,
+    raw: str | bytes,
+    *,
+    is_moderator: bool = False,
+    protocol: str = codec.JSON,
+) -> str | None:
+    """Validate and dispatch one message; returns its type if it is known."""
     try:
-        data = json.loads(raw)
-    except json.JSONDecodeError:
-        await _send_error(room_id, participant_id, "Invalid JSON")
-        return
+        data = codec.decode(raw, protocol)
+    except codec.DecodeError:
+        await _send_error(
+            room_id,
+            participant_id,
+            "Invalid MessagePack" if protocol == codec.MSGPACK else "Invalid JSON",
+        )
+        return None
+    if not isinstance(data, dict):
+        await _send_error(room_id, participant_id, "Invalid message")
+        return None
 
     msg_type = data.get("type")
-    payload = data.get("payload", {})
-    room = get_room(room_id)
-    if room is None:
-        await _send_error(room_id, participant_id, "Room not found")
-        return
+    route = ROUTES.get(msg_type) if isinstance(msg_type, str) else None
+    if route is None:
+        await _send_error(room_id, participant_id, f"Unknown message type: {msg_type}")
+        return None
+    payload = None
+    if route.payload is not None:
+        try:
+            payload = route.payload.model_validate(data.get("payload", {}))
+        except ValidationError:
+            await _send_error(room_id, participant_id, "Invalid payload")
+            return msg_type
 
-    room.touch()
-
-    if msg_type == "join":
-        await _handle_join(room, participant_id, payload, is_moderator=is_moderator)
-    elif msg_type == "vote":
-        await _handle_vote(room, participant_id, payload)
-    elif msg_type == "reveal":
-        await _handle_reveal(room, participant_id)
-    elif msg_type == "new_round":
-        await _handle_new_round(room, participant_id, payload)
-    elif msg_type == "reset_round":
-        await _handle_reset_round(room, participant_id)
-    elif msg_type == "kick":
-        await _handle_kick(room, participant_id, payload)
-    elif msg_type == "change_deck":
-        await _handle_change_deck(room, participant_id, payload)
-    elif msg_type == "start_timer":
-        await _handle_start_timer(room, participant_id, payload)
-    elif msg_type == "stop_timer":
-        await _handle_stop_timer(room, participant_id)
-    else:
-        await _send_error(room.id, participant_id, f"Unknown message type: {msg_type}")
+    try:
+        async with room_lock(room_id):
+            room = await off_loop(get_room, room_id)
+            if room is None:
+                await _send_error(room_id, participant_id, "Room not found")
+                return msg_type
 
+            room.touch()
+            await route.handler(room, participant_id, payload, is_moderator=is_moderator)
+            await off_loop(save_room, room)
+    except RoomBusy:
+        await _send_error(room_id, participant_id, "Room is busy, try again")
+    return msg_type
 
+
+@message_handler("join", JoinPayload)
 async def _handle_join(
-    room: Any, participant_id: str, payload: dict, *, is_moderator: bool = False
+    room: Room, participant_id: str, payload: JoinPayload, *, is_moderator: bool
 ) -> None:
-    name = payload.get("name", "").strip()
+    name = payload.name.strip()
     if not name:
         await _send_error(room.id, participant_id, "Name is required")
         return
@@ -123,7 +251,7 @@ async def _handle_join(
     if is_moderator:
         role = Role.MODERATOR
     else:
-        role_str = payload.get("role", "voter")
+        role_str = payload.role
         try:
             role = Role(role_str)
         except ValueError:
@@ -133,13 +261,14 @@ async def _handle_join(
         if role == Role.MODERATOR:
             role = Role.VOTER
 
-    room.participants[participant_id] = Participant(
-        id=participant_id, name=name, role=role
+    record_event(
+        room,
+        {"type": "join", "participant_id": participant_id, "name": name, "role": role},
     )
-    await _broadcast_state(room.id)
+    await _broadcast_state(room, snapshot_to=participant_id)
 
     # Issue reconnect token so participant can reclaim identity after disconnect
-    token = create_reconnect_token(room.id, participant_id)
+    token = await off_loop(create_reconnect_token, room.id, participant_id)
     await manager.send_to(
         room.id,
         participant_id,
@@ -147,7 +276,10 @@ async def _handle_join(
     )
 
 
-async def _handle_vote(room: Any, participant_id: str, payload: dict) -> None:
+@message_handler("vote", VotePayload)
+async def _handle_vote(
+    room: Room, participant_id: str, payload: VotePayload, *, is_moderator: bool
+) -> None:
     if room.current_round is None:
         await _send_error(room.id, participant_id, "No active round")
         return
@@ -161,130 +293,243 @@ async def _handle_vote(room: Any, participant_id: str, payload: dict) -> None:
     if p.role == Role.SPECTATOR:
         await _send_error(room.id, participant_id, "Spectators cannot vote")
         return
-    value = payload.get("value", "")
-    room.current_round.votes[participant_id] = Vote(
-        participant_id=participant_id, value=value
+    record_event(
+        room, {"type": "vote", "participant_id": participant_id, "value": payload.value}
     )
-    await _broadcast_state(room.id)
+    await _broadcast_state(room)
 
 
-async def _handle_reveal(room: Any, participant_id: str) -> None:
-    if not _is_moderator(room.id, participant_id):
+@message_handler("reveal")
+async def _handle_reveal(
+    room: Room, participant_id: str, payload: None, *, is_moderator: bool
+) -> None:
+    if not _is_moderator(room, participant_id):
         await _send_error(room.id, participant_id, "Only moderator can reveal")
         return
     if room.current_round is None:
         await _send_error(room.id, participant_id, "No active round")
         return
-    room.current_round.revealed = True
-    # Compute and attach stats
-    stats = _compute_stats(room.current_round.votes)
-    await manager.broadcast(
-        room.id,
-        {
-            "type": "room_state",
-            "payload": {
-                **room.public_state(
-                    get_deck_cards(room.deck_type, room.description_flavor)
-                ),
-                "stats": stats,
-            },
-        },
-    )
+    record_event(room, {"type": "reveal"})
+    timers.cancel(room.id)
+    await _broadcast_state(room, stats=_reveal_stats(room))
 
 
+@message_handler("new_round", NewRoundPayload)
 async def _handle_new_round(
-    room: Any, participant_id: str, payload: dict
+    room: Room, participant_id: str, payload: NewRoundPayload, *, is_moderator: bool
 ) -> None:
-    if not _is_moderator(room.id, participant_id):
+    if not _is_moderator(room, participant_id):
         await _send_error(room.id, participant_id, "Only moderator can start new round")
         return
-    # Archive current round
-    round_number = 1
-    if room.current_round:
-        room.history.append(room.current_round)
-        round_number = room.current_round.round_number + 1
-    room.current_round = Round(
-        story=payload.get("story", ""),
-        story_link=payload.get("story_link"),
-        round_number=round_number,
-    )
-    await _broadcast_state(room.id)
-
-
-async def _handle_reset_round(room: Any, participant_id: str) -> None:
-    if not _is_moderator(room.id, participant_id):
+    event = {"type": "new_round", "story": payload.story, "story_link": payload.story_link}
+    if not payload.story and not payload.story_link and room.queue:
+        # Without a story the next one comes from the queue
+        event.update(room.queue[0].to_dict(), queued=True)
+    # Archives the current round
+    record_event(room, event)
+    timers.cancel(room.id)
+    await _broadcast_state(room)
+
+
+@message_handler("reset_round")
+async def _handle_reset_round(
+    room: Room, participant_id: str, payload: None, *, is_moderator: bool
+) -> None:
+    if not _is_moderator(room, participant_id):
         await _send_error(room.id, participant_id, "Only moderator can reset round")
         return
     if room.current_round is None:
         await _send_error(room.id, participant_id, "No active round")
         return
-    room.current_round.votes = {}
-    room.current_round.revealed = False
-    room.current_round.round_number += 1
-    await _broadcast_state(room.id)
+    record_event(room, {"type": "reset_round"})
+    timers.cancel(room.id)
+    await _broadcast_state(room)
 
 
-async def _handle_kick(room: Any, participant_id: str, payload: dict) -> None:
-    if not _is_moderator(room.id, participant_id):
+@message_handler("kick", KickPayload)
+async def _handle_kick(
+    room: Room, participant_id: str, payload: KickPayload, *, is_moderator: bool
+) -> None:
+    if not _is_moderator(room, participant_id):
         await _send_error(room.id, participant_id, "Only moderator can kick")
         return
-    target_id = payload.get("participant_id", "")
+    target_id = payload.participant_id
     if target_id == participant_id:
         await _send_error(room.id, participant_id, "Cannot kick yourself")
         return
-    room.participants.pop(target_id, None)
-    if room.current_round:
-        room.current_round.votes.pop(target_id, None)
-    remove_reconnect_token(room.id, target_id)
-    manager.disconnect(room.id, target_id)
-    await _broadcast_state(room.id)
+    record_event(room, {"type": "kick", "participant_id": target_id})
+    await off_loop(remove_reconnect_token, room.id, target_id)
+    await manager.drop(room.id, target_id)
+    await _broadcast_state(room, immediate=True)
 
 
+@message_handler("change_deck", ChangeDeckPayload)
 async def _handle_change_deck(
-    room: Any, participant_id: str, payload: dict
+    room: Room, participant_id: str, payload: ChangeDeckPayload, *, is_moderator: bool
 ) -> None:
-    if not _is_moderator(room.id, participant_id):
+    if not _is_moderator(room, participant_id):
         await _send_error(room.id, participant_id, "Only moderator can change deck")
         return
-    deck_type = payload.get("deck_type", room.deck_type)
-    flavor = payload.get("description_flavor", room.description_flavor)
-    # Validate
+    deck_type = payload.deck_type if payload.deck_type is not None else room.deck_type
+    flavor = (
+        payload.description_flavor
+        if payload.description_flavor is not None
+        else room.description_flavor
+    )
     try:
-        get_deck_cards(deck_type, flavor)
+        deck = get_deck(deck_type, flavor)
     except ValueError as e:
         await _send_error(room.id, participant_id, str(e))
         return
-    room.deck_type = deck_type
-    room.description_flavor = flavor
-    await _broadcast_state(room.id)
+    if (deck_type, flavor) == (room.deck_type, room.description_flavor):
+        await _broadcast_state(room)
+        return
+    record_event(
+        room,
+        {"type": "change_deck", "deck_type": deck_type, "description_flavor": flavor},
+    )
+    # Room states only reference the deck; push the new cards ahead of the state
+    await manager.broadcast(
+        room.id,
+        {
+            "type": "deck",
+            "payload": {
+                "deck_type": deck_type,
+                "description_flavor": flavor,
+                **deck.ref(),
+                "cards": deck.cards,
+            },
+        },
+    )
+    await _broadcast_state(room)
 
 
+@message_handler("start_timer", StartTimerPayload)
 async def _handle_start_timer(
-    room: Any, participant_id: str, payload: dict
+    room: Room, participant_id: str, payload: StartTimerPayload, *, is_moderator: bool
 ) -> None:
-    if not _is_moderator(room.id, participant_id):
+    if not _is_moderator(room, participant_id):
         await _send_error(room.id, participant_id, "Only moderator can start timer")
         return
-    seconds = payload.get("seconds", 60)
+    if room.current_round is None:
+        await _send_error(room.id, participant_id, "No active round")
+        return
+    deadline = time.time() + payload.seconds
+    record_event(
+        room,
+        {"type": "start_timer", "deadline": deadline, "auto_reveal": payload.auto_reveal},
+    )
+    timers.schedule(room.id, deadline)
     await manager.broadcast(
-        room.id, {"type": "timer_start", "payload": {"seconds": seconds}}
+        room.id,
+        {
+            "type": "timer_start",
+            "payload": {
+                "seconds": payload.seconds,
+                "deadline": deadline,
+                "auto_reveal": payload.auto_reveal,
+            },
+        },
     )
+    await _broadcast_state(room)
 
 
-async def _handle_stop_timer(room: Any, participant_id: str) -> None:
-    if not _is_moderator(room.id, participant_id):
+@message_handler("stop_timer")
+async def _handle_stop_timer(
+    room: Room, participant_id: str, payload: None, *, is_moderator: bool
+) -> None:
+    if not _is_moderator(room, participant_id):
         await _send_error(room.id, participant_id, "Only moderator can stop timer")
         return
+    running = (
+        room.current_round is not None and room.current_round.timer_deadline is not None
+    )
+    if running:
+        record_event(room, {"type": "stop_timer"})
+        timers.cancel(room.id)
     await manager.broadcast(room.id, {"type": "timer_stop", "payload": {}})
+    if running:
+        await _broadcast_state(room)
+
+
+async def _expire_timer(room_id: str, deadline: float) -> None:
+    """End a round timer; called by the scheduler at its deadline."""
+    async with room_lock(room_id):
+        room = await off_loop(get_room, room_id)
+        current = room.current_round if room is not None else None
+        if current is None or current.timer_deadline != deadline:
+            return  # stopped, replaced or round moved on
+        if current.auto_reveal and not current.revealed:
+            record_event(room, {"type": "reveal"})
+            await _broadcast_state(room, stats=_reveal_stats(room))
+        else:
+            record_event(room, {"type": "stop_timer"})
+            await _broadcast_state(room)
+        await off_loop(save_room, room)
+
+
+# One scheduler task for the round timers of all rooms
+timers = TimerScheduler(_expire_timer)
+
+
+async def update_room(room_id: str, event: dict[str, Any]) -> Room | None:
+    """Apply a change made over the REST API and broadcast it.
+
+    Returns the updated room, None if it does not exist.
+    """
+    async with room_lock(room_id):
+        room = await off_loop(get_room, room_id)
+        if room is None:
+            return None
+        room.touch()
+        record_event(room, event)
+        await _broadcast_state(room)
+        await off_loop(save_room, room)
+    return room
+
+
+def release_room(room_id: str) -> None:
+    """Drop the round timer, pending broadcast and frames of a deleted room."""
+    timers.cancel(room_id)
+    _published.pop(room_id, None)
+    pending = _pending_flushes.pop(room_id, None)
+    if pending is not None:
+        pending.cancel()
+
+
+def restore_timers() -> int:
+    """Schedule the running timers of rooms restored from the journal."""
+    if rooms.journal is None:
+        return 0
+    count = 0
+    for room in rooms.store.rooms.values():
+        if room.current_round is not None and room.current_round.timer_deadline:
+            timers.schedule(room.id, room.current_round.timer_deadline)
+            count += 1
+    return count
+
+
+@message_handler("sync")
+async def _handle_sync(
+    room: Room, participant_id: str, payload: None, *, is_moderator: bool
+) -> None:
+    """Resend the full state to a patch client that detected a version gap."""
+    frames = _last_published(room)
+    if frames is None:
+        state = room.public_state()
+        frames = _published[room.id] = StateFrames(room.version, state, None)
+    await manager.send_state(room.id, participant_id, frames)
 
 
 async def websocket_endpoint(websocket: WebSocket, room_id: str) -> None:
-    room = get_room(room_id)
+    room = await off_loop(get_room, room_id)
     if room is None:
         await websocket.close(code=4004, reason="Room not found")
         return
 
-    await websocket.accept()
+    # JSON text frames unless the client offers a binary subprotocol
+    protocol = codec.negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=None if protocol == codec.JSON else protocol)
 
     # --- Reconnect attempt ---
     reconnect_id = websocket.query_params.get("reconnect_id")
@@ -294,7 +539,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str) -> None:
     if (
         reconnect_id
         and reconnect_token
-        and validate_reconnect_token(room_id, reconnect_id, reconnect_token)
+        and await off_loop(validate_reconnect_token, room_id, reconnect_id, reconnect_token)
         and reconnect_id in room.participants
     ):
         participant_id = reconnect_id
@@ -308,50 +553,84 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str) -> None:
         is_mod = room.participants[participant_id].role == Role.MODERATOR
     else:
         mod_token = websocket.query_params.get("token")
-        is_mod = mod_token is not None and mod_token == get_moderator_token(room_id)
+        is_mod = mod_token is not None and mod_token == await off_loop(
+            get_moderator_token, room_id
+        )
 
-    manager.connect(room_id, participant_id, websocket)
+    # Opt-in: receive room_patch deltas instead of a full room_state each time
+    patches = websocket.query_params.get("patches") == "1"
+    manager.connect(
+        room_id, participant_id, websocket, patches=patches, protocol=protocol
+    )
+    # Everything below goes through the connection's outbox, welcome included,
+    # so frames reach the socket in order.
 
     if reconnected:
-        room.participants[participant_id].connected = True
-        existing_token = get_reconnect_token(room_id, participant_id)
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "welcome",
-                    "payload": {
-                        "participant_id": participant_id,
-                        "is_moderator": is_mod,
-                        "reconnected": True,
-                        "reconnect_token": existing_token,
-                    },
-                }
-            )
+        existing_token = await off_loop(get_reconnect_token, room_id, participant_id)
+        await manager.send_to(
+            room_id,
+            participant_id,
+            {
+                "type": "welcome",
+                "payload": {
+                    "participant_id": participant_id,
+                    "is_moderator": is_mod,
+                    "reconnected": True,
+                    "reconnect_token": existing_token,
+                    "patches": patches,
+                    "server_time": time.time(),
+                },
+            },
         )
-        await _broadcast_state(room_id)
+        async with room_lock(room_id):
+            room = await off_loop(get_room, room_id)
+            if room and participant_id in room.participants:
+                room.participants[participant_id].connected = True
+                await _broadcast_state(room, snapshot_to=participant_id)
+                await off_loop(save_room, room)
     else:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "welcome",
-                    "payload": {
-                        "participant_id": participant_id,
-                        "is_moderator": is_mod,
-                        "reconnected": False,
-                    },
-                }
-            )
+        await manager.send_to(
+            room_id,
+            participant_id,
+            {
+                "type": "welcome",
+                "payload": {
+                    "participant_id": participant_id,
+                    "is_moderator": is_mod,
+                    "reconnected": False,
+                    "patches": patches,
+                    "server_time": time.time(),
+                },
+            },
         )
 
     try:
         while True:
-            raw = await websocket.receive_text()
-            await handle_message(room_id, participant_id, raw, is_moderator=is_mod)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            raw = message.get("bytes")
+            if raw is None:
+                raw = message.get("text", "")
+            await handle_message(
+                room_id, participant_id, raw, is_moderator=is_mod, protocol=protocol
+            )
     except WebSocketDisconnect:
         pass
     finally:
         manager.disconnect(room_id, participant_id)
-        room = get_room(room_id)
+        # The server may cancel this task once the socket is gone
+        leave = asyncio.create_task(_leave(room_id, participant_id))
+        _leaving.add(leave)
+        leave.add_done_callback(_leaving.discard)
+        await asyncio.shield(leave)
+
+
+async def _leave(room_id: str, participant_id: str) -> None:
+    """Mark a participant whose socket closed as disconnected."""
+    async with room_lock(room_id):
+        room = await off_loop(get_room, room_id)
         if room and participant_id in room.participants:
             room.participants[participant_id].connected = False
-            await _broadcast_state(room_id)
+            await _broadcast_state(room)
+            await off_loop(save_room, room)
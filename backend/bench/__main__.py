@@ -0,0 +1,106 @@
+"""Benchmark harness for the BDA Poker backend.
+
+Run from the backend directory:
+
+    python -m bench micro
+    python -m bench load --rooms 50 --participants 8 --rounds 5
+    python -m bench load --url http://127.0.0.1:8000
+    python -m bench micro --compare bench/baseline.json
+    python -m bench micro --save bench/baseline.json
+
+`load` starts its own uvicorn unless `--url` is given. `--compare` exits
+with status 1 if a metric regressed by more than `--tolerance`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+from .load import local_server, run_load
+from .micro import run_micro
+
+Metrics = dict[str, dict[str, Any]]
+
+
+def compare(current: Metrics, baseline: Metrics, tolerance: float) -> list[str]:
+    """Names of metrics that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for name, metric in current.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if not base["value"]:
+            # No ratio to a zero baseline; for errors and timeouts any is worse
+            if metric["better"] == "lower" and metric["value"] > 0:
+                regressions.append(name)
+            continue
+        ratio = metric["value"] / base["value"]
+        if metric["better"] == "higher":
+            ratio = 1 / ratio if ratio else float("inf")
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def _print(mode: str, current: Metrics, baseline: Metrics) -> None:
+    print(f"{mode:<24}{'value':>14}  {'baseline':>12}")
+    for name, metric in current.items():
+        base = baseline.get(name)
+        base_value = f"{base['value']:>12}" if base else f"{'-':>12}"
+        print(f"{name:<24}{metric['value']:>14}  {base_value}  {metric['unit']}")
+
+
+async def _load(args: argparse.Namespace) -> Metrics:
+    options = {"rooms": args.rooms, "participants": args.participants, "rounds": args.rounds}
+    if args.url:
+        return await run_load(args.url.rstrip("/"), **options)
+    async with local_server() as (base_url, pid):
+        return await run_load(base_url, server_pid=pid, **options)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["micro", "load"])
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--participants", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument("--save", type=Path, help="store the results as baseline")
+    parser.add_argument("--compare", type=Path, help="baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.mode == "micro":
+        current = run_micro(participants=args.participants)
+    else:
+        current = asyncio.run(_load(args))
+
+    baseline: Metrics = {}
+    if args.compare:
+        baseline = json.loads(args.compare.read_text()).get(args.mode, {})
+    if args.json:
+        print(json.dumps(current, indent=2))
+    else:
+        _print(args.mode, current, baseline)
+
+    if args.save:
+        stored = json.loads(args.save.read_text()) if args.save.exists() else {}
+        stored[args.mode] = current
+        args.save.write_text(json.dumps(stored, indent=2) + "\n")
+
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        print(f"Regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
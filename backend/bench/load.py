@@ -0,0 +1,223 @@
+"""Load generator: scripted rooms against a running server over real WebSockets.
+
+Every room has one moderator and voters that play rounds of new_round,
+one vote per voter and reveal. Latency is measured from sending a message
+to the resulting room_state arriving at each socket of the room.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import websockets
+
+from .micro import VALUES
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+STATE_TYPES = ("room_state", "room_patch")
+
+
+class Client:
+    """One participant socket with a reader task."""
+
+    def __init__(self, ws: websockets.ClientConnection) -> None:
+        self.ws = ws
+        self.received = 0
+        self._states: asyncio.Queue[float] = asyncio.Queue()
+        self._messages: asyncio.Queue[dict] = asyncio.Queue()
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        async for raw in self.ws:
+            arrived = time.perf_counter()
+            self.received += 1
+            msg = json.loads(raw)
+            if msg["type"] in STATE_TYPES:
+                self._states.put_nowait(arrived)
+            else:
+                self._messages.put_nowait(msg)
+
+    async def send(self, type_: str, payload: dict | None = None) -> None:
+        await self.ws.send(json.dumps({"type": type_, "payload": payload or {}}))
+
+    async def message(self, type_: str, timeout: float) -> dict:
+        while True:
+            msg = await asyncio.wait_for(self._messages.get(), timeout)
+            if msg["type"] == type_:
+                return msg
+
+    async def state(self, timeout: float) -> float:
+        """Arrival time of the next room state."""
+        return await asyncio.wait_for(self._states.get(), timeout)
+
+    async def close(self) -> None:
+        await self.ws.close()
+        self._reader.cancel()
+
+
+class Results:
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.sent = 0
+        self.timeouts = 0
+        self.errors = 0
+
+
+async def _create_room(base_url: str) -> dict[str, str]:
+    def post() -> dict[str, str]:
+        request = urllib.request.Request(
+            base_url + "/api/rooms",
+            data=b"{}",
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            return json.load(resp)
+
+    return await asyncio.to_thread(post)
+
+
+async def _step(
+    actor: Client,
+    clients: list[Client],
+    results: Results,
+    type_: str,
+    payload: dict | None,
+    timeout: float,
+) -> None:
+    """Send one message and wait for its room state on every socket."""
+    start = time.perf_counter()
+    await actor.send(type_, payload)
+    results.sent += 1
+    for client in clients:
+        try:
+            arrived = await client.state(timeout)
+        except TimeoutError:
+            results.timeouts += 1
+            continue
+        results.latencies.append(arrived - start)
+
+
+async def _run_room(
+    base_url: str, participants: int, rounds: int, results: Results, timeout: float
+) -> list[Client]:
+    room = await _create_room(base_url)
+    ws_url = "ws" + base_url.removeprefix("http") + f"/api/rooms/{room['room_id']}/ws"
+    clients: list[Client] = []
+    try:
+        for n in range(participants):
+            url = f"{ws_url}?token={room['moderator_token']}" if n == 0 else ws_url
+            client = Client(await websockets.connect(url, max_size=None))
+            await client.message("welcome", timeout)
+            clients.append(client)
+            # A join publishes the state to everyone in the room so far
+            await _step(client, clients, results, "join", {"name": f"User {n}"}, timeout)
+            await client.message("reconnect_token", timeout)
+
+        moderator, voters = clients[0], clients[1:]
+        for round_number in range(rounds):
+            await _step(
+                moderator, clients, results, "new_round",
+                {"story": f"Story {round_number}"}, timeout,
+            )
+            for n, voter in enumerate(voters):
+                value = VALUES[(n + round_number) % len(VALUES)]
+                await _step(voter, clients, results, "vote", {"value": value}, timeout)
+            await _step(moderator, clients, results, "reveal", None, timeout)
+    except (OSError, websockets.WebSocketException, TimeoutError):
+        results.errors += 1
+    return clients
+
+
+def _process_stats(pid: int) -> tuple[float, int]:
+    """(CPU seconds, resident set size in bytes) of a local process (Linux)."""
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
+
+
+def percentile(values: list[float], pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+@asynccontextmanager
+async def local_server(env: dict[str, str] | None = None) -> AsyncIterator[tuple[str, int]]:
+    """Start uvicorn on a free port; yields (base URL, pid)."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(port), "--log-level", "warning",
+            "--ws", "app.compression:WebSocketProtocol",
+        ],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                await asyncio.to_thread(urllib.request.urlopen, base_url + "/api/decks", None, 1)
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("Server did not start")
+        yield base_url, proc.pid
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+async def run_load(
+    base_url: str,
+    *,
+    rooms: int = 20,
+    participants: int = 8,
+    rounds: int = 3,
+    timeout: float = 10.0,
+    server_pid: int | None = None,
+) -> dict[str, dict[str, Any]]:
+    """Play `rounds` in `rooms` concurrent rooms. Returns {metric: {value, unit, better}}."""
+    results = Results()
+    cpu_before = _process_stats(server_pid)[0] if server_pid else 0.0
+    start = time.perf_counter()
+    room_clients = await asyncio.gather(
+        *(_run_room(base_url, participants, rounds, results, timeout) for _ in range(rooms))
+    )
+    elapsed = time.perf_counter() - start
+    received = sum(c.received for clients in room_clients for c in clients)
+    await asyncio.gather(*(c.close() for clients in room_clients for c in clients))
+
+    metrics = {
+        "latency_p50": (percentile(results.latencies, 50) * 1000, "ms", "lower"),
+        "latency_p99": (percentile(results.latencies, 99) * 1000, "ms", "lower"),
+        "messages_per_second": ((results.sent + received) / elapsed, "msg/s", "higher"),
+        "sockets": (sum(len(clients) for clients in room_clients), "", "higher"),
+        "timeouts": (results.timeouts, "", "lower"),
+        "errors": (results.errors, "", "lower"),
+    }
+    if server_pid:
+        cpu_after, rss = _process_stats(server_pid)
+        metrics["server_cpu"] = ((cpu_after - cpu_before) / elapsed * 100, "%", "lower")
+        metrics["server_rss"] = (rss / 2**20, "MiB", "lower")
+    return {
+        name: {"value": round(value, 3), "unit": unit, "better": better}
+        for name, (value, unit, better) in metrics.items()
+    }
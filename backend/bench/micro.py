@@ -0,0 +1,87 @@
+"""Microbenchmarks of the per-message hot path, without sockets or network."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import timeit
+from collections.abc import Callable
+from typing import Any
+
+from app.bus import LocalBus
+from app.connection_manager import ConnectionManager
+from app.decks import get_deck, get_deck_cards
+from app.models import Participant, Role, Room, Round, Vote
+from app.stats import compute_stats
+
+VALUES = ["1", "2", "3", "5", "8", "13", "?", "coffee"]
+
+
+class _NullSocket:
+    async def send_text(self, data: str) -> None:
+        pass
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        pass
+
+
+def make_room(participants: int, *, revealed: bool = False) -> Room:
+    room = Room(id="bench")
+    room.current_round = Round(story="Benchmark story", revealed=revealed)
+    for n in range(participants):
+        pid = f"p{n}"
+        room.participants[pid] = Participant(id=pid, name=f"User {n}", role=Role.VOTER)
+        room.current_round.votes[pid] = Vote(participant_id=pid, value=VALUES[n % len(VALUES)])
+    return room
+
+
+def _per_call(fn: Callable[[], Any], repeat: int) -> float:
+    """Best-of-`repeat` time per call in microseconds."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def _broadcast_per_call(sockets: int, iterations: int) -> float:
+    async def run() -> float:
+        cm = ConnectionManager(bus=LocalBus("bench"))
+        for n in range(sockets):
+            cm.connect("bench", f"p{n}", _NullSocket())
+        message = {"type": "timer_start", "payload": {"seconds": 60}}
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await cm.broadcast("bench", message)
+            await cm.drain("bench")
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    return asyncio.run(run())
+
+
+def run_micro(participants: int = 12, repeat: int = 5) -> dict[str, dict[str, Any]]:
+    """Time the hot-path functions. Returns {metric: {value, unit, better}}."""
+    hidden = make_room(participants)
+    revealed = make_room(participants, revealed=True)
+    round_ = revealed.current_round
+    round_.vote_stats  # aggregated while voting, before the reveal
+    deck = get_deck(revealed.deck_type, revealed.description_flavor)
+
+    def change_vote() -> None:
+        round_.set_vote("p0", "13")
+        round_.set_vote("p0", "1")
+
+    timings = {
+        "public_state_hidden": _per_call(hidden.public_state, repeat),
+        "public_state_revealed": _per_call(revealed.public_state, repeat),
+        "compute_stats": _per_call(
+            lambda: compute_stats(round_.vote_stats, deck), repeat
+        ),
+        "vote_update": _per_call(change_vote, repeat) / 2,
+        "get_deck_cards": _per_call(
+            lambda: get_deck_cards("fibonacci", "technical"), repeat
+        ),
+        "broadcast": _broadcast_per_call(participants, 2000),
+    }
+    return {
+        name: {"value": round(value, 3), "unit": "us/call", "better": "lower"}
+        for name, value in timings.items()
+    }
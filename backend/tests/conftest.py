@@ -1,8 +1,9 @@
 import pytest
 from fastapi.testclient import TestClient
 
-from app.main import app
+from app import analytics, history
 from app import rooms as rooms_module
+from app.main import app
 
 
 @pytest.fixture
@@ -13,10 +14,9 @@ def client():
 @pytest.fixture(autouse=True)
 def clean_rooms():
     """Clear all rooms between tests."""
-    rooms_module._rooms.clear()
-    rooms_module._moderator_tokens.clear()
-    rooms_module._reconnect_tokens.clear()
+    rooms_module.store.clear()
+    history.store.clear()
+    analytics.load(None)
     yield
-    rooms_module._rooms.clear()
-    rooms_module._moderator_tokens.clear()
-    rooms_module._reconnect_tokens.clear()
+    rooms_module.store.clear()
+    history.store.clear()
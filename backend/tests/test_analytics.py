@@ -0,0 +1,213 @@
+import random
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app import analytics, main
+from app.analytics import Table, day_number
+from app.events import apply_event
+from app.rooms import create_room
+
+DAY = date(2026, 3, 2)
+
+
+def _add(table, room="r1", deck="fibonacci", day=DAY, **kwargs):
+    defaults = {"revealed": True, "consensus": False, "revotes": 0, "histogram": {}}
+    table.add(
+        day=day_number(day), room=room, deck=deck, flavor="technical", **{**defaults, **kwargs}
+    )
+
+
+def test_rounds_of_a_room_and_day_share_a_cell():
+    table = Table()
+    _add(table, consensus=True, histogram={"5": 3})
+    _add(table, revotes=2, consensus=True, histogram={"5": 1, "8": 2})
+    _add(table, revealed=False)
+    _add(table, room="r2", histogram={"3": 1})
+    assert len(table) == 2
+
+    (totals,) = table.query([[]])
+    assert totals == [
+        {
+            "key": {},
+            "rounds": 4,
+            "revealed": 3,
+            "consensus": 2,
+            "first_round_consensus": 1,
+            "revotes": 2,
+            "votes": 7,
+            "consensus_rate": 0.667,
+            "first_round_consensus_rate": 0.333,
+            "revotes_per_story": 0.5,
+            "distribution": {"5": 4, "8": 2, "3": 1},
+        }
+    ]
+
+
+def test_batched_groupings():
+    table = Table()
+    _add(table, room="r1", deck="fibonacci", histogram={"5": 1})
+    _add(table, room="r2", deck="tshirt", histogram={"m": 2})
+    _add(table, room="r2", deck="tshirt", day=date(2026, 3, 3), histogram={"l": 1})
+    by_deck, by_room_day = table.query([["deck"], ["room", "day"]])
+    assert [(g["key"], g["votes"]) for g in by_deck] == [
+        ({"deck": "fibonacci"}, 1),
+        ({"deck": "tshirt"}, 3),
+    ]
+    assert [g["key"] for g in by_room_day] == [
+        {"room": "r1", "day": "2026-03-02"},
+        {"room": "r2", "day": "2026-03-02"},
+        {"room": "r2", "day": "2026-03-03"},
+    ]
+
+
+def test_select():
+    table = Table()
+    _add(table, room="r1")
+    _add(table, room="r2", deck="tshirt", day=date(2026, 3, 5))
+    assert table.select(deck="tshirt") == [1]
+    assert table.select(since=date(2026, 3, 3)) == [1]
+    assert table.select(until=date(2026, 3, 3), room="r1") == [0]
+    assert table.select(room="unknown") == []
+
+
+def test_dict_roundtrip():
+    table = Table()
+    _add(table, consensus=True, histogram={"5": 2})
+    _add(table, room="r2", histogram={"?": 1})
+    restored = Table.from_dict(table.to_dict())
+    assert restored.query([["room"]]) == table.query([["room"]])
+    _add(restored, histogram={"5": 1})  # same cell as before
+    assert len(restored) == 2
+
+
+def test_finished_rounds_are_ingested():
+    room, _ = create_room("tshirt", "animals")
+    for pid in ("a", "b"):
+        apply_event(room, {"type": "join", "participant_id": pid, "name": pid, "role": "voter"})
+    apply_event(room, {"type": "new_round", "story": "S1", "story_link": None})
+    apply_event(room, {"type": "vote", "participant_id": "a", "value": "m"})
+    apply_event(room, {"type": "vote", "participant_id": "b", "value": "xl"})
+    apply_event(room, {"type": "reveal"})
+    apply_event(room, {"type": "reset_round"})
+    apply_event(room, {"type": "vote", "participant_id": "a", "value": "l"})
+    apply_event(room, {"type": "vote", "participant_id": "b", "value": "l"})
+    apply_event(room, {"type": "reveal"})
+    assert len(analytics.table) == 0  # still the current round
+    apply_event(room, {"type": "new_round", "story": "S2", "story_link": None})
+
+    (groups,) = analytics.table.query([["room", "deck", "flavor"]])
+    assert groups[0]["key"] == {"room": room.id, "deck": "tshirt", "flavor": "animals"}
+    assert groups[0]["consensus"] == 1
+    assert groups[0]["first_round_consensus"] == 0  # needed a re-vote
+    assert groups[0]["revotes_per_story"] == 1.0
+    assert groups[0]["distribution"] == {"l": 2}
+
+
+def test_votes_off_the_deck_are_folded():
+    room, _ = create_room("fibonacci", "technical")
+    for pid in ("a", "b", "c"):
+        apply_event(room, {"type": "join", "participant_id": pid, "name": pid, "role": "voter"})
+    apply_event(room, {"type": "new_round", "story": "S1", "story_link": None})
+    for pid, value in (("a", "x" * 1000), ("b", "5.0"), ("c", "?")):
+        apply_event(room, {"type": "vote", "participant_id": pid, "value": value})
+    apply_event(room, {"type": "reveal"})
+    apply_event(room, {"type": "new_round", "story": "S2", "story_link": None})
+    assert set(analytics.table.cards) == {"5", "?", analytics.OTHER}
+    (totals,) = analytics.table.query([[]])
+    assert totals[0]["distribution"] == {"5": 1, "?": 1, "other": 1}
+
+
+def test_old_days_pruned(monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_RETENTION_DAYS", 5)
+    table = Table()
+    for day in range(10):
+        _add(table, room=f"r{day}", day=date(2026, 1, 1 + day), histogram={str(day): 1})
+    # A round on January 11 keeps the five days from January 7
+    _add(table, room="r9", day=date(2026, 1, 11), histogram={"9": 1})
+    assert [g["key"]["day"] for g in table.query([["day"]])[0]] == [
+        f"2026-01-{d:02}" for d in range(7, 12)
+    ]
+    assert table.codes["room"].values == ["r6", "r7", "r8", "r9"]
+    assert set(table.cards) == {"6", "7", "8", "9"}
+    assert table.select(room="r9") == [3, 4]
+    assert Table.from_dict(table.to_dict()).query([["room"]]) == table.query([["room"]])
+
+
+def test_replayed_event_uses_its_time():
+    room, _ = create_room("fibonacci", "technical")
+    apply_event(room, {"type": "new_round", "story": "S1", "story_link": None})
+    at = datetime(2025, 12, 24, 10, tzinfo=timezone.utc).isoformat()
+    apply_event(room, {"type": "new_round", "story": "S2", "story_link": None, "at": at})
+    (groups,) = analytics.table.query([["day"]])
+    assert groups[0]["key"] == {"day": "2025-12-24"}
+
+
+def test_query_many_votes():
+    table = Table()
+    rng = random.Random(1)
+    cards = ["1", "2", "3", "5", "8", "13", "?"]
+    # A year of 200 rooms: 73k cells holding about 3.6M votes
+    for day in range(365):
+        for room in range(200):
+            table.add(
+                day=day, room=f"r{room}", deck="fibonacci", flavor="technical",
+                revealed=True, consensus=rng.random() < 0.4, revotes=rng.randrange(2),
+                histogram=dict.fromkeys(rng.sample(cards, 2), 25),
+            )
+    totals, by_room = table.query([[], ["room"]])
+    assert totals[0]["votes"] == 365 * 200 * 50
+    assert len(by_room) == 200
+    assert sum(g["votes"] for g in by_room) == totals[0]["votes"]
+    (selected,) = table.query([["room"]], table.select(since=date(1970, 1, 1)))
+    assert selected == by_room
+
+
+def test_copy_is_independent():
+    table = Table()
+    table.add(
+        day=1, room="r1", deck="fibonacci", flavor="technical",
+        revealed=True, consensus=True, revotes=0, histogram={"5": 2},
+    )
+    copy = table.copy()
+    table.add(
+        day=1, room="r2", deck="fibonacci", flavor="technical",
+        revealed=True, consensus=False, revotes=0, histogram={"8": 1},
+    )
+    table.prune(2)
+    (groups,) = copy.query([["room"]])
+    assert [g["key"]["room"] for g in groups] == ["r1"]
+    assert groups[0]["distribution"] == {"5": 2}
+    assert len(table) == 0
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    return {"Authorization": "Bearer secret"}
+
+
+def test_admin_api_disabled_without_token(client):
+    assert client.get("/api/admin/analytics").status_code == 404
+
+
+def test_admin_api_requires_token(client, admin):
+    resp = client.get("/api/admin/analytics", headers={"Authorization": "Bearer nope"})
+    assert resp.status_code == 401
+
+
+def test_admin_api(client, admin):
+    _add(analytics.table, room="r1", histogram={"5": 2})
+    _add(analytics.table, room="r2", deck="tshirt", histogram={"m": 1})
+    resp = client.get(
+        "/api/admin/analytics?group_by=&group_by=deck&since=2026-03-01&flavor=technical",
+        headers=admin,
+    )
+    assert resp.status_code == 200
+    totals, by_deck = resp.json()["groupings"]
+    assert totals["group_by"] == []
+    assert totals["groups"][0]["votes"] == 3
+    assert [g["key"]["deck"] for g in by_deck["groups"]] == ["fibonacci", "tshirt"]
+
+    resp = client.get("/api/admin/analytics?group_by=team", headers=admin)
+    assert resp.status_code == 400
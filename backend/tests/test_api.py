@@ -32,8 +32,9 @@ def test_get_room(client):
     data = resp.json()
     assert data["id"] == room_id
     assert data["deck_type"] == "fibonacci"
-    assert "deck_cards" in data
-    assert len(data["deck_cards"]) > 0
+    assert "deck_cards" not in data
+    assert data["deck_url"].startswith("/api/decks/fibonacci/technical?v=")
+    assert data["deck_etag"]
 
 
 def test_get_room_not_found(client):
@@ -50,3 +51,40 @@ def test_get_decks(client):
     assert "decks" in data
     assert "fibonacci" in data["decks"]
     assert "technical" in data["decks"]["fibonacci"]
+
+
+def test_get_decks_etag(client):
+    resp = client.get("/api/decks")
+    etag = resp.headers["etag"]
+    resp = client.get("/api/decks", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+
+
+def test_get_deck(client):
+    room_resp = client.get(f"/api/rooms/{client.post('/api/rooms', json={}).json()['room_id']}")
+    deck_url = room_resp.json()["deck_url"]
+
+    resp = client.get(deck_url)
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert resp.headers["etag"] == room_resp.json()["deck_etag"]
+    cards = resp.json()
+    assert cards[0]["value"] == "0"
+    assert "en" in cards[0]["description"]
+
+    resp = client.get(deck_url, headers={"If-None-Match": resp.headers["etag"]})
+    assert resp.status_code == 304
+
+
+def test_get_deck_unversioned_revalidates(client):
+    resp = client.get("/api/decks/tshirt/animals")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "no-cache"
+    resp = client.get("/api/decks/tshirt/animals?v=stale")
+    assert resp.headers["cache-control"] == "no-cache"
+
+
+def test_get_deck_not_found(client):
+    assert client.get("/api/decks/fibonacci/nonexistent").status_code == 404
+    assert client.get("/api/decks/nonexistent/technical").status_code == 404
@@ -0,0 +1,44 @@
+from bench.__main__ import compare
+from bench.load import percentile
+from bench.micro import make_room
+
+
+def metric(value, better="lower"):
+    return {"value": value, "unit": "", "better": better}
+
+
+def test_compare_flags_regressions():
+    baseline = {"latency": metric(10.0), "throughput": metric(1000.0, "higher")}
+    current = {"latency": metric(11.0), "throughput": metric(900.0, "higher")}
+    assert compare(current, baseline, 0.2) == []
+    assert compare(
+        {"latency": metric(13.0), "throughput": metric(700.0, "higher")}, baseline, 0.2
+    ) == ["latency", "throughput"]
+
+
+def test_compare_flags_failures_over_zero_baseline():
+    baseline = {"errors": metric(0), "timeouts": metric(0), "rate": metric(0, "higher")}
+    assert compare({"errors": metric(0), "timeouts": metric(0)}, baseline, 0.2) == []
+    assert compare(
+        {"errors": metric(50), "timeouts": metric(120), "rate": metric(5, "higher")},
+        baseline,
+        0.2,
+    ) == ["errors", "timeouts"]
+
+
+def test_compare_ignores_new_metrics():
+    assert compare({"new": metric(1.0)}, {}, 0.2) == []
+
+
+def test_percentile():
+    values = [float(n) for n in range(1, 101)]
+    assert percentile(values, 50) == 50.5
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_make_room():
+    room = make_room(5, revealed=True)
+    assert len(room.participants) == 5
+    assert len(room.current_round.votes) == 5
+    assert room.current_round.revealed
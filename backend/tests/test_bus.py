@@ -0,0 +1,129 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.bus import Envelope, LocalBus, RedisBus, _dumps, _loads
+from app.connection_manager import ConnectionManager
+from app.encoder import ROOM_PATCH, ROOM_STATE, StateFrames
+
+
+def make_mock_ws():
+    ws = AsyncMock()
+    ws.send_text = AsyncMock()
+    return ws
+
+
+def sent_types(ws):
+    return [json.loads(c.args[0])["type"] for c in ws.send_text.call_args_list]
+
+
+def test_envelope_roundtrip():
+    frames = StateFrames(3, {"id": "r1"}, {"revealed": True})
+    envelope = Envelope("r1", ROOM_STATE, frames=frames, changed=False, snapshot_to="p1")
+    envelope.origin = "w1"
+    restored = _loads(_dumps(envelope))
+    assert restored.room_id == "r1"
+    assert restored.changed is False
+    assert restored.snapshot_to == "p1"
+    assert restored.origin == "w1"
+    assert restored.frames.version == 3
+    assert restored.frames.has_patch
+    assert restored.frames.frame(ROOM_STATE) == frames.frame(ROOM_STATE)
+    assert restored.frames.frame(ROOM_PATCH) == frames.frame(ROOM_PATCH)
+
+
+def test_envelope_roundtrip_plain_message():
+    envelope = Envelope("r1", "error", '{"type": "error"}', to="p2")
+    restored = _loads(_dumps(envelope))
+    assert restored.frames is None
+    assert restored.data == '{"type": "error"}'
+    assert restored.to == "p2"
+
+
+async def test_local_bus_delivers_directly():
+    bus = LocalBus("w1")
+    cm = ConnectionManager(bus=bus)
+    ws = make_mock_ws()
+    cm.connect("room1", "p1", ws)
+    await cm.broadcast("room1", {"type": "ping"})
+    await cm.drain()
+    assert sent_types(ws) == ["ping"]
+    assert await bus.connection_counts() == {"w1": 1}
+    assert cm.stats()["worker"] == "w1"
+
+
+@pytest.fixture
+async def workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    managers = []
+    for worker_id in ("w1", "w2"):
+        client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        managers.append(ConnectionManager(bus=RedisBus(client, worker_id=worker_id)))
+    for cm in managers:
+        await cm.start()
+    yield managers
+    for cm in managers:
+        await cm.stop()
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_broadcast_reaches_other_worker(workers):
+    cm1, cm2 = workers
+    ws1, ws2 = make_mock_ws(), make_mock_ws()
+    cm1.connect("room1", "p1", ws1)
+    cm2.connect("room1", "p2", ws2)
+    await cm1.broadcast("room1", {"type": "ping"})
+    await wait_for(lambda: ws2.send_text.called)
+    await cm1.drain()
+    # Delivered once per socket, the publisher skips its own echo
+    assert sent_types(ws1) == ["ping"]
+    assert sent_types(ws2) == ["ping"]
+
+
+async def test_state_reaches_other_worker(workers):
+    cm1, cm2 = workers
+    ws = make_mock_ws()
+    cm2.connect("room1", "p2", ws, patches=True)
+    frames = StateFrames(2, {"id": "room1"}, {"revealed": True})
+    await cm1.broadcast_state("room1", frames)
+    await wait_for(lambda: ws.send_text.called)
+    assert json.loads(ws.send_text.call_args.args[0]) == {
+        "type": "room_patch",
+        "payload": {"revealed": True},
+    }
+
+
+async def test_send_to_participant_on_other_worker(workers):
+    cm1, cm2 = workers
+    ws = make_mock_ws()
+    cm2.connect("room1", "p2", ws)
+    await cm1.send_to("room1", "p2", {"type": "kicked"})
+    await wait_for(lambda: ws.send_text.called)
+    assert sent_types(ws) == ["kicked"]
+
+
+async def test_drop_on_other_worker(workers):
+    cm1, cm2 = workers
+    cm2.connect("room1", "p2", make_mock_ws())
+    await cm1.drop("room1", "p2")
+    await wait_for(lambda: "p2" not in cm2.get_connections("room1"))
+
+
+async def test_connection_counts(workers):
+    cm1, cm2 = workers
+    cm1.connect("room1", "p1", make_mock_ws())
+    cm2.connect("room1", "p2", make_mock_ws())
+    cm2.connect("room2", "p3", make_mock_ws())
+    await cm2.bus.client.set("bdapoker:worker:w2", 2)
+    counts = await cm1.bus.connection_counts()
+    assert counts["w1"] == 1
+    assert counts["w2"] == 2
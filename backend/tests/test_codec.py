@@ -0,0 +1,72 @@
+import pytest
+
+from app import codec
+
+BACKENDS = ["json", "orjson", "msgspec"]
+
+
+def load(name):
+    try:
+        return codec.load(name)
+    except ImportError:
+        pytest.skip(f"{name} not installed")
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_roundtrip(name):
+    _, dumps, loads, _ = load(name)
+    message = {"type": "room_state", "payload": {"story": "Größe ☕", "votes": {}, "n": 1.5}}
+    encoded = dumps(message)
+    assert isinstance(encoded, bytes)
+    assert loads(encoded) == message
+    assert loads(encoded.decode()) == message
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_compact_utf8(name):
+    _, dumps, _, _ = load(name)
+    assert dumps({"a": [1, "ä"]}) == '{"a":[1,"ä"]}'.encode()
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_decode_error(name):
+    _, _, loads, errors = load(name)
+    with pytest.raises(errors):
+        loads("{not json")
+
+
+def test_auto_prefers_installed_fast_codec():
+    name = codec.load("auto")[0]
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        assert name in ("msgspec", "json")
+    else:
+        assert name == "orjson"
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        codec.load("yaml")
+
+
+def test_dumps_text():
+    assert codec.dumps_text({"type": "ping"}) == '{"type":"ping"}'
+
+
+def test_negotiate():
+    if not codec.SUBPROTOCOLS:
+        pytest.skip("msgpack not installed")
+    assert codec.negotiate([]) == codec.JSON
+    assert codec.negotiate(["other", codec.MSGPACK]) == codec.MSGPACK
+
+
+def test_msgpack_roundtrip():
+    pytest.importorskip("msgpack")
+    message = {"type": "vote", "payload": {"value": "5"}}
+    encoded = codec.encode(message, codec.MSGPACK)
+    assert isinstance(encoded, bytes)
+    assert codec.decode(encoded, codec.MSGPACK) == message
+    assert codec.transcode(codec.dumps_text(message), codec.MSGPACK) == encoded
+    with pytest.raises(codec.DecodeError):
+        codec.decode(b"\xc1", codec.MSGPACK)
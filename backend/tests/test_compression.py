@@ -0,0 +1,53 @@
+import zlib
+
+from websockets.frames import Frame, Opcode
+
+from app import metrics
+from app.compression import ThresholdDeflate, ThresholdDeflateFactory
+
+
+def make_extension(min_size):
+    return ThresholdDeflate(False, False, 15, 13, {"memLevel": 5}, min_size=min_size)
+
+
+def test_small_messages_not_compressed():
+    extension = make_extension(256)
+    frame = Frame(Opcode.TEXT, b'{"type":"timer_stop","payload":{}}')
+    assert extension.encode(frame) is frame
+    ping = Frame(Opcode.PING, b"")
+    assert extension.encode(ping) is ping
+
+
+def test_context_shared_across_messages():
+    extension = make_extension(256)
+    decoder = zlib.decompressobj(wbits=-13)
+    state = b'{"type":"room_state","payload":{"deck_cards":"' + b"Piece of cake " * 40 + b'"}}'
+    first = extension.encode(Frame(Opcode.TEXT, state))
+    second = extension.encode(Frame(Opcode.TEXT, state))
+    assert first.rsv1 and second.rsv1
+    assert len(second.data) < len(first.data) < len(state)
+    for encoded in (first, second):
+        assert decoder.decompress(encoded.data + b"\x00\x00\xff\xff") == state
+
+
+def test_bandwidth_recorded():
+    payload = metrics.WS_PAYLOAD_BYTES.value()
+    wire = metrics.WS_WIRE_BYTES.value()
+    extension = make_extension(0)
+    extension.encode(Frame(Opcode.TEXT, b"a" * 1000))
+    assert metrics.WS_PAYLOAD_BYTES.value() == payload + 1000
+    assert wire < metrics.WS_WIRE_BYTES.value() < wire + 100
+
+
+def test_factory_negotiates_threshold_extension():
+    factory = ThresholdDeflateFactory(
+        server_max_window_bits=12,
+        client_max_window_bits=12,
+        compress_settings={"memLevel": 5},
+        min_size=128,
+    )
+    response, extension = factory.process_request_params([("client_max_window_bits", None)], [])
+    assert isinstance(extension, ThresholdDeflate)
+    assert extension.min_size == 128
+    assert extension.local_max_window_bits == 12
+    assert ("server_max_window_bits", "12") in response
@@ -4,7 +4,9 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from app import codec
 from app.connection_manager import ConnectionManager
+from app.encoder import StateFrames
 
 
 @pytest.fixture
@@ -55,13 +57,15 @@ async def test_send_to(cm):
     ws = make_mock_ws()
     cm.connect("room1", "p1", ws)
     await cm.send_to("room1", "p1", {"type": "test"})
-    ws.send_text.assert_called_once_with(json.dumps({"type": "test"}))
+    await cm.drain()
+    ws.send_text.assert_called_once_with(codec.dumps_text({"type": "test"}))
 
 
 @pytest.mark.asyncio
 async def test_send_to_nonexistent(cm):
     # Should not raise
     await cm.send_to("room1", "p1", {"type": "test"})
+    await cm.drain()
 
 
 @pytest.mark.asyncio
@@ -72,7 +76,8 @@ async def test_broadcast(cm):
     cm.connect("room1", "p2", ws2)
 
     await cm.broadcast("room1", {"type": "update"})
-    expected = json.dumps({"type": "update"})
+    await cm.drain()
+    expected = codec.dumps_text({"type": "update"})
     ws1.send_text.assert_called_once_with(expected)
     ws2.send_text.assert_called_once_with(expected)
 
@@ -87,6 +92,7 @@ async def test_broadcast_handles_closed_connection(cm):
 
     # Should not raise even though ws1 throws
     await cm.broadcast("room1", {"type": "update"})
+    await cm.drain()
     ws2.send_text.assert_called_once()
 
 
@@ -94,3 +100,224 @@ async def test_broadcast_handles_closed_connection(cm):
 async def test_broadcast_empty_room(cm):
     # Should not raise
     await cm.broadcast("nonexistent", {"type": "test"})
+    await cm.drain()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_state_patch_clients(cm):
+    full_ws = make_mock_ws()
+    patch_ws = make_mock_ws()
+    cm.connect("room1", "p1", full_ws)
+    cm.connect("room1", "p2", patch_ws, patches=True)
+
+    state = {"version": 2, "participants": {}}
+    patch = {"version": 2}
+    await cm.broadcast_state("room1", StateFrames(2, state, patch))
+    await cm.drain()
+    full_ws.send_text.assert_called_once_with(
+        codec.dumps_text({"type": "room_state", "payload": state})
+    )
+    patch_ws.send_text.assert_called_once_with(
+        codec.dumps_text({"type": "room_patch", "payload": patch})
+    )
+
+
+@pytest.mark.asyncio
+async def test_broadcast_state_snapshot_to(cm):
+    ws1 = make_mock_ws()
+    ws2 = make_mock_ws()
+    cm.connect("room1", "p1", ws1, patches=True)
+    cm.connect("room1", "p2", ws2, patches=True)
+
+    state = {"version": 3}
+    frames = StateFrames(3, state, {"version": 3})
+    await cm.broadcast_state("room1", frames, snapshot_to="p2")
+    await cm.drain()
+    assert json.loads(ws1.send_text.call_args[0][0])["type"] == "room_patch"
+    assert json.loads(ws2.send_text.call_args[0][0])["type"] == "room_state"
+
+
+@pytest.mark.asyncio
+async def test_broadcast_state_without_patch(cm):
+    ws = make_mock_ws()
+    cm.connect("room1", "p1", ws, patches=True)
+    await cm.broadcast_state("room1", StateFrames(1, {"version": 1}, None))
+    await cm.drain()
+    assert json.loads(ws.send_text.call_args[0][0])["type"] == "room_state"
+
+
+@pytest.mark.asyncio
+async def test_broadcast_state_unchanged_skips_patch_clients(cm):
+    full_ws = make_mock_ws()
+    patch_ws = make_mock_ws()
+    cm.connect("room1", "p1", full_ws)
+    cm.connect("room1", "p2", patch_ws, patches=True)
+    frames = StateFrames(4, {"version": 4}, {"version": 4})
+    await cm.broadcast_state("room1", frames, changed=False)
+    await cm.drain()
+    full_ws.send_text.assert_called_once()
+    patch_ws.send_text.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_send_to_encoded_frame(cm):
+    ws = make_mock_ws()
+    cm.connect("room1", "p1", ws)
+    await cm.send_to("room1", "p1", '{"type": "test"}')
+    await cm.drain()
+    ws.send_text.assert_called_once_with('{"type": "test"}')
+
+
+def test_disconnect_clears_patch_clients(cm):
+    cm.connect("room1", "p1", make_mock_ws(), patches=True)
+    cm.disconnect("room1", "p1")
+    assert "room1" not in cm._patch_clients
+
+
+def make_blocked_ws():
+    """A socket whose sends never complete, like a client on a stalled link."""
+    async def stall(data):
+        await asyncio.Event().wait()
+
+    ws = make_mock_ws()
+    ws.send_text.side_effect = stall
+    return ws
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_others(cm):
+    slow_ws = make_blocked_ws()
+    fast_ws = make_mock_ws()
+    cm.connect("room1", "p1", slow_ws)
+    cm.connect("room1", "p2", fast_ws)
+
+    await cm.broadcast("room1", {"type": "update"})
+    await cm._outboxes["room1", "p2"].drain()
+    fast_ws.send_text.assert_called_once()
+    assert cm.stats()["queued_frames"] == 0  # slow frame is in flight
+    await cm.broadcast("room1", {"type": "update"})
+    assert cm.stats()["max_queue_depth"] == 1
+
+
+@pytest.mark.asyncio
+async def test_overflow_latest_keeps_newest_state():
+    cm = ConnectionManager(outbox_size=2, overflow="latest")
+    ws = make_blocked_ws()
+    cm.connect("room1", "p1", ws)
+
+    await cm.broadcast("room1", {"type": "room_state", "payload": {"version": 1}})
+    await asyncio.sleep(0)  # writer picks up version 1 and stalls
+    for version in (2, 3, 4):
+        await cm.broadcast("room1", {"type": "room_state", "payload": {"version": version}})
+    await cm.broadcast("room1", {"type": "timer_stop", "payload": {}})
+
+    queued = [json.loads(data) for _, data in cm._outboxes["room1", "p1"]._frames]
+    assert [m["type"] for m in queued] == ["room_state", "timer_stop"]
+    assert queued[0]["payload"]["version"] == 4
+    assert cm.stats()["dropped_frames"] == 2
+    assert "p1" in cm.get_connections("room1")
+
+
+@pytest.mark.asyncio
+async def test_overflow_latest_on_other_frame_keeps_newest_state():
+    cm = ConnectionManager(outbox_size=3, overflow="latest")
+    ws = make_blocked_ws()
+    cm.connect("room1", "p1", ws)
+
+    await cm.broadcast("room1", {"type": "timer_stop", "payload": {}})
+    await asyncio.sleep(0)  # writer picks up the first frame and stalls
+    for version in (1, 2, 3):
+        await cm.broadcast("room1", {"type": "room_state", "payload": {"version": version}})
+    await cm.broadcast("room1", {"type": "error", "payload": {"message": "x"}})
+
+    queued = [json.loads(data) for _, data in cm._outboxes["room1", "p1"]._frames]
+    assert [m["type"] for m in queued] == ["room_state", "error"]
+    assert queued[0]["payload"]["version"] == 3
+    assert cm.stats()["dropped_frames"] == 2
+    assert "p1" in cm.get_connections("room1")
+
+
+@pytest.mark.asyncio
+async def test_overflow_disconnect_closes_socket():
+    cm = ConnectionManager(outbox_size=1, overflow="disconnect")
+    ws = make_blocked_ws()
+    cm.connect("room1", "p1", ws)
+
+    await cm.broadcast("room1", {"type": "room_state", "payload": {}})
+    await asyncio.sleep(0)
+    await cm.broadcast("room1", {"type": "room_state", "payload": {}})
+    await cm.broadcast("room1", {"type": "room_state", "payload": {}})
+    await cm.wait_closed()
+
+    assert cm.get_connections("room1") == {}
+    ws.close.assert_called_once_with(code=4008, reason="Too slow")
+    stats = cm.stats()
+    assert stats["overflow_disconnects"] == 1
+    assert stats["connections"] == 0
+
+
+def test_invalid_overflow_policy():
+    with pytest.raises(ValueError, match="Unknown overflow policy"):
+        ConnectionManager(overflow="bogus")
+
+
+@pytest.mark.asyncio
+async def test_disconnect_discards_pending_frames(cm):
+    ws = make_blocked_ws()
+    cm.connect("room1", "p1", ws)
+    await cm.broadcast("room1", {"type": "update"})
+    await cm.broadcast("room1", {"type": "update"})
+    cm.disconnect("room1", "p1")
+    assert cm.stats()["connections"] == 0
+    await cm.drain()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_once_per_protocol(cm, monkeypatch):
+    msgpack = pytest.importorskip("msgpack")
+    json_ws, bin_ws, bin_ws2 = make_mock_ws(), make_mock_ws(), make_mock_ws()
+    cm.connect("room1", "p1", json_ws)
+    cm.connect("room1", "p2", bin_ws, protocol=codec.MSGPACK)
+    cm.connect("room1", "p3", bin_ws2, protocol=codec.MSGPACK)
+    calls = []
+    transcode = codec.transcode
+
+    def counting_transcode(frame, protocol):
+        calls.append(protocol)
+        return transcode(frame, protocol)
+
+    monkeypatch.setattr(codec, "transcode", counting_transcode)
+    await cm.broadcast("room1", {"type": "timer_stop", "payload": {}})
+    frames = StateFrames(1, {"version": 1}, None)
+    await cm.broadcast_state("room1", frames)
+    await cm.drain()
+
+    assert calls.count(codec.MSGPACK) == 1
+    assert json.loads(json_ws.send_text.call_args_list[0].args[0])["type"] == "timer_stop"
+    sent = [msgpack.unpackb(c.args[0]) for c in bin_ws.send_bytes.call_args_list]
+    assert sent == [
+        {"type": "timer_stop", "payload": {}},
+        {"type": "room_state", "payload": {"version": 1}},
+    ]
+    state_frames = [ws.send_bytes.call_args_list[1].args[0] for ws in (bin_ws, bin_ws2)]
+    assert state_frames[0] is state_frames[1]
+    bin_ws.send_text.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_close_room_notifies_and_closes_all_sockets(cm):
+    ws1, ws2, other = make_mock_ws(), make_mock_ws(), make_mock_ws()
+    cm.connect("room1", "p1", ws1)
+    cm.connect("room1", "p2", ws2, patches=True)
+    cm.connect("room2", "p3", other)
+    await cm.close_room("room1", {"type": "room_closed", "payload": {"reason": "expired"}})
+    # Released at once, before the sockets finish closing
+    assert cm.get_connections("room1") == {}
+    assert "room1" not in cm._patch_clients
+    assert ("room1", "p1") not in cm._outboxes
+    await cm.wait_closed()
+    for ws in (ws1, ws2):
+        assert json.loads(ws.send_text.call_args.args[0])["type"] == "room_closed"
+        ws.close.assert_awaited_once_with(code=4011, reason="Room closed")
+    other.close.assert_not_awaited()
+    assert cm.room_ids() == ["room2"]
@@ -1,12 +1,20 @@
+import json
+
 import pytest
 
+from app import decks as decks_module
 from app.decks import (
     DECK_TYPES,
     DECK_VALUES,
     FLAVORS,
     SPECIAL_CARDS,
+    deck_types,
+    flavors,
     get_all_decks,
+    get_catalog,
+    get_deck,
     get_deck_cards,
+    register_deck,
 )
 
 
@@ -91,3 +99,47 @@ def test_get_all_decks():
         assert set(all_decks[dt].keys()) == set(FLAVORS)
         for fl in FLAVORS:
             assert len(all_decks[dt][fl]) > 0
+
+
+def test_get_deck_cards_is_precomputed():
+    assert get_deck_cards("fibonacci", "technical") is get_deck_cards(
+        "fibonacci", "technical"
+    )
+
+
+def test_deck_json_and_etag():
+    deck = get_deck("tshirt", "animals")
+    assert json.loads(deck.json) == [dict(card) for card in deck.cards]
+    assert deck.etag.startswith('"') and deck.etag.endswith('"')
+    assert deck.etag != get_deck("tshirt", "idioms").etag
+
+
+def test_register_custom_deck():
+    builtin = get_deck("fibonacci", "technical")
+    catalog, etag = get_catalog()
+    cards = [{"value": "1", "label": "1", "description": {"en": "One", "de": "Eins"}}]
+    try:
+        deck = register_deck("custom", "team", cards)
+        assert get_deck_cards("custom", "team") == tuple(cards)
+        assert "custom" in deck_types()
+        assert "team" in flavors()
+        assert get_all_decks()["custom"]["team"] == deck.cards
+        # Built-in entries are untouched, the catalog is rebuilt
+        assert get_deck("fibonacci", "technical") is builtin
+        assert get_catalog()[1] != etag
+    finally:
+        decks_module._registry.pop(("custom", "team"), None)
+        decks_module._catalog = None
+    assert get_catalog() == (catalog, etag)
+
+
+def test_register_deck_cannot_replace_builtin():
+    with pytest.raises(ValueError, match="Cannot replace built-in deck"):
+        register_deck("fibonacci", "technical", [])
+
+
+def test_register_deck_validates_cards():
+    with pytest.raises(ValueError, match="at least one card"):
+        register_deck("custom", "team", [])
+    with pytest.raises(ValueError, match="value, label and description"):
+        register_deck("custom", "team", [{"value": "1"}])
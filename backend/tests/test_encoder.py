@@ -0,0 +1,20 @@
+import json
+
+from app.encoder import ROOM_PATCH, ROOM_STATE, StateFrames
+
+
+def test_frame_room_state():
+    frames = StateFrames(3, {"id": "r1", "version": 3}, {"version": 3})
+    msg = json.loads(frames.frame(ROOM_STATE))
+    assert msg == {"type": "room_state", "payload": {"id": "r1", "version": 3}}
+
+
+def test_frame_room_patch():
+    frames = StateFrames(3, {"id": "r1", "version": 3}, {"version": 3})
+    msg = json.loads(frames.frame(ROOM_PATCH))
+    assert msg == {"type": "room_patch", "payload": {"version": 3}}
+
+
+def test_frame_encoded_once():
+    frames = StateFrames(1, {"version": 1}, None)
+    assert frames.frame(ROOM_STATE) is frames.frame(ROOM_STATE)
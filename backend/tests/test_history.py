@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import threading
+
+import pytest
+
+from app import history
+from app.events import apply_event
+from app.history import SQLiteHistoryStore
+from app.models import Round, Vote
+from app.rooms import create_room, delete_room
+
+
+def _play(room, rounds, votes=None):
+    """Start `rounds` new rounds, revealing each after the given votes."""
+    for i in range(rounds):
+        apply_event(room, {"type": "new_round", "story": f"S{i + 1}", "story_link": None})
+        for pid, value in (votes or {}).items():
+            apply_event(room, {"type": "vote", "participant_id": pid, "value": value})
+        apply_event(room, {"type": "reveal"})
+
+
+@pytest.fixture
+def window(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_WINDOW", 3)
+
+
+def test_store_archive_is_idempotent():
+    store = SQLiteHistoryStore()
+    rounds = [Round(story="a", round_number=1), Round(story="b", round_number=2)]
+    store.archive("r1", rounds)
+    store.archive("r1", rounds)  # journal replay
+    assert store.count("r1") == 2
+    assert [r.story for r in store.page("r1", None, 10)] == ["a", "b"]
+    assert [r.story for r in store.page("r1", 1, 10)] == ["b"]
+    store.delete_room("r1")
+    assert store.count("r1") == 0
+
+
+def test_store_writes_behind():
+    store = SQLiteHistoryStore()
+    threads = []
+    write = store._write
+    store._write = lambda ops: threads.append(threading.get_ident()) or write(ops)
+    store.archive("r1", [Round(story="a", round_number=1)])
+    store._writer.submit(lambda: None).result()  # the writer has run
+    assert threads and threads[0] != threading.get_ident()
+    assert store.count("r1") == 1
+
+
+def test_trim_keeps_window_in_memory(window):
+    room, _ = create_room("fibonacci", "technical")
+    _play(room, 11)  # 10 finished rounds
+    assert [r.round_number for r in room.history] == [8, 9, 10]
+    assert history.store.count(room.id) == 7
+    assert history.count(room) == 10
+    numbers = [r.round_number for r in history.iter_rounds(room, page_size=4)]
+    assert numbers == list(range(1, 11))
+
+
+def test_page_spans_store_and_window(window):
+    room, _ = create_room("fibonacci", "technical")
+    _play(room, 6)
+    assert [r.round_number for r in history.page(room, 2, 2)] == [3, 4]
+    assert [r.round_number for r in history.page(room, 4, 10)] == [5]
+
+
+def test_delete_room_drops_archived_rounds(window):
+    room, _ = create_room("fibonacci", "technical")
+    _play(room, 6)
+    delete_room(room.id)
+    assert history.store.count(room.id) == 0
+
+
+def test_round_record_hides_unrevealed_votes():
+    room, _ = create_room("fibonacci", "technical")
+    round_ = Round(story="s", votes={"p1": Vote("p1", "5")})
+    assert history.round_record(room, round_)["votes"] == [
+        {"participant_id": "p1", "name": None, "value": None}
+    ]
+
+
+def test_history_api_paginates(client, window):
+    room, _ = create_room("fibonacci", "technical")
+    apply_event(room, {"type": "join", "participant_id": "p1", "name": "Ann", "role": "voter"})
+    _play(room, 6, {"p1": "3"})
+
+    resp = client.get(f"/api/rooms/{room.id}/history?limit=2")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [r["story"] for r in data["rounds"]] == ["S1", "S2"]
+    assert data["rounds"][0]["votes"] == [{"participant_id": "p1", "name": "Ann", "value": "3"}]
+
+    seen = []
+    cursor = None
+    while True:
+        query = f"?limit=2&cursor={cursor}" if cursor is not None else "?limit=2"
+        data = client.get(f"/api/rooms/{room.id}/history{query}").json()
+        seen += [r["round_number"] for r in data["rounds"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [1, 2, 3, 4, 5]
+
+
+def test_history_api_errors(client):
+    assert client.get("/api/rooms/nope/history").status_code == 404
+    room, _ = create_room("fibonacci", "technical")
+    assert client.get(f"/api/rooms/{room.id}/history?limit=0").status_code == 422
+    resp = client.get(f"/api/rooms/{room.id}/history/export?format=xml")
+    assert resp.status_code == 422
+
+
+def test_export_ndjson(client, window):
+    room, _ = create_room("fibonacci", "technical")
+    _play(room, 6, {"p1": "8"})
+    resp = client.get(f"/api/rooms/{room.id}/history/export")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    assert "attachment" in resp.headers["content-disposition"]
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["round_number"] for r in lines] == [1, 2, 3, 4, 5]
+    assert lines[0]["votes"][0]["value"] == "8"
+
+
+def test_export_csv(client, window):
+    room, _ = create_room("fibonacci", "technical")
+    apply_event(room, {"type": "join", "participant_id": "p1", "name": "Ann", "role": "voter"})
+    _play(room, 3, {"p1": "5", "p2": "8"})
+    apply_event(room, {"type": "new_round", "story": "Skipped", "story_link": None})
+    apply_event(room, {"type": "new_round", "story": "Last", "story_link": None})
+
+    resp = client.get(f"/api/rooms/{room.id}/history/export?format=csv")
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert len(rows) == 3 * 2 + 1
+    assert rows[0] == {
+        "round_number": "1",
+        "story": "S1",
+        "story_link": "",
+        "revealed": "True",
+        "participant_id": "p1",
+        "name": "Ann",
+        "value": "5",
+    }
+    assert rows[-1]["story"] == "Skipped"
+    assert rows[-1]["participant_id"] == ""
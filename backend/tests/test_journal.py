@@ -0,0 +1,278 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app import analytics, history
+from app import rooms as rooms_module
+from app.journal import Journal
+from app.rooms import (
+    create_reconnect_token,
+    create_room,
+    delete_room,
+    get_moderator_token,
+    get_room,
+    record_event,
+    restore_rooms,
+    validate_reconnect_token,
+)
+from app.ws import restore_timers, timers
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    journal = Journal(tmp_path, fsync_interval=0)
+    monkeypatch.setattr(rooms_module, "journal", journal)
+    restore_rooms()  # opens an empty journal
+    return journal
+
+
+def restart(journal):
+    """Simulate a process restart: drop memory, replay from disk."""
+    journal._file.close()
+    rooms_module.store.clear()
+    fresh = Journal(journal.directory, fsync_interval=0)
+    rooms_module.journal = fresh
+    restore_rooms()
+    return fresh
+
+
+def test_events_replayed(journal):
+    room, token = create_room("fibonacci", "technical")
+    record_event(room, {"type": "join", "participant_id": "p1", "name": "Alice", "role": "moderator"})
+    record_event(room, {"type": "join", "participant_id": "p2", "name": "Bob", "role": "voter"})
+    record_event(room, {"type": "new_round", "story": "Login", "story_link": None})
+    record_event(room, {"type": "vote", "participant_id": "p2", "value": "5"})
+    record_event(room, {"type": "reveal"})
+    reconnect = create_reconnect_token(room.id, "p2")
+
+    restart(journal)
+    restored = get_room(room.id)
+    assert restored is not room
+    assert set(restored.participants) == {"p1", "p2"}
+    assert not restored.participants["p2"].connected
+    assert restored.current_round.story == "Login"
+    assert restored.current_round.votes["p2"].value == "5"
+    assert restored.current_round.revealed
+    assert restored.last_activity >= room.created_at
+    assert get_moderator_token(room.id) == token
+    assert validate_reconnect_token(room.id, "p2", reconnect)
+
+
+def test_kick_and_change_deck_replayed(journal):
+    room, _ = create_room("fibonacci", "technical")
+    record_event(room, {"type": "join", "participant_id": "p1", "name": "Alice", "role": "voter"})
+    record_event(room, {"type": "new_round", "story": "", "story_link": None})
+    record_event(room, {"type": "vote", "participant_id": "p1", "value": "3"})
+    record_event(room, {"type": "kick", "participant_id": "p1"})
+    record_event(room, {"type": "change_deck", "deck_type": "tshirt", "description_flavor": "animals"})
+
+    restart(journal)
+    restored = get_room(room.id)
+    assert restored.participants == {}
+    assert restored.current_round.votes == {}
+    assert restored.deck_type == "tshirt"
+    assert restored.description_flavor == "animals"
+
+
+def test_running_timer_rescheduled(journal):
+    room, _ = create_room("fibonacci", "technical")
+    record_event(room, {"type": "new_round", "story": "", "story_link": None})
+    record_event(room, {"type": "start_timer", "deadline": 1000.0, "auto_reveal": True})
+    stopped, _ = create_room("fibonacci", "technical")
+    record_event(stopped, {"type": "new_round", "story": "", "story_link": None})
+    record_event(stopped, {"type": "start_timer", "deadline": 1000.0, "auto_reveal": False})
+    record_event(stopped, {"type": "stop_timer"})
+
+    restart(journal)
+    assert get_room(room.id).current_round.timer_deadline == 1000.0
+    assert get_room(room.id).current_round.auto_reveal
+    assert get_room(stopped.id).current_round.timer_deadline is None
+    assert restore_timers() == 1
+    assert timers.deadline(room.id) == 1000.0
+    timers.cancel(room.id)
+
+
+def test_archived_history_replayed_once(journal, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_WINDOW", 2)
+    room, _ = create_room("fibonacci", "technical")
+    for i in range(6):
+        record_event(room, {"type": "new_round", "story": f"S{i}", "story_link": None})
+    assert history.store.count(room.id) == 3
+
+    restart(journal)  # the history database outlives the process
+    restored = get_room(room.id)
+    assert [r.round_number for r in restored.history] == [4, 5]
+    assert history.store.count(room.id) == 3
+    assert [r.story for r in history.iter_rounds(restored)] == [f"S{i}" for i in range(5)]
+
+
+def test_analytics_restored_exactly(journal):
+    room, _ = create_room("fibonacci", "technical")
+    for story in ("A", "B", "C"):
+        record_event(room, {"type": "new_round", "story": story, "story_link": None})
+    journal = restart(journal)  # replayed from the log, then compacted
+    record_event(get_room(room.id), {"type": "new_round", "story": "D", "story_link": None})
+    delete_room(room.id)
+    restart(journal)  # snapshot plus the events after it
+
+    (totals,) = analytics.table.query([[]])
+    assert totals[0]["rounds"] == 3  # the deleted room still counts
+
+
+def test_story_queue_replayed(journal):
+    room, _ = create_room("fibonacci", "technical")
+    stories = [{"story": f"S{i}", "story_link": None} for i in range(3)]
+    record_event(room, {"type": "queue_stories", "stories": stories})
+    record_event(room, {"type": "new_round", "story": "S0", "story_link": None, "queued": True})
+    journal = restart(journal)
+    record_event(get_room(room.id), {"type": "new_round", "story": "S1", "story_link": None, "queued": True})
+    restart(journal)
+
+    restored = get_room(room.id)
+    assert restored.current_round.story == "S1"
+    assert [s.story for s in restored.queue] == ["S2"]
+    assert restored.queue_start == 2
+
+
+def test_deleted_room_not_restored(journal):
+    room, _ = create_room("fibonacci", "technical")
+    delete_room(room.id)
+    restart(journal)
+    assert get_room(room.id) is None
+
+
+def test_restart_compacts_log(journal):
+    room, _ = create_room("fibonacci", "technical")
+    record_event(room, {"type": "new_round", "story": "A", "story_link": None})
+    journal = restart(journal)
+    assert journal.log_path.read_text() == ""
+    snapshot = json.loads(journal.snapshot_path.read_text())
+    assert snapshot["seq"] == 2
+    assert snapshot["rooms"][0]["id"] == room.id
+
+    # Events after the snapshot are replayed on top of it
+    record_event(get_room(room.id), {"type": "new_round", "story": "B", "story_link": None})
+    restart(journal)
+    restored = get_room(room.id)
+    assert restored.current_round.story == "B"
+    assert [r.story for r in restored.history] == ["A"]
+
+
+def test_events_before_snapshot_skipped(tmp_path):
+    # A crash between writing the snapshot and truncating the log
+    journal = Journal(tmp_path)
+    journal.snapshot_path.write_text(json.dumps({"seq": 2, "rooms": []}))
+    journal.log_path.write_text(
+        "".join(json.dumps({"seq": n, "type": "reveal"}) + "\n" for n in (1, 2, 3))
+    )
+    _, events = journal.load()
+    assert [e["seq"] for e in events] == [3]
+    assert journal.seq == 3
+
+
+def test_torn_entry_ignored(tmp_path):
+    journal = Journal(tmp_path)
+    journal.log_path.write_text(json.dumps({"seq": 1, "type": "reveal"}) + '\n{"seq": 2, "ty')
+    _, events = journal.load()
+    assert [e["seq"] for e in events] == [1]
+
+
+async def test_batched_fsync_and_compaction(tmp_path, monkeypatch):
+    journal = Journal(tmp_path, fsync_interval=0.01, snapshot_events=3)
+    journal.compact({"rooms": []})
+    syncs = []
+    monkeypatch.setattr("app.journal.os.fsync", syncs.append)
+    for _ in range(2):
+        journal.append({"type": "reveal"})
+    assert syncs == []  # nothing synced per event
+
+    task = asyncio.create_task(journal.run(lambda: {"rooms": []}))
+    await asyncio.sleep(0.05)
+    assert len(syncs) == 1
+    assert len(journal.log_path.read_text().splitlines()) == 2
+
+    journal.append({"type": "reveal"})
+    await asyncio.sleep(0.05)
+    task.cancel()
+    assert journal.pending == 0
+    assert json.loads(journal.snapshot_path.read_text())["seq"] == 3
+
+
+def test_append_requires_open(tmp_path):
+    with pytest.raises(RuntimeError):
+        Journal(tmp_path).append({"type": "reveal"})
+
+
+async def test_background_compaction_keeps_logging(tmp_path):
+    journal = Journal(tmp_path, fsync_interval=0)
+    journal.compact({"rooms": []})
+    journal.append({"type": "reveal"})
+    started, release = threading.Event(), threading.Event()
+    write = journal._write_snapshot
+
+    def slow_write(seq, snapshot):
+        started.set()
+        release.wait(5)
+        write(seq, snapshot)
+
+    journal._write_snapshot = slow_write
+    task = asyncio.create_task(journal.compact_in_background({"rooms": []}))
+    await asyncio.to_thread(started.wait, 5)
+    journal.append({"type": "reveal"})  # while the snapshot is being written
+
+    # A crash now loses nothing: the log moved aside is read as well
+    _, events = Journal(tmp_path).load()
+    assert [e["seq"] for e in events] == [1, 2]
+
+    release.set()
+    await task
+    assert not journal.old_log_path.exists()
+    snapshot, events = Journal(tmp_path).load()
+    assert snapshot["seq"] == 1
+    assert [e["seq"] for e in events] == [2]
+
+
+async def test_failed_compaction_keeps_running(tmp_path, monkeypatch):
+    journal = Journal(tmp_path, fsync_interval=0.01, snapshot_events=1)
+    journal.compact({"rooms": []})
+    failures = iter([RuntimeError("snapshot failed")])
+
+    def snapshot():
+        for exc in failures:
+            raise exc
+        return {"rooms": []}
+
+    journal.append({"type": "reveal"})
+    task = asyncio.create_task(journal.run(snapshot))
+    await asyncio.sleep(0.05)
+    assert not task.done()
+    journal.append({"type": "reveal"})
+    await asyncio.sleep(0.05)
+    task.cancel()
+    assert journal.pending == 0
+    assert json.loads(journal.snapshot_path.read_text())["seq"] == 2
+
+
+async def test_failed_snapshot_write_keeps_moved_log(tmp_path):
+    journal = Journal(tmp_path, fsync_interval=0)
+    journal.compact({"rooms": []})
+    journal.append({"type": "reveal"})
+    write = journal._write_snapshot
+
+    def failing_write(seq, snapshot):
+        raise OSError("disk full")
+
+    journal._write_snapshot = failing_write
+    with pytest.raises(OSError):
+        await journal.compact_in_background({"rooms": []})
+    journal.append({"type": "reveal"})
+    with pytest.raises(OSError):
+        await journal.compact_in_background({"rooms": []})
+
+    _, events = Journal(tmp_path).load()
+    assert [e["seq"] for e in events] == [1, 2]
+    journal._write_snapshot = write
+    await journal.compact_in_background({"rooms": []})
+    assert not journal.old_log_path.exists()
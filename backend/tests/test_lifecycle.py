@@ -0,0 +1,77 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app import rooms
+from app.connection_manager import ROOM_CLOSED_CODE, manager
+from app.lifecycle import dissolve_expired_rooms
+from app.main import app
+from app.rooms import create_room, get_reconnect_token, get_room, save_room
+from app.ws import timers
+
+
+def _until(ws, kind):
+    while (msg := json.loads(ws.receive_text()))["type"] != kind:
+        pass
+    return msg
+
+
+def _join(ws, name):
+    ws.send_text(json.dumps({"type": "join", "payload": {"name": name}}))
+    _until(ws, "reconnect_token")
+
+
+def _expect_closed(ws):
+    # Any state still queued is flushed before the notice
+    msg = _until(ws, "room_closed")
+    assert msg["payload"] == {"reason": "expired"}
+    with pytest.raises(WebSocketDisconnect) as exc:
+        ws.receive_text()
+    assert exc.value.code == ROOM_CLOSED_CODE
+
+
+def test_expired_room_closes_sockets_and_releases_state():
+    room, token = create_room("fibonacci", "technical")
+    with TestClient(app) as client:
+        with (
+            client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as mod,
+            client.websocket_connect(f"/api/rooms/{room.id}/ws") as alice,
+        ):
+            mod.receive_text()
+            alice.receive_text()
+            _join(mod, "Mod")
+            _join(alice, "Alice")
+            mod.send_text(json.dumps({"type": "new_round", "payload": {"story": "S"}}))
+            mod.send_text(json.dumps({"type": "start_timer", "payload": {"seconds": 60}}))
+            _until(mod, "timer_start")
+            assert timers.deadline(room.id) is not None
+
+            room.last_activity = datetime.now(timezone.utc) - timedelta(
+                seconds=rooms.ROOM_EXPIRY_SECONDS + 1
+            )
+            save_room(room)
+            assert client.portal.call(dissolve_expired_rooms) == 1
+
+            _expect_closed(mod)
+            _expect_closed(alice)
+
+    assert get_room(room.id) is None
+    assert all(get_reconnect_token(room.id, pid) is None for pid in room.participants)
+    assert room.id not in manager.room_ids()
+    assert not any(rid == room.id for rid, _ in manager._outboxes)
+    assert timers.deadline(room.id) is None
+
+
+def test_sockets_of_deleted_room_are_closed():
+    room, _ = create_room("fibonacci", "technical")
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/api/rooms/{room.id}/ws") as ws:
+            ws.receive_text()
+            _join(ws, "Alice")
+            rooms.store.delete_room(room.id)  # e.g. a Redis key that expired
+            assert client.portal.call(dissolve_expired_rooms) == 0
+            _expect_closed(ws)
+    assert room.id not in manager.room_ids()
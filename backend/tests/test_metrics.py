@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from app import metrics
+from app.metrics import Counter, Histogram, Registry
+from app.rooms import cleanup_expired_rooms, create_room, save_room
+
+
+def test_counter_render():
+    registry = Registry()
+    counter = registry.register(Counter("test_events", "Events", ("type",)))
+    counter.inc(labels=("a",))
+    counter.inc(2, labels=('say "hi"',))
+    text = registry.render()
+    assert "# TYPE test_events_total counter" in text
+    assert 'test_events_total{type="a"} 1' in text
+    assert r'test_events_total{type="say \"hi\""} 2' in text
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = registry.register(Histogram("test_seconds", "Durations", (0.1, 1.0)))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert 'test_seconds_bucket{le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{le="1"} 3' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 4' in lines
+    assert "test_seconds_sum 3.65" in lines
+    assert "test_seconds_count 4" in lines
+
+
+def test_openmetrics_render():
+    registry = Registry()
+    registry.register(Counter("test_events", "Events")).inc()
+    text = registry.render(openmetrics=True)
+    assert "# TYPE test_events counter" in text
+    assert "test_events_total 1" in text
+    assert text.endswith("# EOF\n")
+
+
+def test_metrics_endpoint(client):
+    create_room("fibonacci", "technical")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "bdapoker_rooms 1" in resp.text.splitlines()
+
+    resp = client.get("/metrics", headers={"Accept": "application/openmetrics-text"})
+    assert resp.headers["content-type"].startswith("application/openmetrics-text")
+    assert resp.text.endswith("# EOF\n")
+
+
+def test_messages_counted_per_type(client):
+    joins = metrics.MESSAGES.value(("join",))
+    unknown = metrics.MESSAGES.value(("unknown",))
+    fanout = metrics.BROADCAST_FANOUT.count()
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        ws.receive_text()
+        ws.send_text(json.dumps({"type": "join", "payload": {"name": "Mod"}}))
+        ws.receive_text()
+        ws.receive_text()
+        ws.send_text(json.dumps({"type": "bogus"}))
+        ws.receive_text()
+    assert metrics.MESSAGES.value(("join",)) == joins + 1
+    assert metrics.MESSAGES.value(("unknown",)) == unknown + 1
+    assert metrics.MESSAGE_DURATION.count(("join",)) >= 1
+    assert metrics.BROADCAST_FANOUT.count() > fanout
+
+
+def test_cleanup_recorded():
+    removed = metrics.CLEANUP_REMOVED.value()
+    runs = metrics.CLEANUP_DURATION.count()
+    room, _ = create_room("fibonacci", "technical")
+    room.last_activity = datetime.now(timezone.utc) - timedelta(hours=5)
+    save_room(room)
+    cleanup_expired_rooms()
+    assert metrics.CLEANUP_REMOVED.value() == removed + 1
+    assert metrics.CLEANUP_DURATION.count() == runs + 1
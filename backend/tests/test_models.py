@@ -1,3 +1,4 @@
+import json
 from datetime import datetime, timezone
 
 from app.models import (
@@ -54,7 +55,7 @@ def test_room_touch():
 
 def test_room_public_state_no_round():
     r = Room(id="test123")
-    state = r.public_state([])
+    state = r.public_state()
     assert state["id"] == "test123"
     assert state["current_round"] is None
     assert state["participants"] == {}
@@ -67,7 +68,7 @@ def test_room_public_state_with_unrevealed_votes():
         story="Test story",
         votes={"p1": Vote(participant_id="p1", value="5")},
     )
-    state = r.public_state([])
+    state = r.public_state()
     votes = state["current_round"]["votes"]
     # Should NOT expose the value
     assert "value" not in votes["p1"]
@@ -82,7 +83,7 @@ def test_room_public_state_with_revealed_votes():
         votes={"p1": Vote(participant_id="p1", value="5")},
         revealed=True,
     )
-    state = r.public_state([])
+    state = r.public_state()
     votes = state["current_round"]["votes"]
     assert votes["p1"]["value"] == "5"
 
@@ -96,3 +97,35 @@ def test_create_room_request_defaults():
 def test_create_room_response():
     resp = CreateRoomResponse(room_id="abc", moderator_token="tok")
     assert resp.room_id == "abc"
+
+
+def test_room_timestamps_per_instance():
+    r1 = Room(id="a")
+    r2 = Room(id="b")
+    assert r2.created_at >= r1.created_at
+    assert r1.participants is not r2.participants
+
+
+def test_live_models_are_slotted():
+    for obj in (
+        Participant(id="p1", name="Alice", role=Role.VOTER),
+        Vote(participant_id="p1", value="5"),
+        Round(),
+        Room(id="test123"),
+    ):
+        assert not hasattr(obj, "__dict__")
+
+
+def test_room_dict_roundtrip():
+    r = Room(id="test123", deck_type="tshirt", version=4)
+    r.participants["p1"] = Participant(id="p1", name="Alice", role=Role.VOTER)
+    r.history.append(Round(story="Old", revealed=True))
+    r.current_round = Round(
+        story="New",
+        story_link="https://example.com",
+        votes={"p1": Vote(participant_id="p1", value="5")},
+        round_number=2,
+    )
+    restored = Room.from_dict(json.loads(json.dumps(r.to_dict())))
+    assert restored == r
+    assert restored.participants["p1"].role is Role.VOTER
@@ -0,0 +1,63 @@
+from app.patches import apply_patch, diff_state
+
+
+def test_diff_identical():
+    state = {"a": 1, "b": {"c": 2}}
+    assert diff_state(state, dict(state)) == {}
+
+
+def test_diff_changed_value():
+    assert diff_state({"a": 1, "b": 2}, {"a": 1, "b": 3}) == {"b": 3}
+
+
+def test_diff_nested():
+    old = {"participants": {"p1": {"name": "Alice", "connected": True}}}
+    new = {"participants": {"p1": {"name": "Alice", "connected": False}}}
+    assert diff_state(old, new) == {"participants": {"p1": {"connected": False}}}
+
+
+def test_diff_removed_key():
+    old = {"participants": {"p1": {"name": "A"}, "p2": {"name": "B"}}}
+    new = {"participants": {"p1": {"name": "A"}}}
+    assert diff_state(old, new) == {"participants": {"p2": None}}
+
+
+def test_diff_emptied_dict():
+    old = {"votes": {"p1": {"has_voted": True}}}
+    new = {"votes": {}}
+    patch = diff_state(old, new)
+    assert apply_patch(old, patch) == new
+
+
+def test_diff_list_replaced_whole():
+    assert diff_state({"cards": [1, 2]}, {"cards": [1, 3]}) == {"cards": [1, 3]}
+
+
+def test_apply_roundtrip():
+    old = {
+        "id": "r1",
+        "version": 1,
+        "participants": {"p1": {"name": "Alice"}},
+        "current_round": None,
+    }
+    new = {
+        "id": "r1",
+        "version": 2,
+        "participants": {"p1": {"name": "Alice"}, "p2": {"name": "Bob"}},
+        "current_round": {"story": "Login", "votes": {}},
+        "stats": {"average": 5.0},
+    }
+    assert apply_patch(old, diff_state(old, new)) == {
+        **new,
+    }
+    # And back again: removed keys are deleted, None reads as missing
+    back = apply_patch(new, diff_state(new, old))
+    assert back["participants"] == old["participants"]
+    assert "stats" not in back
+    assert back.get("current_round") is None
+
+
+def test_apply_does_not_mutate_input():
+    state = {"a": {"b": 1}}
+    apply_patch(state, {"a": {"b": 2}})
+    assert state == {"a": {"b": 1}}
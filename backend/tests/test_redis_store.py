@@ -0,0 +1,214 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app import history
+from app import rooms as rooms_module
+from app.events import apply_event
+from app.main import app
+from app.models import Participant, Role
+from app.redis_store import RedisHistoryStore, RedisRoomStore
+from app.rooms import (
+    ROOM_EXPIRY_SECONDS,
+    create_reconnect_token,
+    create_room,
+    delete_room,
+    get_moderator_token,
+    get_room,
+    off_loop,
+    room_lock,
+    save_room,
+    validate_reconnect_token,
+)
+
+
+def _sync(ws):
+    """Round trip through the room, after which earlier messages are saved."""
+    ws.send_text(json.dumps({"type": "sync"}))
+    assert json.loads(ws.receive_text())["type"] == "room_state"
+
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    store = RedisRoomStore(
+        client,
+        expiry=ROOM_EXPIRY_SECONDS,
+        async_client=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    monkeypatch.setattr(rooms_module, "store", store)
+    monkeypatch.setattr(history, "store", RedisHistoryStore(client))
+    return store
+
+
+def test_create_and_get_room(redis_store):
+    room, token = create_room("tshirt", "animals")
+    fetched = get_room(room.id)
+    assert fetched is not room  # every worker loads its own copy
+    assert fetched.deck_type == "tshirt"
+    assert get_moderator_token(room.id) == token
+
+
+def test_save_room(redis_store):
+    room, _ = create_room("fibonacci", "technical")
+    room.participants["p1"] = Participant(id="p1", name="Alice", role=Role.VOTER)
+    room.version = 3
+    save_room(room)
+    fetched = get_room(room.id)
+    assert fetched.participants["p1"].name == "Alice"
+    assert fetched.version == 3
+
+
+def test_keys_expire_with_room(redis_store):
+    room, _ = create_room("fibonacci", "technical")
+    create_reconnect_token(room.id, "p1")
+    client = redis_store.client
+    for kind in ("room", "modtoken", "reconnect"):
+        ttl = client.ttl(f"bdapoker:{kind}:{room.id}")
+        assert 0 < ttl <= ROOM_EXPIRY_SECONDS
+
+
+def test_save_does_not_resurrect_deleted_room(redis_store):
+    room, _ = create_room("fibonacci", "technical")
+    delete_room(room.id)
+    save_room(room)
+    assert get_room(room.id) is None
+    assert get_moderator_token(room.id) is None
+
+
+def test_reconnect_tokens(redis_store):
+    room, _ = create_room("fibonacci", "technical")
+    token = create_reconnect_token(room.id, "p1")
+    assert validate_reconnect_token(room.id, "p1", token)
+    assert not validate_reconnect_token(room.id, "p1", "wrong")
+    delete_room(room.id)
+    assert not validate_reconnect_token(room.id, "p1", token)
+
+
+def test_count_follows_index(redis_store):
+    rooms = [create_room("fibonacci", "technical")[0] for _ in range(3)]
+    delete_room(rooms[0].id)
+    assert redis_store.count() == 2
+    # A room whose keys expired drops out of the count
+    redis_store.client.zadd("bdapoker:rooms", {rooms[1].id: time.time() - 1})
+    assert redis_store.count() == 1
+
+
+async def test_store_calls_run_off_the_loop(redis_store):
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def call():
+        threads.append(threading.get_ident())
+
+    await off_loop(call)
+    assert threads and threads[0] != loop_thread
+
+
+async def test_busy_room_reports_error(redis_store, monkeypatch):
+    from app import ws as ws_module
+
+    room, _ = create_room("fibonacci", "technical")
+    redis_store.lock_timeout = 0.05
+    await redis_store.async_client.set(f"bdapoker:lock:{room.id}", "another worker")
+    errors = []
+
+    async def send_error(room_id, participant_id, message):
+        errors.append(message)
+
+    monkeypatch.setattr(ws_module, "_send_error", send_error)
+    await ws_module.handle_message(room.id, "p1", json.dumps({"type": "reveal"}))
+    assert errors == ["Room is busy, try again"]
+
+
+def test_history_shared_and_expiring_with_room(redis_store, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_WINDOW", 2)
+    room, _ = create_room("fibonacci", "technical")
+    for n in range(5):
+        apply_event(room, {"type": "new_round", "story": f"S{n + 1}", "story_link": None})
+    save_room(room)  # 4 finished rounds: 2 archived, 2 in the room
+
+    # Another worker loads its own copy of the room
+    other = get_room(room.id)
+    assert [r.round_number for r in history.page(other, None, 10)] == [1, 2, 3, 4]
+    assert history.count(other) == 4
+    key = f"bdapoker:history:{room.id}"
+    assert 0 < redis_store.client.ttl(key) <= ROOM_EXPIRY_SECONDS
+
+    delete_room(room.id)
+    assert not redis_store.client.exists(key)
+    assert history.store.count(room.id) == 0
+
+
+def test_clear(redis_store):
+    room, _ = create_room("fibonacci", "technical")
+    redis_store.clear()
+    assert get_room(room.id) is None
+
+
+async def test_room_lock_serializes_tasks(redis_store):
+    """Tasks waiting for a room queue up without blocking the event loop."""
+    room, _ = create_room("fibonacci", "technical")
+    order = []
+
+    async def hold(name):
+        async with room_lock(room.id):
+            order.append(f"{name} in")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} out")
+
+    await asyncio.wait_for(asyncio.gather(hold("a"), hold("b"), hold("c")), 1)
+    assert order == ["a in", "a out", "b in", "b out", "c in", "c out"]
+    assert not await redis_store.async_client.exists(f"bdapoker:lock:{room.id}")
+
+
+def test_websocket_round_with_redis_store(redis_store):
+    """Handlers persist their mutations to the shared store."""
+    room, token = create_room("fibonacci", "technical")
+    # One event loop for the whole test, so the disconnect is handled in full
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+            welcome = json.loads(ws.receive_text())
+            pid = welcome["payload"]["participant_id"]
+            ws.send_text(json.dumps({"type": "join", "payload": {"name": "Mod"}}))
+            json.loads(ws.receive_text())  # room_state
+            json.loads(ws.receive_text())  # reconnect_token
+            ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+            json.loads(ws.receive_text())
+            ws.send_text(json.dumps({"type": "vote", "payload": {"value": "8"}}))
+            msg = json.loads(ws.receive_text())
+            assert pid in msg["payload"]["current_round"]["votes"]
+            _sync(ws)  # the vote is saved once the next message is handled
+
+            stored = get_room(room.id)
+            assert stored.current_round.votes[pid].value == "8"
+            assert stored.version == msg["payload"]["version"]
+
+        deadline = time.monotonic() + 1
+        while get_room(room.id).participants[pid].connected:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+
+def test_patches_with_redis_store(redis_store, client):
+    """Patches build on this worker's last published state of the room."""
+    room, token = create_room("fibonacci", "technical")
+    url = f"/api/rooms/{room.id}/ws?token={token}&patches=1"
+    with client.websocket_connect(url) as ws:
+        json.loads(ws.receive_text())  # welcome
+        ws.send_text(json.dumps({"type": "join", "payload": {"name": "Mod"}}))
+        state = json.loads(ws.receive_text())
+        json.loads(ws.receive_text())  # reconnect_token
+        ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+        msg = json.loads(ws.receive_text())
+        assert msg["type"] == "room_patch"
+        assert msg["payload"]["version"] == state["payload"]["version"] + 1
+        _sync(ws)
+        assert get_room(room.id).version == msg["payload"]["version"]
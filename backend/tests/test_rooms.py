@@ -1,19 +1,23 @@
+import threading
 from datetime import datetime, timedelta, timezone
 
+from app.models import Room
 from app.rooms import (
-    _moderator_tokens,
-    _rooms,
+    ROOM_EXPIRY_SECONDS,
+    MemoryRoomStore,
     cleanup_expired_rooms,
     create_room,
     delete_room,
     get_moderator_token,
     get_room,
+    off_loop,
+    save_room,
 )
 
 
 def test_create_room():
     room, token = create_room("fibonacci", "technical")
-    assert room.id in _rooms
+    assert get_room(room.id) is room
     assert room.deck_type == "fibonacci"
     assert room.description_flavor == "technical"
     assert len(token) > 0
@@ -53,7 +57,8 @@ def test_cleanup_expired_rooms():
     room2, _ = create_room("tshirt", "idioms")
 
     # Make room1 expired
-    _rooms[room1.id].last_activity = datetime.now(timezone.utc) - timedelta(hours=5)
+    get_room(room1.id).last_activity = datetime.now(timezone.utc) - timedelta(hours=5)
+    save_room(room1)
 
     removed = cleanup_expired_rooms()
     assert removed == 1
@@ -70,3 +75,58 @@ def test_cleanup_no_expired():
 def test_room_ids_are_short():
     room, _ = create_room("fibonacci", "technical")
     assert len(room.id) == 8
+
+
+def test_expiry_skips_rooms_active_since_scheduled():
+    store = MemoryRoomStore()
+    room = Room(id="r1", last_activity=datetime.now(timezone.utc))
+    store.add_room(room, "tok")
+    later = datetime.now(timezone.utc) + timedelta(seconds=ROOM_EXPIRY_SECONDS + 10)
+
+    room.last_activity = later - timedelta(hours=1)  # touched, no re-index
+    assert store.expired_rooms(later) == []
+    # Rescheduled at the actual deadline
+    assert store.next_expiry() == room.last_activity + timedelta(
+        seconds=ROOM_EXPIRY_SECONDS
+    )
+    assert store.expired_rooms(store.next_expiry()) == ["r1"]
+    assert store.next_expiry() is None
+
+
+def test_expiry_ignores_deleted_rooms():
+    store = MemoryRoomStore()
+    now = datetime.now(timezone.utc)
+    store.add_room(Room(id="r1", last_activity=now), "tok")
+    store.delete_room("r1")
+    assert store.expired_rooms(now + timedelta(seconds=ROOM_EXPIRY_SECONDS + 1)) == []
+
+
+def test_save_after_delete_does_not_reschedule():
+    store = MemoryRoomStore()
+    now = datetime.now(timezone.utc)
+    room = Room(id="r1", last_activity=now)
+    store.add_room(room, "tok")
+    store.delete_room("r1")
+    store.save_room(room)  # a handler still holding the room
+    assert store.get_room("r1") is None
+    assert store.expired_rooms(now + timedelta(seconds=ROOM_EXPIRY_SECONDS + 1)) == []
+
+
+def test_delete_room_removes_its_reconnect_tokens():
+    store = MemoryRoomStore()
+    now = datetime.now(timezone.utc)
+    store.add_room(Room(id="r1", last_activity=now), "tok")
+    store.add_room(Room(id="r2", last_activity=now), "tok")
+    store.set_reconnect_token("r1", "p1", "a")
+    store.set_reconnect_token("r2", "p1", "b")
+    store.delete_room("r1")
+    assert store.get_reconnect_token("r1", "p1") is None
+    assert store.get_reconnect_token("r2", "p1") == "b"
+    store.remove_reconnect_token("r2", "p1")
+    assert store.reconnect_tokens == {}
+
+
+async def test_memory_store_calls_stay_on_the_loop():
+    threads = []
+    await off_loop(lambda: threads.append(threading.get_ident()))
+    assert threads == [threading.get_ident()]
@@ -0,0 +1,119 @@
+from collections import Counter
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app import sharding
+from app.rooms import create_room
+from app.sharding import WRONG_SHARD_CLOSE_CODE, HashRing, Shards
+
+URLS = ["http://127.0.0.1:8000", "http://127.0.0.1:8001", "http://127.0.0.1:8002"]
+KEYS = [f"room{i}" for i in range(3000)]
+
+
+@pytest.fixture
+def shards(monkeypatch):
+    layout = Shards(URLS, index=0)
+    monkeypatch.setattr(sharding, "shards", layout)
+    return layout
+
+
+def test_ring_spreads_keys():
+    ring = HashRing(URLS)
+    counts = Counter(ring.owner(key) for key in KEYS)
+    assert set(counts) == set(URLS)
+    assert min(counts.values()) > len(KEYS) / len(URLS) / 2
+
+
+def test_ring_adding_node_only_moves_its_keys():
+    before = HashRing(URLS)
+    after = HashRing(URLS + ["http://127.0.0.1:8003"])
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+    assert all(after.owner(key) == "http://127.0.0.1:8003" for key in moved)
+    assert len(moved) < len(KEYS) / 2
+
+
+def test_disabled_owns_everything():
+    layout = Shards([])
+    assert not layout.enabled
+    assert layout.owns("anything")
+    assert layout.pick() == ""
+
+
+def test_ws_url():
+    layout = Shards(["https://poker-0.example.com"])
+    assert layout.ws_url("abc") == "wss://poker-0.example.com/api/rooms/abc/ws"
+
+
+def test_pick_stays_local_without_secret():
+    assert Shards(URLS, index=1).pick() == URLS[1]
+
+
+def test_is_forwarded():
+    layout = Shards(URLS, secret="s3cret")
+    assert layout.is_forwarded({"x-shard-secret": "s3cret"})
+    assert not layout.is_forwarded({"x-shard-secret": "wrong"})
+    assert not Shards(URLS).is_forwarded({"x-shard-secret": ""})
+
+
+def test_created_rooms_hash_to_self(shards):
+    for _ in range(20):
+        room, _ = create_room("fibonacci", "technical")
+        assert shards.owner(room.id) == URLS[0]
+
+
+def foreign_room_id(shards):
+    return next(key for key in KEYS if not shards.owns(key))
+
+
+def test_get_room_redirects_to_owner(client, shards):
+    room_id = foreign_room_id(shards)
+    resp = client.get(f"/api/rooms/{room_id}", follow_redirects=False)
+    assert resp.status_code == 307
+    assert resp.headers["location"] == f"{shards.owner(room_id)}/api/rooms/{room_id}"
+
+
+def test_ws_redirects_to_owner(client, shards):
+    room_id = foreign_room_id(shards)
+    with client.websocket_connect(f"/api/rooms/{room_id}/ws") as ws:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == WRONG_SHARD_CLOSE_CODE
+    assert exc.value.reason == shards.ws_url(room_id)
+
+
+def test_create_room_forwards_to_owner(client, monkeypatch):
+    layout = Shards(URLS, index=0, secret="s3cret")
+    monkeypatch.setattr(sharding, "shards", layout)
+    monkeypatch.setattr(layout, "pick", lambda: URLS[2])
+    forwarded = []
+
+    def forward_create(owner, body):
+        forwarded.append((owner, body))
+        return {"room_id": "remote01", "moderator_token": "tok"}
+
+    monkeypatch.setattr(layout, "forward_create", forward_create)
+    resp = client.post("/api/rooms", json={"deck_type": "tshirt"})
+    assert resp.json() == {"room_id": "remote01", "moderator_token": "tok"}
+    assert forwarded[0][0] == URLS[2]
+    assert forwarded[0][1]["deck_type"] == "tshirt"
+
+    # The owner creates forwarded rooms itself
+    resp = client.post(
+        "/api/rooms", json={}, headers={"x-shard-secret": "s3cret"}
+    )
+    assert layout.owns(resp.json()["room_id"])
+    assert len(forwarded) == 1
+
+
+def test_create_room_owner_unreachable(client, monkeypatch):
+    layout = Shards(URLS, index=0, secret="s3cret")
+    monkeypatch.setattr(sharding, "shards", layout)
+    monkeypatch.setattr(layout, "pick", lambda: URLS[1])
+
+    def forward_create(owner, body):
+        raise ConnectionRefusedError
+
+    monkeypatch.setattr(layout, "forward_create", forward_create)
+    resp = client.post("/api/rooms", json={})
+    assert resp.status_code == 503
@@ -0,0 +1,176 @@
+import random
+import statistics
+
+from app import stats
+from app.decks import get_deck
+from app.events import apply_event
+from app.models import Participant, Role, Room, Round
+from app.stats import Scale, VoteStats, compute_stats, metric, numeric
+
+CARDS = ["0", "0.5", "1", "2", "3", "5", "8", "13", "20", "?", "coffee", "infinity"]
+
+
+def _expected(values):
+    numbers = [n for n in map(numeric, values) if n is not None]
+    if not numbers:
+        return {}
+    result = {
+        "average": round(statistics.mean(numbers), 1),
+        "median": round(statistics.median(numbers), 1),
+        "min": min(numbers),
+        "max": max(numbers),
+    }
+    return result
+
+
+def test_numeric():
+    assert numeric("0.5") == 0.5
+    assert numeric("?") is None
+    assert numeric("infinity") is None
+    assert numeric("nan") is None
+
+
+def test_summary_matches_full_recompute_under_churn():
+    rng = random.Random(7)
+    round_ = Round()
+    for _ in range(2000):
+        pid = f"p{rng.randrange(15)}"
+        if rng.random() < 0.2:
+            round_.remove_vote(pid)
+        else:
+            round_.set_vote(pid, rng.choice(CARDS))
+        values = [v.value for v in round_.votes.values()]
+        stats = round_.vote_stats
+        assert stats.summary() == _expected(values)
+        assert stats.votes == len(values)
+        assert sum(stats.histogram.values()) == len(values)
+
+
+def test_histogram_drops_empty_cards():
+    stats = VoteStats(["5", "5", "?"])
+    assert stats.histogram == {"5": 2, "?": 1}
+    stats.remove("?")
+    stats.remove("5")
+    assert stats.histogram == {"5": 1}
+    assert stats.summary() == {"average": 5.0, "median": 5.0, "min": 5.0, "max": 5.0}
+
+
+def test_events_keep_stats_current():
+    room = Room(id="r1")
+    for pid in ("a", "b", "c"):
+        apply_event(room, {"type": "join", "participant_id": pid, "name": pid, "role": "voter"})
+    apply_event(room, {"type": "new_round", "story": "s", "story_link": None})
+    apply_event(room, {"type": "vote", "participant_id": "a", "value": "3"})
+    apply_event(room, {"type": "vote", "participant_id": "b", "value": "8"})
+    apply_event(room, {"type": "vote", "participant_id": "b", "value": "5"})
+    assert room.current_round.vote_stats.summary()["average"] == 4.0
+    apply_event(room, {"type": "kick", "participant_id": "a"})
+    assert room.current_round.vote_stats.summary()["average"] == 5.0
+    apply_event(room, {"type": "reset_round"})
+    assert room.current_round.vote_stats.votes == 0
+
+
+def test_public_state_counts_voters():
+    room = Room(id="r1")
+    room.participants = {
+        "m": Participant("m", "Mod", Role.MODERATOR),
+        "v": Participant("v", "Voter", Role.VOTER),
+        "s": Participant("s", "Spec", Role.SPECTATOR),
+        "gone": Participant("gone", "Gone", Role.VOTER, connected=False),
+        "left": Participant("left", "Left", Role.VOTER, connected=False),
+    }
+    room.current_round = Round()
+    room.current_round.set_vote("v", "5")
+    room.current_round.set_vote("left", "3")
+    current = room.public_state()["current_round"]
+    assert current["vote_count"] == 2
+    assert current["voter_count"] == 3  # m, v and left (voted before leaving)
+
+
+FIBONACCI = get_deck("fibonacci", "technical")
+TSHIRT = get_deck("tshirt", "technical")
+
+
+def test_scale_separates_special_cards():
+    scale = Scale(card["value"] for card in TSHIRT.cards)
+    assert scale.values == ("xs", "s", "m", "l", "xl", "xxl")
+    assert scale.specials == ("?", "coffee", "infinity")
+    assert not scale.is_numeric
+    assert Scale(card["value"] for card in FIBONACCI.cards).is_numeric
+
+
+def test_numeric_deck_stats():
+    stats = compute_stats(VoteStats(["3", "5", "5", "8", "13", "?"]), FIBONACCI)
+    assert stats == {
+        "average": 6.8,
+        "median": 5.0,
+        "min": 3.0,
+        "max": 13.0,
+        "distribution": [
+            {"value": "3", "count": 1},
+            {"value": "5", "count": 2},
+            {"value": "8", "count": 1},
+            {"value": "13", "count": 1},
+            {"value": "?", "count": 1},
+        ],
+        "mode": ["5"],
+        "consensus": False,
+        "near_consensus": False,
+        "spread": 1.0,  # quartiles on 5 and 8, one card apart
+        "suggestion": "8",  # 6.8 is nearer to 8 than to 5
+        "special": 1,
+    }
+
+
+def test_tshirt_stats_use_card_positions():
+    stats = compute_stats(VoteStats(["s", "m", "m", "xl", "coffee"]), TSHIRT)
+    assert "average" not in stats
+    assert stats["mode"] == ["m"]
+    assert stats["suggestion"] == "m"  # mean position 2.0
+    assert stats["spread"] == 0.75  # quartiles at positions 1.75 and 2.5
+    assert stats["special"] == 1
+    assert stats["consensus"] is False
+
+
+def test_consensus_is_deck_aware():
+    assert compute_stats(VoteStats(["l", "l", "?"]), TSHIRT)["consensus"] is True
+    near = compute_stats(VoteStats(["5", "8", "8"]), FIBONACCI)
+    assert near["consensus"] is False
+    assert near["near_consensus"] is True
+    assert "consensus" not in compute_stats(VoteStats(["5"]), FIBONACCI)
+
+
+def test_consensus_off_the_deck():
+    # Same number spelled differently counts as the same card
+    stats = compute_stats(VoteStats(["5.0", "5"]), FIBONACCI)
+    assert stats["consensus"] is True
+    assert stats["distribution"] == [{"value": "5", "count": 2}]
+    # Votes not on the deck are compared by number
+    assert compute_stats(VoteStats(["7", "7"]), FIBONACCI)["consensus"] is True
+    assert compute_stats(VoteStats(["7", "8"]), FIBONACCI)["consensus"] is False
+    assert compute_stats(VoteStats(["7", "5", "?"]), FIBONACCI)["consensus"] is False
+    assert compute_stats(VoteStats(["huge", "huge"]), FIBONACCI)["consensus"] is True
+    assert compute_stats(VoteStats(["huge", "5"]), FIBONACCI)["consensus"] is False
+
+
+def test_only_special_votes():
+    assert compute_stats(VoteStats(["?", "coffee"]), FIBONACCI) == {
+        "distribution": [{"value": "?", "count": 1}, {"value": "coffee", "count": 1}],
+        "special": 2,
+    }
+    assert compute_stats(VoteStats(), FIBONACCI) == {}
+
+
+def test_suggestion_tie_prefers_higher_card():
+    assert compute_stats(VoteStats(["2", "3"]), FIBONACCI)["suggestion"] == "3"
+    assert compute_stats(VoteStats(["s", "m"]), TSHIRT)["suggestion"] == "m"
+
+
+def test_registered_metric(monkeypatch):
+    monkeypatch.setattr(stats, "METRICS", dict(stats.METRICS))
+
+    @metric("estimates")
+    def _estimates(sample):
+        return sample.n
+
+    assert compute_stats(VoteStats(["1", "2", "?"]), FIBONACCI)["estimates"] == 2
@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+import pytest
+
+from app import stories
+from app.events import apply_event
+from app.rooms import create_room, get_room
+from app.stories import QueueFull, StoryImportError
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+def _parse(format, data, size=3, limit=100):
+    if isinstance(data, str):
+        data = data.encode()
+    stories_ = asyncio.run(stories.parse(format, _chunks(data, size), limit))
+    return [(s.story, s.story_link) for s in stories_]
+
+
+def test_parse_csv():
+    data = (
+        '\ufeffStory,Story_Link\r\n'
+        'Login,https://example.com/1\r\n'
+        '\r\n'
+        '"Export, all ""formats""\nand more",\r\n'
+        'Search'
+    )
+    assert _parse("csv", data) == [
+        ("Login", "https://example.com/1"),
+        ('Export, all "formats"\nand more', None),
+        ("Search", None),
+    ]
+
+
+def test_parse_json_array_in_small_chunks():
+    data = json.dumps(
+        [{"story": "Login", "story_link": "https://example.com/1"}, "Search", {"story": "Ü"}]
+    )
+    for size in (1, 7, len(data)):
+        assert _parse("json", data, size) == [
+            ("Login", "https://example.com/1"),
+            ("Search", None),
+            ("Ü", None),
+        ]
+    assert _parse("json", " [ ] ") == []
+
+
+def test_parse_ndjson():
+    data = '{"story": "Login"}\n\n"Search"\n{"story": "Export", "story_link": null}'
+    assert _parse("ndjson", data) == [("Login", None), ("Search", None), ("Export", None)]
+
+
+@pytest.mark.parametrize(
+    "format, data, message",
+    [
+        ("csv", "title\nLogin\n", "header"),
+        ("csv", 'story\n"Login\n', "unterminated"),
+        ("csv", "story,story_link\n,https://example.com\n", "Story 1"),
+        ("json", '{"story": "Login"}', "array"),
+        ("json", '[{"story": "Login"}', "end"),
+        ("json", '[{"story": "Login"} {"story": "Search"}]', "after story 1"),
+        ("json", "[1]", "Story 1: expected an object"),
+        ("ndjson", '{"story": "Login"}\n{"story": \n', "Story 2: invalid JSON"),
+        ("ndjson", '{"story": "Login", "story_link": 5}', "story_link"),
+        ("ndjson", b'"\xff"', "UTF-8"),
+    ],
+)
+def test_parse_errors(format, data, message):
+    with pytest.raises(StoryImportError, match=message):
+        _parse(format, data)
+
+
+def test_parse_bounds_records(monkeypatch):
+    monkeypatch.setattr(stories, "MAX_RECORD_BYTES", 100)
+    with pytest.raises(StoryImportError, match="too long"):
+        _parse("ndjson", '"' + "x" * 200 + '"')
+    with pytest.raises(StoryImportError, match="invalid JSON"):
+        _parse("json", '["' + "x" * 200)
+    with pytest.raises(QueueFull):
+        _parse("ndjson", '"a"\n"b"\n"c"\n', limit=2)
+
+
+def test_new_round_takes_queued_story():
+    room, _ = create_room("fibonacci", "technical")
+    stories_ = [{"story": f"S{i}", "story_link": None} for i in range(5)]
+    apply_event(room, {"type": "queue_stories", "stories": stories_})
+    apply_event(room, {"type": "new_round", "story": "S0", "story_link": None, "queued": True})
+    apply_event(room, {"type": "new_round", "story": "Ad hoc", "story_link": None})
+    assert room.current_round.story == "Ad hoc"
+    assert room.public_state()["story_queue"] == {
+        "count": 4,
+        "next": {"position": 1, "story": "S1", "story_link": None},
+    }
+    assert [s["position"] for s in stories.page(room, limit=2)] == [1, 2]
+    assert [s["story"] for s in stories.page(room, after=2)] == ["S3", "S4"]
+    assert [s["position"] for s in stories.page(room, after=0, limit=1)] == [1]
+
+    apply_event(room, {"type": "clear_queue"})
+    apply_event(room, {"type": "queue_stories", "stories": stories_[:1]})
+    assert stories.page(room) == [{"position": 5, "story": "S0", "story_link": None}]
+
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_queue_api(client):
+    room, token = create_room("fibonacci", "technical")
+    url = f"/api/rooms/{room.id}/stories"
+    body = "story,story_link\n" + "".join(f"S{i},https://example.com/{i}\n" for i in range(120))
+    resp = client.post(url, content=body, headers={**_auth(token), "Content-Type": "text/csv"})
+    assert resp.status_code == 200
+    assert resp.json() == {"queued": 120, "count": 120}
+
+    resp = client.post(
+        f"{url}?format=ndjson", content='"Extra"\n', headers=_auth(token)
+    )
+    assert resp.json() == {"queued": 1, "count": 121}
+
+    page = client.get(url).json()
+    assert page["count"] == 121
+    assert len(page["stories"]) == 50
+    assert page["stories"][0] == {
+        "position": 0, "story": "S0", "story_link": "https://example.com/0"
+    }
+    page = client.get(f"{url}?cursor={page['next_cursor']}&limit=200").json()
+    assert page["stories"][0]["position"] == 50
+    assert page["stories"][-1]["story"] == "Extra"
+    assert page["next_cursor"] is None
+
+    assert client.delete(url, headers=_auth(token)).status_code == 204
+    assert client.get(url).json()["count"] == 0
+
+
+def test_queue_api_errors(client, monkeypatch):
+    room, token = create_room("fibonacci", "technical")
+    url = f"/api/rooms/{room.id}/stories"
+    csv = {**_auth(token), "Content-Type": "text/csv"}
+    assert client.post("/api/rooms/nope/stories", content="", headers=csv).status_code == 404
+    assert client.post(url, content="story\nA\n").status_code == 401
+    assert client.post(url, content="story\nA\n", headers=_auth("wrong")).status_code == 401
+    assert client.delete(url).status_code == 401
+    resp = client.post(url, content="A", headers={**_auth(token), "Content-Type": "text/plain"})
+    assert resp.status_code == 415
+    resp = client.post(url, content="title\nA\n", headers=csv)
+    assert resp.status_code == 400
+    assert "story column" in resp.json()["detail"]
+
+    monkeypatch.setattr(stories, "STORY_QUEUE_MAX", 3)
+    assert client.post(url, content="story\nA\nB\n", headers=csv).status_code == 200
+    assert client.post(url, content="story\nC\nD\n", headers=csv).status_code == 413
+    assert len(get_room(room.id).queue) == 2
+
+
+def _recv(ws):
+    return json.loads(ws.receive_text())
+
+
+def test_queue_broadcast_and_new_round(client):
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        _recv(ws)  # welcome
+        ws.send_text(json.dumps({"type": "join", "payload": {"name": "Mod"}}))
+        _recv(ws)  # room_state
+        _recv(ws)  # reconnect_token
+
+        body = json.dumps([{"story": "Login", "story_link": "https://example.com/1"}, "Search"])
+        headers = {**_auth(token), "Content-Type": "application/json"}
+        client.post(f"/api/rooms/{room.id}/stories", content=body, headers=headers)
+        state = _recv(ws)["payload"]
+        assert state["story_queue"]["count"] == 2
+        assert state["story_queue"]["next"]["story"] == "Login"
+
+        ws.send_text(json.dumps({"type": "new_round", "payload": {}}))
+        state = _recv(ws)["payload"]
+        assert state["current_round"]["story"] == "Login"
+        assert state["current_round"]["story_link"] == "https://example.com/1"
+        assert state["story_queue"] == {
+            "count": 1, "next": {"position": 1, "story": "Search", "story_link": None}
+        }
+
+        ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Ad hoc"}}))
+        state = _recv(ws)["payload"]
+        assert state["current_round"]["story"] == "Ad hoc"
+        assert state["story_queue"]["count"] == 1
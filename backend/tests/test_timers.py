@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from app.timers import TimerScheduler
+
+
+async def _noop(room_id, deadline):
+    pass
+
+
+def test_pop_due_in_deadline_order():
+    timers = TimerScheduler(_noop)
+    timers.schedule("b", 20.0)
+    timers.schedule("a", 10.0)
+    timers.schedule("c", 30.0)
+    assert timers.pop_due(25.0) == [("a", 10.0), ("b", 20.0)]
+    assert len(timers) == 1
+    assert timers.next_deadline() == 30.0
+
+
+def test_replaced_and_cancelled_timers_are_skipped():
+    timers = TimerScheduler(_noop)
+    timers.schedule("a", 10.0)
+    timers.schedule("a", 40.0)
+    timers.schedule("b", 20.0)
+    timers.cancel("b")
+    assert timers.next_deadline() == 40.0
+    assert timers.pop_due(30.0) == []
+    assert timers.pop_due(40.0) == [("a", 40.0)]
+    assert timers.next_deadline() is None
+
+
+@pytest.mark.asyncio
+async def test_many_timers_on_one_task():
+    fired = []
+
+    async def expire(room_id, deadline):
+        fired.append(room_id)
+
+    timers = TimerScheduler(expire)
+    timers.start()
+    try:
+        now = time.time()
+        for n in range(20000):
+            timers.schedule(f"room{n}", now + 0.05 + (n % 10) / 100)
+        # An earlier timer added later wakes the sleeping task up
+        timers.schedule("first", now + 0.01)
+        timers.cancel("room0")
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if len(fired) == 20000:
+                break
+        assert fired[0] == "first"
+        assert len(fired) == 20000
+        assert "room0" not in fired
+        assert len(timers) == 0
+    finally:
+        await timers.stop()
@@ -1,9 +1,13 @@
 import json
 
 import pytest
+from fastapi.testclient import TestClient
 from starlette.websockets import WebSocketDisconnect
 
+from app.main import app
 from app.rooms import create_room
+from app.ws import _published as ws_published
+from app.ws import timers
 
 
 def _recv(ws):
@@ -170,6 +174,79 @@ def test_spectator_cannot_vote(client):
             assert "Spectators cannot vote" in msg["payload"]["message"]
 
 
+def test_vote_value_must_be_string(client):
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        _recv(ws)
+        _join(ws, "Mod")
+        ws.send_text(json.dumps({"type": "new_round", "payload": {}}))
+        _recv(ws)
+        ws.send_text(json.dumps({"type": "vote", "payload": {"value": {"x": 1}}}))
+        msg = _recv(ws)
+        assert msg["type"] == "error"
+        assert msg["payload"]["message"] == "Invalid payload"
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        {"type": "join", "payload": None},
+        {"type": "start_timer", "payload": {"seconds": -5}},
+        {"type": "new_round", "payload": {"story": ["a"]}},
+        {"type": "kick", "payload": "p1"},
+    ],
+)
+def test_invalid_payload_rejected(client, message):
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        _recv(ws)
+        ws.send_text(json.dumps(message))
+        assert _recv(ws)["payload"]["message"] == "Invalid payload"
+
+
+def test_non_object_message_rejected(client):
+    room, _ = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws") as ws:
+        _recv(ws)
+        ws.send_text("[1, 2]")
+        assert _recv(ws)["payload"]["message"] == "Invalid message"
+
+
+async def test_unknown_type_rejected_before_room_lookup(monkeypatch):
+    from app import ws as ws_module
+
+    lookups = []
+    monkeypatch.setattr(ws_module, "get_room", lookups.append)
+    errors = []
+
+    async def send_error(room_id, participant_id, message):
+        errors.append(message)
+
+    monkeypatch.setattr(ws_module, "_send_error", send_error)
+    await ws_module.handle_message("r1", "p1", json.dumps({"type": "bogus"}))
+    assert errors == ["Unknown message type: bogus"]
+    assert lookups == []
+
+
+def test_registered_handler_is_dispatched(client, monkeypatch):
+    from app import ws as ws_module
+
+    monkeypatch.setattr(ws_module, "ROUTES", dict(ws_module.ROUTES))
+    calls = []
+
+    @ws_module.message_handler("ping", ws_module.KickPayload)
+    async def handle_ping(room, participant_id, payload, *, is_moderator):
+        calls.append((room.id, payload.participant_id))
+        await ws_module._send_error(room.id, participant_id, "pong")
+
+    room, _ = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws") as ws:
+        _recv(ws)
+        ws.send_text(json.dumps({"type": "ping", "payload": {"participant_id": "x"}}))
+        assert _recv(ws)["payload"]["message"] == "pong"
+    assert calls == [(room.id, "x")]
+
+
 def test_non_moderator_cannot_reveal(client):
     room, token = create_room("fibonacci", "technical")
 
@@ -200,9 +277,17 @@ def test_change_deck(client):
             "type": "change_deck",
             "payload": {"deck_type": "tshirt", "description_flavor": "animals"}
         }))
+        deck = _recv(ws)
+        assert deck["type"] == "deck"
+        assert deck["payload"]["deck_type"] == "tshirt"
+        assert deck["payload"]["cards"][0]["value"] == "xs"
         msg = _recv(ws)
+        assert msg["type"] == "room_state"
         assert msg["payload"]["deck_type"] == "tshirt"
         assert msg["payload"]["description_flavor"] == "animals"
+        assert msg["payload"]["deck_etag"] == deck["payload"]["deck_etag"]
+        assert msg["payload"]["deck_url"] == deck["payload"]["deck_url"]
+        assert "deck_cards" not in msg["payload"]
 
 
 def test_change_deck_invalid(client):
@@ -249,10 +334,75 @@ def test_timer_start_stop(client):
         msg = _recv(ws)
         assert msg["type"] == "timer_start"
         assert msg["payload"]["seconds"] == 60
+        deadline = msg["payload"]["deadline"]
+        state = _recv(ws)
+        assert state["payload"]["current_round"]["timer_deadline"] == deadline
+        assert timers.deadline(room.id) == deadline
 
         ws.send_text(json.dumps({"type": "stop_timer"}))
         msg = _recv(ws)
         assert msg["type"] == "timer_stop"
+        state = _recv(ws)
+        assert state["payload"]["current_round"]["timer_deadline"] is None
+        assert timers.deadline(room.id) is None
+
+
+def test_timer_visible_to_late_joiner(client):
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        _recv(ws)
+        _join(ws, "Mod")
+        ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+        _recv(ws)
+        ws.send_text(json.dumps({"type": "start_timer", "payload": {"seconds": 90}}))
+        deadline = _recv(ws)["payload"]["deadline"]
+
+        with client.websocket_connect(f"/api/rooms/{room.id}/ws") as late_ws:
+            welcome = _recv(late_ws)
+            assert welcome["payload"]["server_time"] < deadline
+            state, _ = _join(late_ws, "Late")
+            assert state["payload"]["current_round"]["timer_deadline"] == deadline
+
+        # A new round ends the timer
+        ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Next"}}))
+        msg = _recv(ws)
+        while msg["payload"]["current_round"]["story"] != "Next":  # join, leave
+            msg = _recv(ws)
+        assert msg["payload"]["current_round"]["timer_deadline"] is None
+        assert timers.deadline(room.id) is None
+
+
+def test_timer_needs_round(client):
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        _recv(ws)
+        _join(ws, "Mod")
+        ws.send_text(json.dumps({"type": "start_timer", "payload": {"seconds": 60}}))
+        msg = _recv(ws)
+        assert msg["type"] == "error"
+        assert msg["payload"]["message"] == "No active round"
+
+
+def test_timer_auto_reveal():
+    room, token = create_room("fibonacci", "technical")
+    with TestClient(app) as client:  # runs the lifespan, which starts the scheduler
+        with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+            _recv(ws)
+            _join(ws, "Mod")
+            ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+            _recv(ws)
+            ws.send_text(json.dumps({"type": "vote", "payload": {"value": "5"}}))
+            _recv(ws)
+            ws.send_text(json.dumps({
+                "type": "start_timer", "payload": {"seconds": 1, "auto_reveal": True},
+            }))
+            assert _recv(ws)["type"] == "timer_start"
+            assert _recv(ws)["payload"]["current_round"]["auto_reveal"] is True
+
+            msg = _recv(ws)  # at the deadline
+            assert msg["payload"]["current_round"]["revealed"] is True
+            assert msg["payload"]["current_round"]["timer_deadline"] is None
+            assert msg["payload"]["stats"]["average"] == 5.0
 
 
 def test_unknown_message_type(client):
@@ -397,7 +547,7 @@ def test_reveal_with_coffee_vote(client):
 
 
 def test_reveal_all_special_votes(client):
-    """When all votes are non-numeric, stats should be empty."""
+    """When all votes are special, only their distribution and count are given."""
     room, token = create_room("fibonacci", "technical")
 
     with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as mod_ws:
@@ -425,11 +575,17 @@ def test_reveal_all_special_votes(client):
             mod_ws.send_text(json.dumps({"type": "reveal"}))
             msg = _recv(mod_ws)
             assert msg["payload"]["current_round"]["revealed"] is True
-            assert msg["payload"]["stats"] == {}
+            assert msg["payload"]["stats"] == {
+                "distribution": [
+                    {"value": "?", "count": 1},
+                    {"value": "infinity", "count": 1},
+                ],
+                "special": 2,
+            }
 
 
 def test_reveal_with_tshirt_votes(client):
-    """T-shirt size votes (non-numeric) should be excluded from stats."""
+    """T-shirt sizes get statistics on card positions, without numeric ones."""
     room, token = create_room("tshirt", "technical")
 
     with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as mod_ws:
@@ -445,7 +601,13 @@ def test_reveal_with_tshirt_votes(client):
         mod_ws.send_text(json.dumps({"type": "reveal"}))
         msg = _recv(mod_ws)
         assert msg["payload"]["current_round"]["revealed"] is True
-        assert msg["payload"]["stats"] == {}
+        assert msg["payload"]["stats"] == {
+            "distribution": [{"value": "xl", "count": 1}],
+            "mode": ["xl"],
+            "spread": 0.0,
+            "suggestion": "xl",
+            "special": 0,
+        }
 
 
 # --- Reconnect tests ---
@@ -577,3 +739,162 @@ def test_kicked_participant_cannot_reconnect(client):
             # Should get a new ID, not the kicked one
             assert welcome["payload"]["participant_id"] != voter_pid
             assert welcome["payload"]["reconnected"] is False
+
+
+# --- Patch protocol tests ---
+
+
+def test_patch_protocol_vote_sends_delta(client):
+    """Patch clients get a full snapshot on join and only changes afterwards."""
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}&patches=1") as ws:
+        welcome = _recv(ws)
+        pid = welcome["payload"]["participant_id"]
+        assert welcome["payload"]["patches"] is True
+
+        state, _ = _join(ws, "Mod")
+        assert "deck_url" in state["payload"]
+        version = state["payload"]["version"]
+
+        ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+        msg = _recv(ws)
+        assert msg["type"] == "room_patch"
+        assert msg["payload"]["version"] == version + 1
+        assert msg["payload"]["current_round"]["story"] == "Test"
+        assert "deck_url" not in msg["payload"]
+        assert "participants" not in msg["payload"]
+
+        ws.send_text(json.dumps({"type": "vote", "payload": {"value": "5"}}))
+        msg = _recv(ws)
+        assert msg["type"] == "room_patch"
+        assert msg["payload"] == {
+            "current_round": {
+                "votes": {pid: {"participant_id": pid, "has_voted": True}},
+                "vote_count": 1,
+            },
+            "version": version + 2,
+        }
+
+
+def test_patch_protocol_sync_resends_snapshot(client):
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}&patches=1") as ws:
+        _recv(ws)
+        state, _ = _join(ws, "Mod")
+
+        ws.send_text(json.dumps({"type": "sync", "payload": {"version": 0}}))
+        msg = _recv(ws)
+        assert msg["type"] == "room_state"
+        assert msg["payload"] == state["payload"]
+
+
+def test_patch_protocol_mixed_clients(client):
+    """Legacy clients keep receiving the full room_state."""
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}&patches=1") as mod_ws:
+        _recv(mod_ws)
+        _join(mod_ws, "Mod")
+
+        with client.websocket_connect(f"/api/rooms/{room.id}/ws") as voter_ws:
+            welcome = _recv(voter_ws)
+            assert welcome["payload"]["patches"] is False
+            voter_pid = welcome["payload"]["participant_id"]
+            _join(voter_ws, "Voter")
+            msg = _recv(mod_ws)
+            assert msg["type"] == "room_patch"
+            assert msg["payload"]["participants"][voter_pid]["name"] == "Voter"
+
+            mod_ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+            assert _recv(mod_ws)["type"] == "room_patch"
+            msg = _recv(voter_ws)
+            assert msg["type"] == "room_state"
+            assert msg["payload"]["deck_url"]
+
+
+def test_msgpack_subprotocol(client):
+    msgpack = pytest.importorskip("msgpack")
+    room, token = create_room("fibonacci", "technical")
+    url = f"/api/rooms/{room.id}/ws?token={token}"
+    with client.websocket_connect(url, subprotocols=["bdapoker.msgpack"]) as ws:
+        assert ws.accepted_subprotocol == "bdapoker.msgpack"
+        assert msgpack.unpackb(ws.receive_bytes())["type"] == "welcome"
+        ws.send_bytes(msgpack.packb({"type": "join", "payload": {"name": "Mod"}}))
+        state = msgpack.unpackb(ws.receive_bytes())
+        assert state["type"] == "room_state"
+        assert state["payload"]["participants"]
+
+        with client.websocket_connect(f"/api/rooms/{room.id}/ws") as json_ws:
+            assert json_ws.accepted_subprotocol is None
+            assert _recv(json_ws)["type"] == "welcome"
+
+        ws.send_bytes(b"\xc1")
+        msg = msgpack.unpackb(ws.receive_bytes())
+        while msg["type"] != "error":
+            msg = msgpack.unpackb(ws.receive_bytes())
+        assert msg["payload"]["message"] == "Invalid MessagePack"
+
+
+def test_unchanged_state_reuses_version(client):
+    """A no-op change republishes the same version without a patch."""
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        _recv(ws)
+        state, _ = _join(ws, "Mod")
+        frames = ws_published[room.id]
+
+        ws.send_text(json.dumps({
+            "type": "change_deck",
+            "payload": {"deck_type": "fibonacci", "description_flavor": "technical"},
+        }))
+        msg = _recv(ws)
+        assert msg["payload"]["version"] == state["payload"]["version"]
+        assert ws_published[room.id] is frames
+
+
+# --- Coalescing tests ---
+
+
+@pytest.fixture
+def coalesce(monkeypatch):
+    from app import ws as ws_module
+
+    monkeypatch.setattr(ws_module, "COALESCE_SECONDS", 0.2)
+
+
+def test_coalesced_broadcasts(client, coalesce):
+    """Mutations within the window are flushed as one room_state."""
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        welcome = _recv(ws)
+        pid = welcome["payload"]["participant_id"]
+        state, _ = _join(ws, "Mod")  # snapshot goes out immediately
+
+        ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+        ws.send_text(json.dumps({"type": "vote", "payload": {"value": "5"}}))
+        msg = _recv(ws)
+        assert msg["type"] == "room_state"
+        assert msg["payload"]["version"] == state["payload"]["version"] + 1
+        assert msg["payload"]["current_round"]["story"] == "Test"
+        assert pid in msg["payload"]["current_round"]["votes"]
+
+        # Reveal bypasses the window
+        ws.send_text(json.dumps({"type": "reveal"}))
+        msg = _recv(ws)
+        assert msg["payload"]["current_round"]["revealed"] is True
+        assert msg["payload"]["stats"]["average"] == 5.0
+
+
+def test_reveal_absorbs_pending_flush(client, coalesce):
+    room, token = create_room("fibonacci", "technical")
+    with client.websocket_connect(f"/api/rooms/{room.id}/ws?token={token}") as ws:
+        _recv(ws)
+        _join(ws, "Mod")
+        ws.send_text(json.dumps({"type": "new_round", "payload": {"story": "Test"}}))
+        ws.send_text(json.dumps({"type": "vote", "payload": {"value": "3"}}))
+        ws.send_text(json.dumps({"type": "reveal"}))
+        msg = _recv(ws)
+        assert msg["payload"]["current_round"]["revealed"] is True
+        assert msg["payload"]["stats"]["average"] == 3.0
+        # No stale coalesced state follows the reveal
+        ws.send_text(json.dumps({"type": "stop_timer"}))
+        assert _recv(ws)["type"] == "timer_stop"
@@ -24,6 +24,7 @@ const de: Record<TranslationKey, string> = {
 	// Room page
 	'room.loading': 'Lade...',
 	'room.notFound': 'Raum nicht gefunden',
+	'room.closed': 'Dieser Raum wurde wegen Inaktivität aufgelöst',
 	'room.networkError': 'Netzwerkfehler',
 	'room.label': 'Raum:',
 	'room.copyLink': 'Link kopieren',
@@ -49,6 +50,7 @@ const de: Record<TranslationKey, string> = {
 	'participants.name': 'Name',
 	'participants.role': 'Rolle',
 	'participants.vote': 'Stimme',
+	'participants.voted': 'abgestimmt',
 
 	// Vote results
 	'results.title': 'Ergebnisse',
@@ -58,6 +60,17 @@ const de: Record<TranslationKey, string> = {
 	'results.consensus': 'Konsens',
 	'results.yes': 'Ja',
 	'results.no': 'Nein',
+	'results.suggestion': 'Vorschlag',
+	'results.mode': 'Meiste Stimmen',
+	'results.spread': 'Streuung (Karten)',
+	'results.near': 'Fast',
+	'results.special': 'Sonderkarten',
+
+	// Story queue
+	'queue.next': 'Als Nächstes:',
+	'queue.show': 'Warteschlange zeigen',
+	'queue.hide': 'Warteschlange ausblenden',
+	'queue.more': 'Mehr',
 
 	// Moderator controls
 	'mod.reveal': 'Aufdecken',
@@ -67,9 +80,12 @@ const de: Record<TranslationKey, string> = {
 	'mod.timer60': 'Timer 60s',
 	'mod.timer120': 'Timer 120s',
 	'mod.stopTimer': 'Timer stoppen',
+	'mod.autoReveal': 'Nach Ablauf aufdecken',
 	'mod.storyPlaceholder': 'Story-Beschreibung',
 	'mod.linkPlaceholder': 'Link (optional)',
 	'mod.startRound': 'Runde starten',
+	'mod.nextStory': 'Nächste Story',
+	'mod.importStories': 'Stories importieren',
 
 	// Roles
 	'role.moderator': 'Moderator',
@@ -82,6 +98,8 @@ const de: Record<TranslationKey, string> = {
 	'error.Round already revealed': 'Runde bereits aufgedeckt',
 	'error.Not in room': 'Nicht im Raum',
 	'error.Spectators cannot vote': 'Zuschauer können nicht abstimmen',
+	'error.Invalid payload': 'Ungültiger Nachrichteninhalt',
+	'error.Invalid message': 'Ungültige Nachricht',
 	'error.Only moderator can reveal': 'Nur der Moderator kann aufdecken',
 	'error.Only moderator can start new round': 'Nur der Moderator kann eine neue Runde starten',
 	'error.Only moderator can reset round': 'Nur der Moderator kann die Runde zurücksetzen',
@@ -90,6 +108,9 @@ const de: Record<TranslationKey, string> = {
 	'error.Only moderator can change deck': 'Nur der Moderator kann das Deck ändern',
 	'error.Only moderator can start timer': 'Nur der Moderator kann den Timer starten',
 	'error.Only moderator can stop timer': 'Nur der Moderator kann den Timer stoppen',
+	'error.Room is busy, try again': 'Raum ist beschäftigt, bitte erneut versuchen',
+	'error.Invalid moderator token': 'Nur der Moderator kann Stories importieren',
+	'error.CSV needs a header with a story column': 'Die CSV-Datei braucht eine Kopfzeile mit einer Spalte "story"',
 };
 
 export default de;
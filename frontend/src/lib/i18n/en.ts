@@ -22,6 +22,7 @@ const en = {
 	// Room page
 	'room.loading': 'Loading...',
 	'room.notFound': 'Room not found',
+	'room.closed': 'This room was closed after a period of inactivity',
 	'room.networkError': 'Network error',
 	'room.label': 'Room:',
 	'room.copyLink': 'Copy link',
@@ -47,6 +48,7 @@ const en = {
 	'participants.name': 'Name',
 	'participants.role': 'Role',
 	'participants.vote': 'Vote',
+	'participants.voted': 'voted',
 
 	// Vote results
 	'results.title': 'Results',
@@ -56,6 +58,17 @@ const en = {
 	'results.consensus': 'Consensus',
 	'results.yes': 'Yes',
 	'results.no': 'No',
+	'results.suggestion': 'Suggestion',
+	'results.mode': 'Most votes',
+	'results.spread': 'Spread (cards)',
+	'results.near': 'Almost',
+	'results.special': 'Special cards',
+
+	// Story queue
+	'queue.next': 'Up next:',
+	'queue.show': 'Show queue',
+	'queue.hide': 'Hide queue',
+	'queue.more': 'More',
 
 	// Moderator controls
 	'mod.reveal': 'Reveal',
@@ -65,9 +78,12 @@ const en = {
 	'mod.timer60': 'Timer 60s',
 	'mod.timer120': 'Timer 120s',
 	'mod.stopTimer': 'Stop Timer',
+	'mod.autoReveal': 'Reveal when time is up',
 	'mod.storyPlaceholder': 'Story description',
 	'mod.linkPlaceholder': 'Link (optional)',
 	'mod.startRound': 'Start Round',
+	'mod.nextStory': 'Next Story',
+	'mod.importStories': 'Import Stories',
 
 	// Roles (displayed in participant list)
 	'role.moderator': 'moderator',
@@ -80,6 +96,8 @@ const en = {
 	'error.Round already revealed': 'Round already revealed',
 	'error.Not in room': 'Not in room',
 	'error.Spectators cannot vote': 'Spectators cannot vote',
+	'error.Invalid payload': 'Invalid message content',
+	'error.Invalid message': 'Invalid message',
 	'error.Only moderator can reveal': 'Only moderator can reveal',
 	'error.Only moderator can start new round': 'Only moderator can start new round',
 	'error.Only moderator can reset round': 'Only moderator can reset round',
@@ -88,6 +106,9 @@ const en = {
 	'error.Only moderator can change deck': 'Only moderator can change deck',
 	'error.Only moderator can start timer': 'Only moderator can start timer',
 	'error.Only moderator can stop timer': 'Only moderator can stop timer',
+	'error.Room is busy, try again': 'Room is busy, please try again',
+	'error.Invalid moderator token': 'Only the moderator can import stories',
+	'error.CSV needs a header with a story column': 'The CSV needs a header row with a "story" column',
 } as const;
 
 export type TranslationKey = keyof typeof en;
@@ -1,5 +1,5 @@
-import { writable, derived } from 'svelte/store';
-import type { RoomState, Stats } from '$lib/types';
+import { writable, derived, get } from 'svelte/store';
+import type { CardDef, RoomState, Stats } from '$lib/types';
 
 export const roomState = writable<RoomState | null>(null);
 export const stats = writable<Stats | null>(null);
@@ -14,4 +14,79 @@ export const participants = derived(roomState, ($room) =>
 
 export const currentRound = derived(roomState, ($room) => $room?.current_round ?? null);
 
-export const deckCards = derived(roomState, ($room) => $room?.deck_cards ?? []);
+// Length and next story of the queue; the rest is paged from the REST API
+export const storyQueue = derived(roomState, ($room) => $room?.story_queue ?? null);
+
+// Room states only reference their deck; the cards are loaded separately
+export const deckCards = writable<CardDef[]>([]);
+let deckEtag: string | null = null;
+
+/** Load the cards of the deck a room state references, unless already loaded. */
+export async function syncDeck(etag: string, url: string): Promise<void> {
+	if (etag === deckEtag) return;
+	deckEtag = etag;
+	try {
+		const res = await fetch(url);
+		if (!res.ok) throw new Error(res.statusText);
+		const cards: CardDef[] = await res.json();
+		if (deckEtag === etag) deckCards.set(cards);
+	} catch {
+		if (deckEtag === etag) deckEtag = null; // retry with the next state
+	}
+}
+
+/** Cards pushed by the server after a deck change. */
+export function setDeck(etag: string, cards: CardDef[]): void {
+	deckEtag = etag;
+	deckCards.set(cards);
+}
+
+// Server clock minus client clock, in seconds
+let clockOffset = 0;
+
+export function setServerTime(serverTime: number): void {
+	clockOffset = serverTime - Date.now() / 1000;
+}
+
+/** Follow the server-owned round timer (Unix timestamp deadline). */
+export function syncTimer(deadline: number | null): void {
+	if (deadline === null) return; // stops arrive as timer_stop, expiry counts down
+	const remaining = Math.max(0, Math.round(deadline - Date.now() / 1000 - clockOffset));
+	timerSeconds.set(remaining);
+	timerRunning.set(remaining > 0);
+}
+
+type Json = Record<string, unknown>;
+
+function isObject(value: unknown): value is Json {
+	return typeof value === 'object' && value !== null && !Array.isArray(value);
+}
+
+/** Apply a JSON merge patch (RFC 7386): null deletes, objects merge, the rest replaces. */
+export function applyMergePatch(target: Json, patch: Json): Json {
+	const result: Json = { ...target };
+	for (const [key, value] of Object.entries(patch)) {
+		if (value === null) {
+			delete result[key];
+		} else if (isObject(value)) {
+			const current = result[key];
+			result[key] = applyMergePatch(isObject(current) ? current : {}, value);
+		} else {
+			result[key] = value;
+		}
+	}
+	return result;
+}
+
+/**
+ * The room state after a room_patch, or null on a version gap (the caller
+ * then asks for the full state). Patches of versions already seen are stale
+ * and leave the state as it is.
+ */
+export function patchRoomState(patch: Json): RoomState | null {
+	const current = get(roomState);
+	const version = patch.version as number;
+	if (current && version <= current.version) return current;
+	if (!current || version !== current.version + 1) return null;
+	return applyMergePatch(current as unknown as Json, patch) as unknown as RoomState;
+}
@@ -30,20 +30,31 @@ export function connectWs(
 	if (token) params.set('token', token);
 	if (reconnectId) params.set('reconnect_id', reconnectId);
 	if (reconnectToken) params.set('reconnect_token', reconnectToken);
+	// Full room_state on join and reconnect, room_patch deltas afterwards
+	params.set('patches', '1');
 	const qs = params.toString();
-	const url = `${protocol}//${window.location.host}/api/rooms/${roomId}/ws${qs ? '?' + qs : ''}`;
+	openSocket(`${protocol}//${window.location.host}/api/rooms/${roomId}/ws`, qs);
+}
+
+// Close code of a sharded server: the room lives on the worker at `reason`
+const WRONG_SHARD = 4010;
 
-	ws = new WebSocket(url);
+function openSocket(base: string, qs: string): void {
+	const socket = new WebSocket(`${base}${qs ? '?' + qs : ''}`);
+	ws = socket;
 
-	ws.onopen = () => {
+	socket.onopen = () => {
 		connected.set(true);
 	};
 
-	ws.onclose = () => {
+	socket.onclose = (event) => {
 		connected.set(false);
+		if (event.code === WRONG_SHARD && event.reason && ws === socket) {
+			openSocket(event.reason, qs);
+		}
 	};
 
-	ws.onmessage = (event) => {
+	socket.onmessage = (event) => {
 		try {
 			const msg: WsMessage = JSON.parse(event.data);
 			if (msg.type === 'welcome') {
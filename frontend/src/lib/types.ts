@@ -19,6 +19,10 @@ export interface RoundState {
 	votes: Record<string, Vote>;
 	revealed: boolean;
 	round_number: number;
+	timer_deadline: number | null;
+	auto_reveal: boolean;
+	vote_count: number;
+	voter_count: number;
 }
 
 export interface CardDef {
@@ -27,12 +31,34 @@ export interface CardDef {
 	description: { en: string; de: string };
 }
 
+export interface CardCount {
+	value: string;
+	count: number;
+}
+
 export interface Stats {
 	average?: number;
 	median?: number;
 	min?: number;
 	max?: number;
 	consensus?: boolean;
+	near_consensus?: boolean;
+	distribution?: CardCount[];
+	mode?: string[];
+	spread?: number;
+	suggestion?: string;
+	special?: number;
+}
+
+export interface QueuedStory {
+	position: number;
+	story: string;
+	story_link: string | null;
+}
+
+export interface StoryQueue {
+	count: number;
+	next: QueuedStory | null;
 }
 
 export interface RoomState {
@@ -41,7 +67,11 @@ export interface RoomState {
 	description_flavor: string;
 	participants: Record<string, Participant>;
 	current_round: RoundState | null;
-	deck_cards: CardDef[];
+	story_queue: StoryQueue;
+	deck_etag: string;
+	deck_url: string;
+	// Increases by one with each published state; room_patch builds on the previous one
+	version: number;
 	stats?: Stats;
 }
 